@@ -1,5 +1,9 @@
 """Utils for APIs and router"""
+import hashlib
+import tempfile
 from typing import Generator
+
+from fastapi import UploadFile
 from book_summarizer.db.session import DBSession
 
 def get_db() -> Generator:
@@ -9,3 +13,13 @@ def get_db() -> Generator:
     yield db
   finally:
     db.close()
+
+
+async def save_upload(file: UploadFile, suffix: str = "", chunk_size: int = 2**20) -> tuple[str, str]:
+  """Copy an upload to a temporary file chunk by chunk, returns its path and sha256."""
+  digest = hashlib.sha256()
+  with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as temp_file:
+    while chunk := await file.read(chunk_size):
+      digest.update(chunk)
+      temp_file.write(chunk)
+  return temp_file.name, digest.hexdigest()
@@ -0,0 +1,58 @@
+"""Benchmark API worker startup: import time, RSS after import and after lifespan startup.
+
+Every run is a fresh interpreter, like a gunicorn worker recycled by --max-requests. Set
+LLM_WARMUP_ON_STARTUP=false to measure a worker that only serves CRUD.
+
+Run with `python -m book_summarizer.api.benchmark.bench_startup`.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+HEAVY_MODULES = ("torch", "transformers", "pandas", "sklearn", "nltk", "passlib", "fitz")
+
+WORKER = f"""
+import asyncio, json, sys, time
+from book_summarizer.ingestion.document_text import get_rss_bytes
+start = time.perf_counter()
+from book_summarizer.api.main import app
+import_s = time.perf_counter() - start
+import_rss = get_rss_bytes()
+loaded = [name for name in {HEAVY_MODULES!r} if name in sys.modules]
+
+async def start_worker():
+  start = time.perf_counter()
+  async with app.router.lifespan_context(app):
+    return time.perf_counter() - start, get_rss_bytes()
+
+startup_s, idle_rss = asyncio.run(start_worker())
+print(json.dumps(dict(import_s=import_s, import_rss=import_rss, startup_s=startup_s,
+                      idle_rss=idle_rss, loaded=loaded)))
+"""
+
+
+def run_worker() -> dict:
+  """Import and start the app in a fresh interpreter."""
+  output = subprocess.run([sys.executable, "-c", WORKER], capture_output=True, text=True,
+                          check=True).stdout
+  return json.loads(output.strip().splitlines()[-1])
+
+
+def main() -> None:
+  parser = argparse.ArgumentParser(description=__doc__,
+                                   formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument("--repeats", type=int, default=5)
+  args = parser.parse_args()
+
+  runs = [run_worker() for _ in range(args.repeats)]
+  print(f"import      {statistics.median(run['import_s'] for run in runs):>7.2f} s"
+        f" {statistics.median(run['import_rss'] for run in runs) / 2**20:>7.0f} MB")
+  print(f"startup     {statistics.median(run['startup_s'] for run in runs):>7.2f} s"
+        f" {statistics.median(run['idle_rss'] for run in runs) / 2**20:>7.0f} MB idle")
+  print(f"heavy modules imported with the app: {', '.join(runs[0]['loaded']) or 'none'}")
+
+
+if __name__ == "__main__":
+  main()
@@ -1,24 +1,59 @@
-from fastapi import FastAPI, HTTPException, Depends
+from contextlib import asynccontextmanager
+import json
+import os
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, Response, UploadFile, File
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError
-from typing import List, Any
+from typing import List, Any, Literal
 import logging
 
-from book_summarizer.api.api_utils import get_db
+from book_summarizer.api.api_utils import get_db, save_upload
 from book_summarizer.db.cruds.crud_books import crud_book
 from book_summarizer.db.cruds.crud_reviews import crud_review
+from book_summarizer.db.cruds.crud_summary_jobs import crud_summary_job
 from book_summarizer.db.schema import schemas
-from book_summarizer.utils.exception_utils import AlreadyExistsError
-from book_summarizer.llm.llm_summarize import get_content_summary
+from book_summarizer.utils.exception_utils import AlreadyExistsError, ArtifactsUnavailableError, InferenceQueueFullError, UnknownUserError, UnsupportedDocumentError
+from book_summarizer.ingestion.document_text import ExtractionStats, SUPPORTED_EXTENSIONS, TemporaryDocument, get_page_count, shutdown_process_pool
+from book_summarizer.llm.assisted import assisted_stats
+from book_summarizer.llm.backends import get_backend
+from book_summarizer.llm.model_registry import model_registry
+from book_summarizer.llm.inference_executor import inference_executor
+from book_summarizer.llm.summary_cache import summary_cache
+from book_summarizer.llm.summary_service import summarize, stream_summary, summary_flights
+from book_summarizer.llm.telemetry import RequestTelemetry, render_metrics
 from book_summarizer.config.config import setting
 from book_summarizer.db.session import DBSession
-from book_summarizer.recommendation.prediction.make_prediction import predict
+from book_summarizer.jobs.summary_jobs import summary_job_worker
+from book_summarizer.recommendation.prediction.make_prediction import predict, predict_batch
 
 # Configure logging
 logging.basicConfig(level=logging.ERROR)
 logger = logging.getLogger(__name__)
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Load the configured LLM before serving and release it on shutdown."""
+    if setting.SUMMARY_CACHE_ENABLED:
+        # Summaries of a previous model, prompt or precision would never be requested again.
+        await run_in_threadpool(summary_cache.invalidate_stale, setting.LLM_MODEL_NAME, setting.LLM_PROMPT,
+                                setting.LLM_PRECISION)
+    if setting.LLM_WARMUP_ON_STARTUP:
+        try:
+            await run_in_threadpool(get_backend().warm_up, setting.LLM_MODEL_NAME)
+        except Exception as e:
+            logger.error(f"Model warm-up failed, loading lazily on first request: {e}")
+    if setting.SUMMARY_JOBS_WORKER_ENABLED:
+        summary_job_worker.start()
+    yield
+    await summary_job_worker.stop()
+    inference_executor.shutdown()
+    shutdown_process_pool()
+    get_backend().close()
+    summary_cache.close()
+
+app = FastAPI(lifespan=lifespan)
 
 # Endpoint to add a new book
 @app.post("/books", response_model=list[schemas.Book])
@@ -164,20 +199,256 @@ async def get_book_summary(id: int, db: Session = Depends(get_db)):
 
 # Endpoint to generate a summary for a given book content
 @app.post("/generate-summary")
-async def generate_summary(content: str):
+async def generate_summary(content: str, response: Response,
+                           chunk_tokens: int = Query(setting.LLM_CHUNK_TOKENS, ge=64),
+                           chunk_overlap: int = Query(setting.LLM_CHUNK_OVERLAP, ge=0),
+                           reduce_fan_in: int = Query(setting.LLM_REDUCE_FAN_IN, ge=2),
+                           extractive: Literal["off", "textrank", "tfidf"] = Query(setting.LLM_EXTRACTIVE_MODE),
+                           extractive_tokens: int = Query(setting.LLM_EXTRACTIVE_TOKENS, ge=64)):
+    if chunk_overlap >= chunk_tokens:
+        raise HTTPException(status_code=422, detail="chunk_overlap must be smaller than chunk_tokens")
     try:
-        summary = get_content_summary(content=content, model_name=setting.LLM_MODEL_NAME, prompt_name=setting.LLM_PROMPT)
+        telemetry = RequestTelemetry()
+        summary = await summarize(content=content, model_name=setting.LLM_MODEL_NAME, prompt=setting.LLM_PROMPT,
+                                  chunk_tokens=chunk_tokens, chunk_overlap=chunk_overlap, reduce_fan_in=reduce_fan_in,
+                                  extractive=extractive, extractive_tokens=extractive_tokens, telemetry=telemetry)
+        if setting.DEBUG:
+            response.headers.update(telemetry.to_headers())
         return {"summary": summary}
+    except InferenceQueueFullError as e:
+        logger.error(f"Rejected summary request: {e}")
+        raise HTTPException(status_code=503, detail="Summarizer is busy, retry later", headers={"Retry-After": "5"})
     except Exception as e:
         logger.error(f"An error occurred: {e}")
         raise HTTPException(status_code=500, detail="Something went wrong")
 
-# Endpoint to retrieve all reviews for a book
+# Endpoint to summarize an uploaded PDF or EPUB, its text is extracted page by page
+@app.post("/generate-summary/upload")
+async def generate_summary_upload(response: Response, file: UploadFile = File(...),
+                                  chunk_tokens: int = Query(setting.LLM_CHUNK_TOKENS, ge=64),
+                                  chunk_overlap: int = Query(setting.LLM_CHUNK_OVERLAP, ge=0),
+                                  reduce_fan_in: int = Query(setting.LLM_REDUCE_FAN_IN, ge=2),
+                                  extractive: Literal["off", "textrank", "tfidf"] = Query(setting.LLM_EXTRACTIVE_MODE),
+                                  extractive_tokens: int = Query(setting.LLM_EXTRACTIVE_TOKENS, ge=64)):
+    extension = os.path.splitext(file.filename or "")[1].lower()
+    if extension not in SUPPORTED_EXTENSIONS:
+        raise HTTPException(status_code=415, detail=f"Supported documents are {', '.join(SUPPORTED_EXTENSIONS)}")
+    if chunk_overlap >= chunk_tokens:
+        raise HTTPException(status_code=422, detail="chunk_overlap must be smaller than chunk_tokens")
+    path, file_hash = await save_upload(file, suffix=extension)
+    stats = ExtractionStats()
+    document = TemporaryDocument(path, stats=stats)
+    try:
+        try:
+            page_count = await run_in_threadpool(get_page_count, path)
+        except BaseException:
+            document.close()
+            raise
+        telemetry = RequestTelemetry()
+        # summarize removes the file once inference is done reading it, even when cancelled.
+        summary = await summarize(content=document, content_key=f"file:{file_hash}",
+                                  model_name=setting.LLM_MODEL_NAME, prompt=setting.LLM_PROMPT,
+                                  chunk_tokens=chunk_tokens, chunk_overlap=chunk_overlap, reduce_fan_in=reduce_fan_in,
+                                  extractive=extractive, extractive_tokens=extractive_tokens, telemetry=telemetry)
+        if setting.DEBUG:
+            response.headers.update(telemetry.to_headers())
+        return {"summary": summary, "page_count": page_count, "extraction": stats.to_dict()}
+    except UnsupportedDocumentError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except InferenceQueueFullError as e:
+        logger.error(f"Rejected summary request: {e}")
+        raise HTTPException(status_code=503, detail="Summarizer is busy, retry later", headers={"Retry-After": "5"})
+    except Exception as e:
+        logger.error(f"An error occurred: {e}")
+        raise HTTPException(status_code=500, detail="Something went wrong")
+
+async def queue_summary_job(job: schemas.SummaryJobCreate) -> schemas.SummaryJob:
+    """Queue a summary job, reusing the active job of the same book."""
+    async with DBSession() as session:
+        if job.book_id is not None and not await crud_book.get(db=session, search_value=job.book_id):
+            raise HTTPException(status_code=404, detail=f"Book with `{job.book_id}` not found")
+        summary_job, _ = await crud_summary_job.create_deduplicated(db=session, obj_in=job, model_name=setting.LLM_MODEL_NAME)
+        summary_job_worker.notify()
+        return summary_job
+
+# Endpoint to queue a summary job for a book, the result is written to the book's summary
+@app.post("/books/{id}/summary-jobs", response_model=schemas.SummaryJob, status_code=202)
+async def create_book_summary_job(id: int, job: schemas.SummaryJobContent):
+    try:
+        return await queue_summary_job(schemas.SummaryJobCreate(content=job.content, book_id=id))
+    except HTTPException:
+        raise
+    except SQLAlchemyError as e:
+        logger.error(f"Database error occurred: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    except Exception as e:
+        logger.error(f"An error occurred: {e}")
+        raise HTTPException(status_code=500, detail="Something went wrong")
+
+# Endpoint to queue a summary job for any content
+@app.post("/summary-jobs", response_model=schemas.SummaryJob, status_code=202)
+async def create_summary_job(job: schemas.SummaryJobCreate):
+    try:
+        return await queue_summary_job(job)
+    except HTTPException:
+        raise
+    except SQLAlchemyError as e:
+        logger.error(f"Database error occurred: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    except Exception as e:
+        logger.error(f"An error occurred: {e}")
+        raise HTTPException(status_code=500, detail="Something went wrong")
+
+# Endpoint to get the status and result of a summary job
+@app.get("/summary-jobs/{id}", response_model=schemas.SummaryJob)
+async def get_summary_job(id: int):
+    try:
+      async with DBSession() as session:
+        summary_job = await crud_summary_job.get(db=session, search_value=id)
+        if not summary_job:
+            raise HTTPException(status_code=404, detail=f"Summary job `{id}` not found")
+        return summary_job
+    except HTTPException:
+        raise
+    except SQLAlchemyError as e:
+        logger.error(f"Database error occurred: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    except Exception as e:
+        logger.error(f"An error occurred: {e}")
+        raise HTTPException(status_code=500, detail="Something went wrong")
+
+# Endpoint to stream a summary as Server-Sent Events while it is generated
+@app.post("/generate-summary/stream")
+async def generate_summary_stream(request: Request, content: str,
+                                  chunk_tokens: int = Query(setting.LLM_CHUNK_TOKENS, ge=64),
+                                  chunk_overlap: int = Query(setting.LLM_CHUNK_OVERLAP, ge=0),
+                                  reduce_fan_in: int = Query(setting.LLM_REDUCE_FAN_IN, ge=2),
+                                  extractive: Literal["off", "textrank", "tfidf"] = Query(setting.LLM_EXTRACTIVE_MODE),
+                                  extractive_tokens: int = Query(setting.LLM_EXTRACTIVE_TOKENS, ge=64)):
+    if chunk_overlap >= chunk_tokens:
+        raise HTTPException(status_code=422, detail="chunk_overlap must be smaller than chunk_tokens")
+    pieces = stream_summary(content=content, model_name=setting.LLM_MODEL_NAME, prompt=setting.LLM_PROMPT,
+                            chunk_tokens=chunk_tokens, chunk_overlap=chunk_overlap, reduce_fan_in=reduce_fan_in,
+                            extractive=extractive, extractive_tokens=extractive_tokens)
+    try:
+        # Waiting for the first piece surfaces a full queue as a 503 instead of a broken stream.
+        first_piece = await anext(pieces, None)
+    except InferenceQueueFullError as e:
+        await pieces.aclose()
+        logger.error(f"Rejected summary request: {e}")
+        raise HTTPException(status_code=503, detail="Summarizer is busy, retry later", headers={"Retry-After": "5"})
+    except Exception as e:
+        await pieces.aclose()
+        logger.error(f"An error occurred: {e}")
+        raise HTTPException(status_code=500, detail="Something went wrong")
+
+    async def events():
+        summary = []
+        try:
+            if first_piece is not None:
+                summary.append(first_piece)
+                yield f"data: {json.dumps({'token': first_piece})}\n\n"
+            async for piece in pieces:
+                if await request.is_disconnected():
+                    break
+                summary.append(piece)
+                yield f"data: {json.dumps({'token': piece})}\n\n"
+            else:
+                yield f"event: done\ndata: {json.dumps({'summary': ''.join(summary)})}\n\n"
+        except Exception as e:
+            logger.error(f"An error occurred: {e}")
+            yield f"event: error\ndata: {json.dumps({'detail': 'Something went wrong'})}\n\n"
+        finally:
+            # Closing the generator stops inference when the client disconnected.
+            await pieces.aclose()
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+# Endpoint to list the models loaded by this worker
+@app.get("/llm/models", response_model=list[dict[str, Any]])
+async def get_loaded_models():
+    return model_registry.stats()
+
+# Endpoint to report the inference queue depth and wait times
+@app.get("/llm/queue", response_model=dict[str, Any])
+async def get_inference_queue():
+    stats = inference_executor.stats()
+    batching_stats = get_backend().batching_stats(setting.LLM_MODEL_NAME)
+    if batching_stats is not None:
+        stats["batching"] = batching_stats
+    stats["coalescing"] = summary_flights.stats()
+    if setting.LLM_BACKEND == "transformers" and setting.LLM_DRAFT_MODEL_NAME:
+        stats["assisted"] = assisted_stats.stats()
+    return stats
+
+# Endpoint exposing inference telemetry histograms to Prometheus
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+# Endpoint to report summary cache hits, misses and size
+@app.get("/summary-cache", response_model=dict[str, Any])
+async def get_summary_cache_stats():
+    return await run_in_threadpool(summary_cache.stats)
+
+# Endpoint to invalidate cached summaries of a model and/or prompt, or all of them
+@app.delete("/summary-cache", response_model=dict[str, int])
+async def invalidate_summary_cache(model_name: str | None = None, prompt: str | None = None):
+    try:
+        deleted = await run_in_threadpool(summary_cache.invalidate, model_name, prompt)
+        return {"deleted": deleted}
+    except Exception as e:
+        logger.error(f"An error occurred: {e}")
+        raise HTTPException(status_code=500, detail="Something went wrong")
+
+# Endpoint to recommend books to many users, streamed as one JSON line per user
+@app.post("/recommendations/batch")
+async def get_batch_recommendations(request: Request, batch: schemas.RecommendationBatch):
+    chunks = predict_batch(batch.user_ids, batch.count)
+    try:
+        # Scoring the first chunk before responding surfaces missing artifacts as a 503.
+        first_chunk = await run_in_threadpool(next, chunks, None)
+    except (ArtifactsUnavailableError, FileNotFoundError) as e:
+        logger.error(f"Recommendation artifacts are missing: {e}")
+        raise HTTPException(status_code=503, detail="Recommendations are not available yet")
+    except Exception as e:
+        logger.error(f"An error occurred: {e}")
+        raise HTTPException(status_code=500, detail="Something went wrong")
+
+    async def lines():
+        chunk = first_chunk
+        try:
+            while chunk is not None:
+                for result in chunk:
+                    yield json.dumps(result) + "\n"
+                if await request.is_disconnected():
+                    break
+                chunk = await run_in_threadpool(next, chunks, None)
+        except Exception as e:
+            logger.error(f"An error occurred: {e}")
+            yield json.dumps({"detail": "Something went wrong"}) + "\n"
+        finally:
+            try:
+                # Closing the generator releases the artifacts when the client disconnected.
+                chunks.close()
+            except ValueError:
+                # A cancelled response can leave a chunk scoring in the threadpool, the
+                # generator is released once that chunk is done.
+                pass
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+# Endpoint to recommend books a user has not rated yet
 @app.get("/recommendations/{user_id}", response_model=list)
 async def get_reviews(user_id: int):
     try:
-        recommendations = predict(user_id)
+        recommendations = await run_in_threadpool(predict, user_id)
         return recommendations
+    except (ArtifactsUnavailableError, FileNotFoundError) as e:
+        logger.error(f"Recommendation artifacts are missing: {e}")
+        raise HTTPException(status_code=503, detail="Recommendations are not available yet")
+    except UnknownUserError:
+        raise HTTPException(status_code=404, detail="No recommendations for this user")
     except Exception as e:
         logger.error(f"An error occurred: {e}")
         raise HTTPException(status_code=500, detail="Something went wrong")
@@ -5,6 +5,11 @@ from book_summarizer.db.schema.schemas import BookCreate, BookUpdate, ReviewCrea
 from book_summarizer.db.session import DBSession
 import json
 import asyncio
+from types import SimpleNamespace
+from unittest import mock
+import numpy as np
+from book_summarizer.api import main
+from book_summarizer.recommendation.prediction import make_prediction
 from book_summarizer.db.cruds.crud_books import crud_book
 from book_summarizer.db.cruds.crud_reviews import crud_review
 from absl.testing import absltest
@@ -244,5 +249,50 @@ class TestAPI(absltest.TestCase):
     assert "summary" in response.json()
 
 
+class TestRecommendationBatchAPI(absltest.TestCase):
+  """Batch recommendation endpoint test class, scored against in-memory artifacts."""
 
+  def setUp(self):
+    """Setup."""
+    titles = np.array(["Dune", "Emma", "Ulysses"])
+
+    def recommend_for_users(user_ids, count):
+      # User 1 is known and gets the first `count` books, other users have no ratings.
+      rows = [[0, 2][:count] if user_id == 1 else [-1] * count for user_id in user_ids]
+      return np.array(rows), np.zeros((len(rows), count))
+
+    artifacts = SimpleNamespace(titles=titles, recommend_for_users=recommend_for_users)
+    patcher = mock.patch.object(make_prediction, "get_artifact_store",
+                                return_value=SimpleNamespace(get=lambda: artifacts))
+    patcher.start()
+    self.addCleanup(patcher.stop)
+
+  def read_lines(self, response) -> list:
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert response.text.endswith("\n")
+    return [json.loads(line) for line in response.text.splitlines()]
+
+  def test_batch_recommendations(self) -> None:
+    """Every user gets one JSON line in request order, unknown users get no books"""
+    response = client.post("/recommendations/batch", json={"user_ids": [1, 42, 1], "count": 2})
+    assert response.status_code == 200
+    assert self.read_lines(response) == [
+        {"user_id": 1, "recommendations": ["Dune", "Ulysses"]},
+        {"user_id": 42, "recommendations": []},
+        {"user_id": 1, "recommendations": ["Dune", "Ulysses"]},
+    ]
+
+  def test_batch_recommendations_after_empty_first_chunk(self) -> None:
+    """An empty first chunk does not end the stream"""
+    chunks = (chunk for chunk in [[], [{"user_id": 1, "recommendations": ["Dune"]}]])
+    with mock.patch.object(main, "predict_batch", return_value=chunks):
+      response = client.post("/recommendations/batch", json={"user_ids": [1]})
+    assert response.status_code == 200
+    assert self.read_lines(response) == [{"user_id": 1, "recommendations": ["Dune"]}]
 
+  def test_batch_recommendations_without_artifacts(self) -> None:
+    """Missing artifacts are reported before the stream starts"""
+    with mock.patch.object(make_prediction, "get_artifact_store",
+                           side_effect=FileNotFoundError("no artifacts")):
+      response = client.post("/recommendations/batch", json={"user_ids": [1]})
+    assert response.status_code == 503
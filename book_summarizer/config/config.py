@@ -1,6 +1,6 @@
 """Setting different variables related to api and redis connection."""
 import os
-from typing import Any
+from typing import Any, Literal
 from pydantic import field_validator
 from pydantic import PostgresDsn
 from pydantic import ValidationInfo
@@ -14,8 +14,104 @@ class Settings(BaseSettings):
   # LLM_MODEL_NAME: str="meta-llama/Meta-Llama-3-8B-Instruct"
   LLM_MODEL_NAME: str = "microsoft/Phi-3-mini-128k-instruct"
   LLM_PROMPT: str = book_summary_prompt
+  # Generation backend: "transformers", or "stub" to run offline without a model.
+  LLM_BACKEND: str = "transformers"
+  # Latency and output length of the stub backend.
+  LLM_STUB_LATENCY_MS: float = 50.0
+  LLM_STUB_TOKEN_LATENCY_MS: float = 5.0
+  LLM_STUB_SUMMARY_WORDS: int = 64
 
+  # Number of models kept loaded per worker, least recently used ones are evicted.
   LRU_CACHE_SIZE: int = 3
+  LLM_WARMUP_ON_STARTUP: bool = True
+  # Threads running inference per worker and requests allowed to wait for one.
+  LLM_INFERENCE_WORKERS: int = 1
+  LLM_INFERENCE_QUEUE_SIZE: int = 16
+  LLM_MAX_NEW_TOKENS: int = 512
+  # A streamed generation that produces no text for this long is abandoned.
+  LLM_STREAM_TIMEOUT_S: float = 120.0
+  # Weights precision on CPU: fp32, bf16 or int8 (dynamic quantization of the linear layers).
+  # int8 models are quantized once and stored in LLM_QUANTIZED_MODEL_DIR.
+  LLM_PRECISION: Literal["fp32", "bf16", "int8"] = "fp32"
+  LLM_QUANTIZED_MODEL_DIR: str = ".cache/quantized_models"
+  # Assisted decoding: a small draft model proposes LLM_NUM_ASSISTANT_TOKENS tokens per step
+  # and LLM_MODEL_NAME verifies them. Applies to single prompts, batches use plain generate.
+  LLM_DRAFT_MODEL_NAME: str | None = None
+  LLM_NUM_ASSISTANT_TOKENS: int = 5
+  # Reuse the key/value cache of the constant prompt prefixes instead of recomputing it.
+  LLM_PREFIX_CACHE_ENABLED: bool = True
+  # Micro-batching of concurrent requests. Each inference worker waits on one request, so
+  # with batching enabled the pool has at least LLM_MAX_BATCH_SIZE workers.
+  LLM_BATCHING_ENABLED: bool = False
+  LLM_MAX_BATCH_SIZE: int = 8
+  LLM_MAX_BATCH_WAIT_MS: float = 20.0
+  # Map-reduce summarization of content longer than the model context.
+  LLM_CHUNK_TOKENS: int = 2048
+  LLM_CHUNK_OVERLAP: int = 128
+  LLM_REDUCE_FAN_IN: int = 4
+  # Extractive stage before generation: "off", "textrank" or "tfidf" sentence ranking,
+  # keeping the most central sentences within LLM_EXTRACTIVE_TOKENS tokens.
+  LLM_EXTRACTIVE_MODE: Literal["off", "textrank", "tfidf"] = "off"
+  LLM_EXTRACTIVE_TOKENS: int = 4096
+
+  # Debug mode adds inference telemetry headers (X-LLM-*) to summary responses.
+  DEBUG: bool = False
+
+  # Summaries cached by model, prompt, content and generation parameters.
+  SUMMARY_CACHE_ENABLED: bool = True
+  SUMMARY_CACHE_PATH: str = ".cache/summary_cache.sqlite3"
+  SUMMARY_CACHE_MEMORY_SIZE: int = 256
+  SUMMARY_CACHE_DISK_MAX_ENTRIES: int = 10000
+
+  # Background processing of the summary_jobs table in each API worker.
+  SUMMARY_JOBS_WORKER_ENABLED: bool = True
+  SUMMARY_JOB_CONCURRENCY: int = 1
+  SUMMARY_JOB_POLL_SECONDS: float = 5.0
+  SUMMARY_JOB_LEASE_SECONDS: int = 3600
+  SUMMARY_JOB_MAX_ATTEMPTS: int = 3
+
+  # PDF/EPUB text extraction, documents from INGEST_PARALLEL_MIN_PAGES pages use a process pool.
+  INGEST_WORKERS: int = 4
+  INGEST_PAGES_PER_TASK: int = 16
+  INGEST_PARALLEL_MIN_PAGES: int = 64
+
+  # Recommendation artifacts published by the training script, see recommendation/artifacts.py.
+  # Workers switch to a newly published version within RECOMMENDATION_RELOAD_SECONDS.
+  RECOMMENDATION_ARTIFACTS_DIR: str = "book_summarizer/recommendation/prediction/artifacts"
+  RECOMMENDATION_RELOAD_SECONDS: float = 5.0
+  RECOMMENDATION_COUNT: int = 5
+  # Training precomputes the RECOMMENDATION_NEIGHBOURS most similar books of every book, in
+  # blocks of RECOMMENDATION_BLOCK_SIZE books spread over RECOMMENDATION_WORKERS processes.
+  RECOMMENDATION_NEIGHBOURS: int = 50
+  RECOMMENDATION_BLOCK_SIZE: int = 1024
+  RECOMMENDATION_WORKERS: int = 4
+  # Index searched for neighbours: "brute" scores every book, "ivf" only the books of the
+  # RECOMMENDATION_IVF_PROBES closest of RECOMMENDATION_IVF_LISTS clusters (0: about
+  # sqrt(books)) of RECOMMENDATION_IVF_DIMENSIONS dimensional book embeddings, of which the
+  # RECOMMENDATION_IVF_RERANK closest are scored exactly. More probes and reranked books raise
+  # recall and latency. With "ivf", training also builds the neighbour table from the index.
+  RECOMMENDATION_INDEX: Literal["brute", "ivf"] = "brute"
+  RECOMMENDATION_IVF_LISTS: int = 0
+  RECOMMENDATION_IVF_PROBES: int = 8
+  RECOMMENDATION_IVF_DIMENSIONS: int = 64
+  RECOMMENDATION_IVF_RERANK: int = 1024
+  # POST /recommendations/batch scores RECOMMENDATION_BATCH_CHUNK_SIZE users per sparse product.
+  RECOMMENDATION_BATCH_CHUNK_SIZE: int = 512
+  RECOMMENDATION_BATCH_MAX_USERS: int = 100000
+  # Training reads the BX CSVs of RECOMMENDATION_DATASET_DIR in chunks of
+  # RECOMMENDATION_CSV_CHUNK_ROWS rows.
+  RECOMMENDATION_DATASET_DIR: str = "book_summarizer/recommendation/dataset"
+  RECOMMENDATION_CSV_CHUNK_ROWS: int = 200000
+  # Typed columns of the CSVs are cached here, keyed by the hash of each CSV.
+  RECOMMENDATION_DATASET_CACHE_DIR: str = "book_summarizer/recommendation/dataset/cache"
+  # Books with fewer ratings are left out of training.
+  RECOMMENDATION_MIN_RATINGS: int = 50
+  # Users with fewer ratings, counted over the whole ratings file, are left out of training.
+  RECOMMENDATION_MIN_USER_RATINGS: int = 201
+  # Training from the reviews table fetches RECOMMENDATION_REVIEWS_BATCH_SIZE reviews per
+  # round trip and merges them into the sparse matrix every RECOMMENDATION_REVIEWS_COMPACT_ROWS.
+  RECOMMENDATION_REVIEWS_BATCH_SIZE: int = 100000
+  RECOMMENDATION_REVIEWS_COMPACT_ROWS: int = 5000000
 
   DB_USERNAME: str = os.getenv("DB_USERNAME") or "user"
   DB_PASSWORD: str = os.getenv("DB_PASSWORD") or "password123"
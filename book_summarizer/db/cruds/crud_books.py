@@ -1,4 +1,12 @@
 """CRUD for books table"""
+from typing import AsyncIterator, Iterable
+
+from sqlalchemy import func
+from sqlalchemy import or_
+from sqlalchemy import update
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
 
 from book_summarizer.db.cruds.crud_base import CRUDBase
 from book_summarizer.db.models.models import Books
@@ -9,4 +17,61 @@ from book_summarizer.db.schema.schemas import BookUpdate
 class CRUDBook(CRUDBase[Books, BookCreate, BookUpdate]):
   """CRUD operation for document table."""
 
+  def missing_summary_filter(self, placeholders: Iterable[str], after_id: int) -> list:
+    """Books after `after_id` whose summary is missing, blank or a placeholder."""
+    return [
+        self.model.id > after_id,
+        or_(self.model.summary.is_(None),
+            func.trim(self.model.summary) == "",
+            self.model.summary.in_(list(placeholders))),
+    ]
+
+  async def count_missing_summaries(self, db: AsyncSession, placeholders: Iterable[str],
+                                    after_id: int = 0) -> int:
+    """Number of books that need a summary."""
+    query = select(func.count()).select_from(self.model).filter(
+        *self.missing_summary_filter(placeholders, after_id))
+    result = await db.execute(query)
+    return result.scalar_one()
+
+  async def stream_missing_summaries(self, db: AsyncSession, placeholders: Iterable[str],
+                                     after_id: int = 0,
+                                     batch_size: int = 64) -> AsyncIterator[list[Row]]:
+    """Yield batches of books that need a summary in id order, read through a server-side cursor."""
+    query = (select(self.model.id, self.model.title, self.model.author, self.model.genre,
+                    self.model.year_published).filter(
+                        *self.missing_summary_filter(placeholders, after_id)).order_by(
+                            self.model.id).execution_options(yield_per=batch_size))
+    result = await db.stream(query)
+    async for rows in result.partitions(batch_size):
+      yield rows
+
+  async def get_missing_summaries(self, db: AsyncSession, placeholders: Iterable[str],
+                                  book_ids: Iterable[int]) -> list[Row]:
+    """Books of the given ids that still need a summary, in id order."""
+    query = (select(self.model.id, self.model.title, self.model.author, self.model.genre,
+                    self.model.year_published).filter(
+                        self.model.id.in_(list(book_ids)),
+                        *self.missing_summary_filter(placeholders, 0)).order_by(self.model.id))
+    result = await db.execute(query)
+    return list(result.all())
+
+  async def get_titles(self, db: AsyncSession, book_ids: Iterable[int],
+                       batch_size: int = 10000) -> dict[int, str | None]:
+    """Titles of books by id, queried batch_size ids at a time."""
+    book_ids = list(book_ids)
+    titles = {}
+    for start in range(0, len(book_ids), batch_size):
+      result = await db.execute(select(self.model.id, self.model.title).filter(
+          self.model.id.in_(book_ids[start:start + batch_size])))
+      titles.update(result.tuples().all())
+    return titles
+
+  async def update_summaries(self, db: AsyncSession, summaries: dict[int, str]) -> None:
+    """Write the summaries of several books with one bulk UPDATE."""
+    if summaries:
+      await db.execute(update(self.model), [{"id": book_id, "summary": summary}
+                                            for book_id, summary in summaries.items()])
+      await db.commit()
+
 crud_book = CRUDBook(Books, "id")
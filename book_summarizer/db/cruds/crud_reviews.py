@@ -1,4 +1,9 @@
 """CRUD for reviews table"""
+from typing import AsyncIterator
+
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
 
 from book_summarizer.db.cruds.crud_base import CRUDBase
 from book_summarizer.db.models.models import Reviews
@@ -9,4 +14,15 @@ from book_summarizer.db.schema.schemas import ReviewUpdate
 class CRUDReview(CRUDBase[Reviews, ReviewCreate, ReviewUpdate]):
   """CRUD operation for document table."""
 
+  async def stream_ratings(self, db: AsyncSession,
+                           batch_size: int = 100000) -> AsyncIterator[list[Row]]:
+    """Yield batches of (user_id, book_id, rating) in id order, read through a server-side cursor."""
+    query = (select(self.model.user_id, self.model.book_id, self.model.rating).filter(
+        self.model.user_id.is_not(None), self.model.book_id.is_not(None),
+        self.model.rating.is_not(None)).order_by(self.model.id).execution_options(
+            yield_per=batch_size))
+    result = await db.stream(query)
+    async for rows in result.partitions(batch_size):
+      yield rows
+
 crud_review = CRUDReview(Reviews, "id")
@@ -0,0 +1,109 @@
+"""CRUD for summary_jobs table"""
+from datetime import timedelta
+
+from sqlalchemy import and_
+from sqlalchemy import func
+from sqlalchemy import or_
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from book_summarizer.config.config import setting
+from book_summarizer.db.cruds.crud_base import CRUDBase
+from book_summarizer.db.models.models import Books
+from book_summarizer.db.models.models import SummaryJobs
+from book_summarizer.db.schema.schemas import SummaryJobCreate
+
+ACTIVE_STATUSES = ("queued", "running")
+
+
+class CRUDSummaryJob(CRUDBase[SummaryJobs, SummaryJobCreate, SummaryJobCreate]):
+  """CRUD operation for summary job table."""
+
+  async def get_active_for_book(self, db: AsyncSession, book_id: int) -> SummaryJobs | None:
+    """Get the queued or running job of a book."""
+    query = select(self.model).filter(self.model.book_id == book_id,
+                                      self.model.status.in_(ACTIVE_STATUSES))
+    result = await db.execute(query)
+    return result.scalar_one_or_none()
+
+  async def create_deduplicated(self, db: AsyncSession, obj_in: SummaryJobCreate,
+                                model_name: str) -> tuple[SummaryJobs, bool]:
+    """Queue a job unless the book already has an active one, returns (job, created)."""
+    if obj_in.book_id is not None:
+      existing_job = await self.get_active_for_book(db=db, book_id=obj_in.book_id)
+      if existing_job:
+        return existing_job, False
+    job = self.model(**obj_in.dict(), model_name=model_name, status="queued", attempts=0)
+    db.add(job)
+    try:
+      await db.commit()
+    except IntegrityError:
+      # Another request queued a job for the same book in the meantime.
+      await db.rollback()
+      return await self.get_active_for_book(db=db, book_id=obj_in.book_id), False
+    await db.refresh(job)
+    return job, True
+
+  async def claim_next(self, db: AsyncSession, lease_seconds: int,
+                       max_attempts: int = setting.SUMMARY_JOB_MAX_ATTEMPTS) -> SummaryJobs | None:
+    """Lock the oldest queued job, or a running one whose lease expired, and mark it running.
+
+    Expired jobs that already used max_attempts, e.g. ones whose generation killed the worker
+    every time, are failed instead of being claimed again.
+    """
+    expired = and_(self.model.status == "running", self.model.locked_until < func.now())
+    await db.execute(
+        update(self.model).where(expired, self.model.attempts >= max_attempts).values(
+            status="failed", locked_until=None,
+            error=f"Lease expired after {max_attempts} attempts"))
+    claimable = or_(self.model.status == "queued",
+                    and_(expired, self.model.attempts < max_attempts))
+    query = (select(self.model).filter(claimable).order_by(self.model.id).limit(1).with_for_update(
+        skip_locked=True))
+    result = await db.execute(query)
+    job = result.scalar_one_or_none()
+    if job is None:
+      await db.commit()
+      return None
+    job.status = "running"
+    job.attempts += 1
+    job.locked_until = func.now() + timedelta(seconds=lease_seconds)
+    await db.commit()
+    await db.refresh(job)
+    return job
+
+  async def mark_done(self, db: AsyncSession, job: SummaryJobs, summary: str) -> SummaryJobs:
+    """Store the summary on the job and its book in one transaction."""
+    job.status = "done"
+    job.summary = summary
+    job.content = None
+    job.locked_until = None
+    if job.book_id is not None:
+      await db.execute(update(Books).where(Books.id == job.book_id).values(summary=summary))
+    await db.commit()
+    await db.refresh(job)
+    return job
+
+  async def release(self, db: AsyncSession, job: SummaryJobs) -> SummaryJobs:
+    """Put a claimed job back in the queue without counting the attempt."""
+    job.status = "queued"
+    job.attempts -= 1
+    job.locked_until = None
+    await db.commit()
+    await db.refresh(job)
+    return job
+
+  async def mark_failed(self, db: AsyncSession, job: SummaryJobs, error: str,
+                        retry: bool) -> SummaryJobs:
+    """Record an error and queue the job again or fail it."""
+    job.status = "queued" if retry else "failed"
+    job.error = error
+    job.locked_until = None
+    await db.commit()
+    await db.refresh(job)
+    return job
+
+
+crud_summary_job = CRUDSummaryJob(SummaryJobs, "id")
@@ -0,0 +1,83 @@
+# mypy: ignore-errors
+"""Test cases for summary job CRUD operations."""
+
+import pytest
+
+from book_summarizer.db.cruds.crud_books import crud_book
+from book_summarizer.db.cruds.crud_reviews import crud_review
+from book_summarizer.db.cruds.crud_summary_jobs import crud_summary_job
+from book_summarizer.db.schema.schemas import BookCreate
+from book_summarizer.db.schema.schemas import SummaryJobCreate
+from book_summarizer.db.session import DBSession
+
+
+@pytest.mark.asyncio
+class TestSummaryJob:
+    """Test CRUD operations for the summary_jobs table."""
+    async def reset_books(self, session) -> None:
+        # Summary jobs are deleted with their books
+        existing_reviews = await crud_review.get_all(db=session)
+        await crud_review.delete_multiple(db=session, obj_inputs=[review.id for review in existing_reviews])
+        existing_jobs = await crud_summary_job.get_all(db=session)
+        await crud_summary_job.delete_multiple(db=session, obj_inputs=[job.id for job in existing_jobs])
+        existing_books = await crud_book.get_all(db=session)
+        await crud_book.delete_multiple(db=session, obj_inputs=[book.id for book in existing_books])
+        await crud_book.create_with_name(db=session, obj_inputs=[BookCreate(
+            title="book_1_test",
+            author="Author 1",
+            genre="Genre 1",
+            year_published=2021,
+            summary="placeholder",
+            id=1
+        )])
+
+    async def test_active_job_is_deduplicated(self):
+        """A second job for a book with a queued job returns the queued job."""
+        async with DBSession() as session:
+            await self.reset_books(session)
+
+            job_a, created_a = await crud_summary_job.create_deduplicated(
+                db=session, obj_in=SummaryJobCreate(book_id=1, content="Once there was a king"), model_name="model")
+            job_b, created_b = await crud_summary_job.create_deduplicated(
+                db=session, obj_in=SummaryJobCreate(book_id=1, content="Once there was a king"), model_name="model")
+
+            assert created_a and not created_b
+            assert job_a.id == job_b.id
+            assert job_a.status == "queued"
+
+    async def test_done_job_writes_book_summary(self):
+        """Claiming and finishing a job stores the summary on the book."""
+        async with DBSession() as session:
+            await self.reset_books(session)
+            job, _ = await crud_summary_job.create_deduplicated(
+                db=session, obj_in=SummaryJobCreate(book_id=1, content="Once there was a king"), model_name="model")
+
+            claimed = await crud_summary_job.claim_next(db=session, lease_seconds=60)
+            assert claimed.id == job.id
+            assert claimed.status == "running"
+            assert claimed.attempts == 1
+            assert await crud_summary_job.claim_next(db=session, lease_seconds=60) is None
+
+            done = await crud_summary_job.mark_done(db=session, job=claimed, summary="A king story")
+            book = await crud_book.get(db=session, search_value=1)
+            await session.refresh(book)
+
+            assert done.status == "done"
+            assert done.content is None
+            assert book.summary == "A king story"
+
+    async def test_expired_job_fails_after_max_attempts(self):
+        """A job whose lease keeps expiring is failed instead of being claimed again."""
+        async with DBSession() as session:
+            await self.reset_books(session)
+            job, _ = await crud_summary_job.create_deduplicated(
+                db=session, obj_in=SummaryJobCreate(book_id=1, content="Once there was a king"), model_name="model")
+
+            # A negative lease expires at once, as when the worker died during generation.
+            claimed = await crud_summary_job.claim_next(db=session, lease_seconds=-1, max_attempts=1)
+            assert claimed.id == job.id
+            assert await crud_summary_job.claim_next(db=session, lease_seconds=60, max_attempts=1) is None
+
+            await session.refresh(claimed)
+            assert claimed.status == "failed"
+            assert claimed.attempts == 1
@@ -4,6 +4,7 @@ from sqlalchemy import ARRAY
 from sqlalchemy import Column
 from sqlalchemy import DateTime
 from sqlalchemy import ForeignKey
+from sqlalchemy import Index
 from sqlalchemy import Integer
 from sqlalchemy import JSON
 from sqlalchemy import String
@@ -40,4 +41,23 @@ class Reviews(Base):
     user_id = Column(String, index=True)
     review_text = Column(String, index=True)
     rating = Column(Integer, index=True)
-    book = relationship("Books", back_populates="reviews")
\ No newline at end of file
+    book = relationship("Books", back_populates="reviews")
+
+class SummaryJobs(Base):
+    __tablename__ = "summary_jobs"
+    id = Column(Integer, primary_key=True, index=True)
+    book_id = Column(Integer, ForeignKey("books.id", ondelete="CASCADE"), nullable=True)
+    content = Column(String, nullable=True)
+    model_name = Column(String, nullable=False)
+    status = Column(String, nullable=False, index=True, default="queued")
+    summary = Column(String, nullable=True)
+    error = Column(String, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    locked_until = Column(DateTime(timezone=True), nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), onupdate=func.now())
+    # At most one queued or running job per book, further requests reuse it.
+    __table_args__ = (
+        Index("ix_summary_jobs_active_book", "book_id", unique=True,
+              postgresql_where=status.in_(["queued", "running"])),
+    )
\ No newline at end of file
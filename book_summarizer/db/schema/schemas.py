@@ -1,14 +1,28 @@
 """Schema for databases"""
 
+import functools
 from datetime import datetime
 from typing import Any, Literal
 
-from passlib.context import CryptContext
 from pydantic import BaseModel
 from pydantic import ConfigDict
 from pydantic import Field
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from book_summarizer.config.config import setting
+
+
+@functools.lru_cache(maxsize=1)
+def get_pwd_context() -> Any:
+  """bcrypt password context, built on first use instead of at import."""
+  from passlib.context import CryptContext  # pylint: disable=import-outside-toplevel
+  return CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+def __getattr__(name: str) -> Any:
+  # Keeps `schemas.pwd_context` working without building it at import.
+  if name == "pwd_context":
+    return get_pwd_context()
+  raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 class AllOptional(BaseModel):
@@ -58,3 +72,31 @@ class ReviewUpdate(AllOptional, ReviewCreate): # pylint: disable=invalid-metacla
   """ReviewUpdate class for update operations."""
 
 
+class SummaryJobContent(BaseModel):
+  """Schema for the content of a summary job"""
+  content: str = Field(description="Book content to summarize")
+
+class SummaryJobCreate(SummaryJobContent):
+  """Schema for summary job creation"""
+  book_id: int | None = Field(default=None, description="Book whose summary is written back")
+
+class SummaryJob(BaseModel):
+  """Schema for summary job status and result"""
+  model_config = ConfigDict(from_attributes=True, protected_namespaces=())
+
+  id: int
+  book_id: int | None = None
+  model_name: str
+  status: Literal["queued", "running", "done", "failed"]
+  summary: str | None = None
+  error: str | None = None
+  attempts: int
+  created_at: datetime
+  updated_at: datetime
+
+class RecommendationBatch(BaseModel):
+  """Schema for recommendations of many users"""
+  user_ids: list[int] = Field(description="Users to recommend books to", min_length=1,
+                              max_length=setting.RECOMMENDATION_BATCH_MAX_USERS)
+  count: int = Field(default=setting.RECOMMENDATION_COUNT, ge=1, le=100,
+                     description="Books recommended per user")
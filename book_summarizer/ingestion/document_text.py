@@ -0,0 +1,176 @@
+"""Page-by-page text extraction of PDF/EPUB documents with PyMuPDF.
+
+PyMuPDF is imported by the extraction functions, so importing the API does not load it.
+"""
+import itertools
+import multiprocessing
+import os
+import resource
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import wait
+from dataclasses import dataclass
+from typing import Any, Iterator
+
+from book_summarizer.config.config import setting
+from book_summarizer.utils.exception_utils import UnsupportedDocumentError
+
+SUPPORTED_EXTENSIONS = (".pdf", ".epub")
+
+_process_pool: ProcessPoolExecutor | None = None
+_process_pool_lock = threading.Lock()
+
+
+def get_rss_bytes() -> int:
+  """Current resident set size of this process."""
+  try:
+    with open("/proc/self/statm", encoding="ascii") as statm:
+      return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+  except (OSError, ValueError):
+    # Peak RSS in KiB where /proc is not available.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+@dataclass
+class ExtractionStats:
+  """Throughput and memory of one document extraction."""
+  pages: int = 0
+  characters: int = 0
+  # Peak RSS of this process, and of the largest pool process when pages ran on the pool.
+  peak_rss_bytes: int = 0
+  pool_peak_rss_bytes: int = 0
+  # Time spent extracting, excluding the time the consumer holds each page.
+  extraction_seconds: float = 0.0
+
+  def add_page(self, text: str, seconds: float) -> None:
+    """Count an extracted page and sample memory."""
+    self.pages += 1
+    self.characters += len(text)
+    self.extraction_seconds += seconds
+    self.peak_rss_bytes = max(self.peak_rss_bytes, get_rss_bytes())
+
+  def to_dict(self) -> dict[str, Any]:
+    """Stats for API responses."""
+    seconds = self.extraction_seconds
+    return {
+        "pages": self.pages,
+        "characters": self.characters,
+        "extraction_seconds": round(seconds, 3),
+        "pages_per_s": round(self.pages / seconds, 1) if seconds else 0.0,
+        "peak_rss_mb": round(self.peak_rss_bytes / 2**20, 1),
+        "pool_peak_rss_mb": round(self.pool_peak_rss_bytes / 2**20, 1),
+    }
+
+
+def get_page_count(path: str) -> int:
+  """Number of pages, raising UnsupportedDocumentError for unreadable files."""
+  import fitz  # pylint: disable=import-outside-toplevel
+  try:
+    with fitz.open(path) as document:
+      return document.page_count
+  except RuntimeError as e:
+    raise UnsupportedDocumentError(f"Cannot read document: {e}") from e
+
+
+def extract_page_range(path: str, start: int, stop: int) -> tuple[list[str], int]:
+  """Text of pages [start, stop) of a document and the RSS after it, run in pool processes."""
+  import fitz  # pylint: disable=import-outside-toplevel
+  with fitz.open(path) as document:
+    texts = [document[page_number].get_text() for page_number in range(start, stop)]
+  return texts, get_rss_bytes()
+
+
+def get_process_pool(workers: int = setting.INGEST_WORKERS) -> ProcessPoolExecutor:
+  """Shared extraction pool, spawned so workers do not inherit the loaded model."""
+  global _process_pool  # pylint: disable=global-statement
+  with _process_pool_lock:
+    if _process_pool is None:
+      _process_pool = ProcessPoolExecutor(max_workers=workers,
+                                          mp_context=multiprocessing.get_context("spawn"))
+    return _process_pool
+
+
+def shutdown_process_pool() -> None:
+  """Stop the extraction pool."""
+  global _process_pool  # pylint: disable=global-statement
+  with _process_pool_lock:
+    pool, _process_pool = _process_pool, None
+  if pool is not None:
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def iter_document_pages(path: str,
+                        stats: ExtractionStats | None = None,
+                        workers: int = setting.INGEST_WORKERS,
+                        pages_per_task: int = setting.INGEST_PAGES_PER_TASK,
+                        parallel_min_pages: int = setting.INGEST_PARALLEL_MIN_PAGES) -> Iterator[str]:
+  """Yield the text of each page in order.
+
+  Large documents are split into page ranges extracted on a process pool. Only
+  `2 * workers` ranges are in flight at once, so memory does not grow with the page count.
+  Once the iterator is exhausted or closed no pool process reads the file any more.
+  """
+  import fitz  # pylint: disable=import-outside-toplevel
+  stats = stats if stats is not None else ExtractionStats()
+  resumed_at = time.perf_counter()
+  with fitz.open(path) as document:
+    page_count = document.page_count
+    if workers <= 1 or page_count < parallel_min_pages:
+      for page in document:
+        text = page.get_text()
+        stats.add_page(text, time.perf_counter() - resumed_at)
+        yield text
+        resumed_at = time.perf_counter()
+      return
+
+  pool = get_process_pool(workers)
+  page_ranges = ((start, min(start + pages_per_task, page_count))
+                 for start in range(0, page_count, pages_per_task))
+  pending: deque[Future] = deque(
+      pool.submit(extract_page_range, path, start, stop)
+      for start, stop in itertools.islice(page_ranges, 2 * workers))
+  try:
+    while pending:
+      texts, pool_rss_bytes = pending.popleft().result()
+      stats.pool_peak_rss_bytes = max(stats.pool_peak_rss_bytes, pool_rss_bytes)
+      next_range = next(page_ranges, None)
+      if next_range is not None:
+        pending.append(pool.submit(extract_page_range, path, *next_range))
+      for text in texts:
+        stats.add_page(text, time.perf_counter() - resumed_at)
+        yield text
+        resumed_at = time.perf_counter()
+  finally:
+    for future in pending:
+      future.cancel()
+    # Ranges already running cannot be cancelled, they finish reading the file first.
+    wait(pending)
+
+
+class TemporaryDocument:
+  """Pages of a temporary document file, the file is removed when it is closed."""
+
+  def __init__(self, path: str, stats: ExtractionStats | None = None):
+    """Initializes the variables."""
+    self.path = path
+    self.pages = iter_document_pages(path, stats=stats)
+    self._closed = False
+    self._lock = threading.Lock()
+
+  def __iter__(self) -> Iterator[str]:
+    return self.pages
+
+  def close(self) -> None:
+    """Stop the extraction and remove the file, once."""
+    with self._lock:
+      if self._closed:
+        return
+      self._closed = True
+    self.pages.close()
+    try:
+      os.remove(self.path)
+    except FileNotFoundError:
+      pass
@@ -0,0 +1,70 @@
+"""Test cases for PDF text extraction."""
+import os
+
+import fitz
+import pytest
+
+from book_summarizer.ingestion.document_text import ExtractionStats
+from book_summarizer.ingestion.document_text import get_page_count
+from book_summarizer.ingestion.document_text import iter_document_pages
+from book_summarizer.ingestion.document_text import shutdown_process_pool
+from book_summarizer.ingestion.document_text import TemporaryDocument
+from book_summarizer.utils.exception_utils import UnsupportedDocumentError
+
+
+@pytest.fixture(name="pdf_path")
+def fixture_pdf_path(tmp_path):
+  """A 40 page PDF with the page number on every page."""
+  path = str(tmp_path / "book.pdf")
+  with fitz.open() as document:
+    for page_number in range(40):
+      page = document.new_page()
+      page.insert_text((72, 72), f"Chapter {page_number}")
+    document.save(path)
+  return path
+
+
+def test_pages_are_extracted_in_order(pdf_path):
+  """Sequential extraction yields every page and counts it."""
+  stats = ExtractionStats()
+  pages = list(iter_document_pages(pdf_path, stats=stats, workers=1))
+
+  assert [page.strip() for page in pages] == [f"Chapter {index}" for index in range(40)]
+  assert stats.to_dict()["pages"] == 40
+  assert stats.peak_rss_bytes > 0
+
+
+def test_parallel_extraction_keeps_page_order(pdf_path):
+  """Page ranges extracted on the process pool are yielded in document order."""
+  stats = ExtractionStats()
+  try:
+    pages = list(iter_document_pages(pdf_path, stats=stats, workers=2, pages_per_task=3,
+                                     parallel_min_pages=10))
+  finally:
+    shutdown_process_pool()
+
+  assert [page.strip() for page in pages] == [f"Chapter {index}" for index in range(40)]
+  assert stats.pool_peak_rss_bytes > 0
+
+
+def test_temporary_document_is_removed_on_close(pdf_path):
+  """Closing a temporary document removes its file, whether extraction started or not."""
+  document = TemporaryDocument(pdf_path)
+  assert next(iter(document)).strip() == "Chapter 0"
+  document.close()
+  document.close()
+  assert not os.path.exists(pdf_path)
+
+  with open(pdf_path, "wb"):
+    pass
+  TemporaryDocument(pdf_path).close()
+  assert not os.path.exists(pdf_path)
+
+
+def test_unreadable_document_is_rejected(tmp_path):
+  """Files that are not documents raise UnsupportedDocumentError."""
+  path = tmp_path / "book.pdf"
+  path.write_bytes(b"not a pdf")
+
+  with pytest.raises(UnsupportedDocumentError):
+    get_page_count(str(path))
@@ -0,0 +1,270 @@
+"""Resumable backfill of missing book summaries with the in-process model.
+
+Books whose summary is missing or a placeholder are read through a server-side cursor,
+summarized on N inference workers and written back with one bulk UPDATE per batch. Each
+worker generates the final summaries of up to --generate-batch-size books in one padded
+batch. After each batch the last written book id is checkpointed, so a restarted run
+continues there.
+Books that failed are listed in the checkpoint and retried first by the next run, until they
+are summarized or no longer need a summary.
+
+Run with `python -m book_summarizer.jobs.backfill_summaries --workers 4`.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import deque
+from dataclasses import asdict
+from dataclasses import dataclass
+from dataclasses import field
+from typing import Any, Iterable
+
+from sqlalchemy.engine import Row
+
+from book_summarizer.config.config import setting
+from book_summarizer.db.cruds.crud_books import crud_book
+from book_summarizer.db.session import DBSession
+from book_summarizer.ingestion.document_text import iter_document_pages
+from book_summarizer.llm.backends import get_backend
+from book_summarizer.llm.inference_executor import get_default_workers
+from book_summarizer.llm.inference_executor import InferenceExecutor
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Checkpoint:
+  """Progress of a backfill run, books up to last_id are done except failed_ids."""
+  last_id: int = 0
+  summarized: int = 0
+  skipped: int = 0
+  failed_ids: list[int] = field(default_factory=list)
+
+  @classmethod
+  def load(cls, path: str) -> "Checkpoint":
+    """Read a checkpoint, a fresh one when the file does not exist."""
+    if not os.path.exists(path):
+      return cls()
+    with open(path, encoding="utf-8") as checkpoint_file:
+      return cls(**json.load(checkpoint_file))
+
+  def save(self, path: str) -> None:
+    """Write the checkpoint atomically."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as checkpoint_file:
+      json.dump(asdict(self), checkpoint_file)
+    os.replace(f"{path}.tmp", path)
+
+
+@dataclass
+class Progress:
+  """Throughput and ETA of the books processed in this run."""
+  total: int
+  processed: int = 0
+  started_at: float = field(default_factory=time.perf_counter)
+
+  def report(self) -> str:
+    elapsed = time.perf_counter() - self.started_at
+    rate = self.processed / elapsed if elapsed else 0.0
+    eta = (self.total - self.processed) / rate if rate else float("inf")
+    return (f"{self.processed}/{self.total} books, {rate:.2f} books/s,"
+            f" ETA {eta / 60:.1f} min")
+
+
+def describe_book(book: Row) -> str:
+  """Text for books without content: the model summarizes what it knows of the title."""
+  lines = [f"Title: {book.title}", f"Author: {book.author}", f"Genre: {book.genre}",
+           f"Published: {book.year_published}"]
+  return "\n".join(line for line in lines if not line.endswith(": None"))
+
+
+def get_book_content(book: Row, content_dir: str | None) -> str | Iterable[str] | None:
+  """Content of a book from `<content_dir>/<id>.txt|.pdf|.epub`, or its metadata without a dir.
+
+  Returns None when a content directory is given but holds no file for the book.
+  """
+  if content_dir is None:
+    return describe_book(book)
+  text_path = os.path.join(content_dir, f"{book.id}.txt")
+  if os.path.exists(text_path):
+    with open(text_path, encoding="utf-8") as text_file:
+      return text_file.read()
+  for extension in (".pdf", ".epub"):
+    path = os.path.join(content_dir, f"{book.id}{extension}")
+    if os.path.exists(path):
+      return iter_document_pages(path)
+  return None
+
+
+def close_content(content: str | Iterable[str]) -> None:
+  """Close a page iterator, so its document is not read any more."""
+  close = None if isinstance(content, str) else getattr(content, "close", None)
+  if close is not None:
+    close()
+
+
+def summarize_book(book: Row, content_dir: str | None, model_name: str) -> str | None:
+  """Summary of one book, None when it has no content."""
+  content = get_book_content(book, content_dir)
+  if content is None:
+    return None
+  try:
+    return get_backend().summarize(content, model_name=model_name, prompt_name=setting.LLM_PROMPT)
+  finally:
+    close_content(content)
+
+
+def summarize_books(books: list[Row], content_dir: str | None, model_name: str) -> list[Any]:
+  """Summaries of several books generated as one batch, None for books without content.
+
+  When the batch fails its books are summarized one by one, so a broken document only fails
+  its own book. The result of a failed book is its exception.
+  """
+  contents = []
+  try:
+    for book in books:
+      contents.append(get_book_content(book, content_dir))
+    summaries = iter(get_backend().summarize_batch(
+        [content for content in contents if content is not None], model_name=model_name,
+        prompt_name=setting.LLM_PROMPT))
+    return [None if content is None else next(summaries) for content in contents]
+  except Exception as e:  # pylint: disable=broad-except
+    if len(books) == 1:
+      return [e]
+    logger.warning(f"Summarizing a batch of {len(books)} books failed, retrying one by one: {e}")
+  finally:
+    for content in contents:
+      if content is not None:
+        close_content(content)
+  results = []
+  for book in books:
+    try:
+      results.append(summarize_book(book, content_dir, model_name))
+    except Exception as e:  # pylint: disable=broad-except
+      results.append(e)
+  return results
+
+
+async def write_batch(books: list[Row], results: list[Any], checkpoint: Checkpoint,
+                      checkpoint_path: str, retry: bool = False) -> None:
+  """Store the summaries of a finished batch and move the checkpoint past it.
+
+  A retried batch of failed books only updates failed_ids, last_id is already past them.
+  """
+  summaries = {}
+  for book, result in zip(books, results):
+    if isinstance(result, Exception):
+      logger.error(f"Summarizing book {book.id} failed: {result}")
+      if book.id not in checkpoint.failed_ids:
+        checkpoint.failed_ids.append(book.id)
+      continue
+    if retry:
+      checkpoint.failed_ids.remove(book.id)
+    if result is None:
+      checkpoint.skipped += 1
+    else:
+      summaries[book.id] = result
+  async with DBSession() as session:
+    await crud_book.update_summaries(db=session, summaries=summaries)
+  checkpoint.summarized += len(summaries)
+  if not retry:
+    checkpoint.last_id = books[-1].id
+  checkpoint.save(checkpoint_path)
+
+
+async def backfill(workers: int, batch_size: int, checkpoint_path: str,
+                   content_dir: str | None, placeholders: list[str],
+                   model_name: str = setting.LLM_MODEL_NAME,
+                   generate_batch_size: int = setting.LLM_MAX_BATCH_SIZE) -> Checkpoint:
+  """Summarize every book that needs a summary, resuming from the checkpoint.
+
+  Books that failed in earlier runs are retried before the books after last_id.
+  """
+  checkpoint = Checkpoint.load(checkpoint_path)
+  async with DBSession() as session:
+    retry_books = await crud_book.get_missing_summaries(db=session, placeholders=placeholders,
+                                                        book_ids=checkpoint.failed_ids)
+    total = await crud_book.count_missing_summaries(db=session, placeholders=placeholders,
+                                                    after_id=checkpoint.last_id)
+  # Failed books summarized by other means since then are not retried.
+  checkpoint.failed_ids = [book.id for book in retry_books]
+  progress = Progress(total=total + len(retry_books))
+  logger.info(f"{len(retry_books)} failed books to retry and {total} books to summarize"
+              f" after id {checkpoint.last_id}")
+
+  # Two batches in flight keep the workers busy while the previous batch is written.
+  max_pending_batches = 2
+  executor = InferenceExecutor(max_workers=workers, max_queue_size=batch_size * max_pending_batches)
+  await asyncio.to_thread(get_backend().warm_up, model_name)
+  pending: deque[tuple[list[Row], asyncio.Task, bool]] = deque()
+
+  async def flush() -> None:
+    books, results, retry = pending.popleft()
+    await write_batch(books, await results, checkpoint, checkpoint_path, retry)
+    progress.processed += len(books)
+    logger.info(progress.report())
+
+  async def summarize_batch(books: list[Row]) -> list[Any]:
+    """Results of the books in the order given, one inference task per generate batch."""
+    groups = [books[start:start + generate_batch_size]
+              for start in range(0, len(books), generate_batch_size)]
+    results = await asyncio.gather(*(executor.run(summarize_books, group, content_dir, model_name)
+                                     for group in groups), return_exceptions=True)
+    # A task that failed as a whole, e.g. on a full queue, fails each of its books.
+    return [book_result for group, result in zip(groups, results)
+            for book_result in (result if isinstance(result, list) else [result] * len(group))]
+
+  async def submit(books: list[Row], retry: bool = False) -> None:
+    pending.append((books, asyncio.create_task(summarize_batch(books)), retry))
+    if len(pending) == max_pending_batches:
+      await flush()
+
+  try:
+    for start in range(0, len(retry_books), batch_size):
+      await submit(retry_books[start:start + batch_size], retry=True)
+    async with DBSession() as session:
+      async for books in crud_book.stream_missing_summaries(
+          db=session, placeholders=placeholders, after_id=checkpoint.last_id,
+          batch_size=batch_size):
+        await submit(books)
+      while pending:
+        await flush()
+  finally:
+    executor.shutdown()
+  return checkpoint
+
+
+def main() -> None:
+  parser = argparse.ArgumentParser(description=__doc__,
+                                   formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument("--workers", type=int, default=get_default_workers())
+  parser.add_argument("--batch-size", type=int, default=32)
+  parser.add_argument("--checkpoint", default=".cache/backfill_summaries.json")
+  parser.add_argument("--content-dir", default=None,
+                      help="directory of <book id>.txt/.pdf/.epub files, books without one are"
+                      " skipped; without it books are summarized from their metadata")
+  parser.add_argument("--placeholder", action="append", default=None,
+                      help="summary value that counts as missing, may be repeated")
+  parser.add_argument("--model-name", default=setting.LLM_MODEL_NAME)
+  parser.add_argument("--generate-batch-size", type=int, default=setting.LLM_MAX_BATCH_SIZE,
+                      help="books whose final summaries are generated in one batch")
+  parser.add_argument("--restart", action="store_true", help="ignore an existing checkpoint")
+  args = parser.parse_args()
+
+  logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+  if args.restart and os.path.exists(args.checkpoint):
+    os.remove(args.checkpoint)
+  checkpoint = asyncio.run(backfill(workers=args.workers, batch_size=args.batch_size,
+                                    checkpoint_path=args.checkpoint, content_dir=args.content_dir,
+                                    placeholders=args.placeholder or ["placeholder"],
+                                    model_name=args.model_name,
+                                    generate_batch_size=args.generate_batch_size))
+  logger.info(f"Done: {checkpoint.summarized} summarized, {checkpoint.skipped} skipped,"
+              f" {len(checkpoint.failed_ids)} failed")
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,105 @@
+"""Background worker that processes queued summary jobs and writes summaries to books."""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable
+
+from book_summarizer.config.config import setting
+from book_summarizer.db.cruds.crud_summary_jobs import crud_summary_job
+from book_summarizer.db.models.models import SummaryJobs
+from book_summarizer.db.session import DBSession
+from book_summarizer.llm.summary_service import summarize
+from book_summarizer.utils.exception_utils import InferenceQueueFullError
+
+logger = logging.getLogger(__name__)
+
+
+class SummaryJobWorker:
+  """Claims jobs from the summary_jobs table and summarizes them on the inference pool.
+
+  Jobs are claimed with a lease, so a job left running by a crashed worker is picked up
+  again once its lease expires.
+  """
+
+  def __init__(self, concurrency: int = setting.SUMMARY_JOB_CONCURRENCY,
+               poll_seconds: float = setting.SUMMARY_JOB_POLL_SECONDS,
+               lease_seconds: int = setting.SUMMARY_JOB_LEASE_SECONDS,
+               max_attempts: int = setting.SUMMARY_JOB_MAX_ATTEMPTS):
+    """Initializes the variables."""
+    self.concurrency = max(1, concurrency)
+    self.poll_seconds = poll_seconds
+    self.lease_seconds = lease_seconds
+    self.max_attempts = max_attempts
+    self._wake: asyncio.Event | None = None
+    self._tasks: list[asyncio.Task] = []
+
+  def start(self) -> None:
+    """Start the worker loops on the running event loop."""
+    self._wake = asyncio.Event()
+    self._tasks = [asyncio.create_task(self._run()) for _ in range(self.concurrency)]
+
+  async def stop(self) -> None:
+    """Cancel the worker loops, running jobs are put back in the queue."""
+    for task in self._tasks:
+      task.cancel()
+    await asyncio.gather(*self._tasks, return_exceptions=True)
+    self._tasks = []
+
+  def notify(self) -> None:
+    """Wake an idle worker loop because a job was queued."""
+    if self._wake is not None:
+      self._wake.set()
+
+  async def _run(self) -> None:
+    """Process jobs until cancelled, waiting for a notification or the poll interval when idle."""
+    while True:
+      try:
+        processed = await self.process_next()
+      except asyncio.CancelledError:
+        raise
+      except Exception as e:  # pylint: disable=broad-except
+        logger.error(f"Summary job worker error: {e}")
+        processed = False
+      if not processed:
+        try:
+          await asyncio.wait_for(self._wake.wait(), timeout=self.poll_seconds)
+        except asyncio.TimeoutError:
+          pass
+        self._wake.clear()
+
+  async def process_next(self) -> bool:
+    """Claim and process one job, returns False when there was nothing to do.
+
+    No database connection is held while the job is summarized, the job is claimed and
+    finished in sessions of their own.
+    """
+    async with DBSession() as session:
+      job = await crud_summary_job.claim_next(db=session, lease_seconds=self.lease_seconds,
+                                              max_attempts=self.max_attempts)
+    if job is None:
+      return False
+    try:
+      summary = await summarize(content=job.content or "", model_name=job.model_name)
+    except InferenceQueueFullError:
+      # Interactive requests fill the queue, try again on the next poll.
+      await update_job(crud_summary_job.release, job)
+      return False
+    except asyncio.CancelledError:
+      await update_job(crud_summary_job.release, job)
+      raise
+    except Exception as e:  # pylint: disable=broad-except
+      logger.error(f"Summary job {job.id} failed: {e}")
+      await update_job(crud_summary_job.mark_failed, job, error=str(e),
+                       retry=job.attempts < self.max_attempts)
+      return True
+    await update_job(crud_summary_job.mark_done, job, summary=summary)
+    return True
+
+
+async def update_job(update: Callable[..., Awaitable[SummaryJobs]], job: SummaryJobs,
+                     **kwargs: Any) -> SummaryJobs:
+  """Apply a CRUD update to a job claimed in a session that is closed by now."""
+  async with DBSession() as session:
+    return await update(db=session, job=await session.merge(job), **kwargs)
+
+
+summary_job_worker = SummaryJobWorker()
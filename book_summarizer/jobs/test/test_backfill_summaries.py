@@ -0,0 +1,114 @@
+"""Test cases for the summary backfill."""
+import asyncio
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+from book_summarizer.jobs import backfill_summaries
+from book_summarizer.jobs.backfill_summaries import Checkpoint
+from book_summarizer.jobs.backfill_summaries import get_book_content
+from book_summarizer.jobs.backfill_summaries import summarize_books
+from book_summarizer.jobs.backfill_summaries import write_batch
+
+BOOK = SimpleNamespace(id=7, title="The King", author="A. Writer", genre=None, year_published=1901)
+
+
+def test_checkpoint_round_trip(tmp_path):
+  """A saved checkpoint is loaded back, a missing one starts from scratch."""
+  path = str(tmp_path / "backfill" / "checkpoint.json")
+  assert Checkpoint.load(path) == Checkpoint()
+
+  Checkpoint(last_id=42, summarized=40, skipped=1, failed_ids=[13]).save(path)
+  assert Checkpoint.load(path) == Checkpoint(last_id=42, summarized=40, skipped=1,
+                                             failed_ids=[13])
+
+
+def test_book_content_sources(tmp_path):
+  """Content comes from the content directory, or from the metadata without one."""
+  assert get_book_content(BOOK, None) == "Title: The King\nAuthor: A. Writer\nPublished: 1901"
+  assert get_book_content(BOOK, str(tmp_path)) is None
+
+  (tmp_path / "7.txt").write_text("Once there was a king.", encoding="utf-8")
+  assert get_book_content(BOOK, str(tmp_path)) == "Once there was a king."
+
+
+def test_failed_books_stay_listed_until_retried(tmp_path, monkeypatch):
+  """Failed books are kept for the next run, a retry does not move last_id back."""
+  written = {}
+
+  @asynccontextmanager
+  async def session():
+    yield None
+
+  async def update_summaries(db, summaries):
+    written.update(summaries)
+
+  monkeypatch.setattr(backfill_summaries, "DBSession", session)
+  monkeypatch.setattr(backfill_summaries.crud_book, "update_summaries", update_summaries)
+  path = str(tmp_path / "checkpoint.json")
+  books = [SimpleNamespace(id=book_id) for book_id in (3, 5, 8)]
+  checkpoint = Checkpoint()
+
+  asyncio.run(write_batch(books, ["three", RuntimeError("timeout"), "eight"], checkpoint, path))
+  assert Checkpoint.load(path) == Checkpoint(last_id=8, summarized=2, failed_ids=[5])
+
+  asyncio.run(write_batch(books[1:2], ["five"], checkpoint, path, retry=True))
+  assert Checkpoint.load(path) == Checkpoint(last_id=8, summarized=3, failed_ids=[])
+  assert written == {3: "three", 5: "five", 8: "eight"}
+
+
+class PageIterator:
+  """Pages of a document that records whether it was closed."""
+
+  def __init__(self, pages):
+    self.pages = iter(pages)
+    self.closed = False
+
+  def __iter__(self):
+    return self.pages
+
+  def close(self):
+    self.closed = True
+
+
+def test_books_are_summarized_as_one_batch(tmp_path, monkeypatch):
+  """Books with content share one batch call, a failed batch is retried book by book."""
+  (tmp_path / "3.txt").write_text("Once there was a king.", encoding="utf-8")
+  (tmp_path / "5.txt").write_text("BROKEN", encoding="utf-8")
+  (tmp_path / "8.txt").write_text("The sea.", encoding="utf-8")
+  batches = []
+
+  def summarize(content, model_name, prompt_name):
+    if content == "BROKEN":
+      raise RuntimeError("unreadable")
+    return content.upper()
+
+  def summarize_batch(contents, model_name, prompt_name):
+    batches.append(contents)
+    return [summarize(content, model_name, prompt_name) for content in contents]
+
+  backend = SimpleNamespace(summarize=summarize, summarize_batch=summarize_batch)
+  monkeypatch.setattr(backfill_summaries, "get_backend", lambda: backend)
+  books = [SimpleNamespace(id=book_id) for book_id in (3, 4, 8)]
+  assert summarize_books(books, str(tmp_path), "model") == ["ONCE THERE WAS A KING.", None,
+                                                            "THE SEA."]
+  assert batches == [["Once there was a king.", "The sea."]]
+
+  books = [SimpleNamespace(id=book_id) for book_id in (3, 5)]
+  results = summarize_books(books, str(tmp_path), "model")
+  assert results[0] == "ONCE THERE WAS A KING."
+  assert isinstance(results[1], RuntimeError)
+
+
+def test_pages_are_closed_when_summarizing_fails(monkeypatch):
+  """Page iterators are closed also when the backend raises."""
+  pages = PageIterator(["Once there was a king."])
+
+  def summarize(content, model_name, prompt_name):
+    raise RuntimeError("out of memory")
+
+  backend = SimpleNamespace(summarize=summarize, summarize_batch=summarize)
+  monkeypatch.setattr(backfill_summaries, "get_backend", lambda: backend)
+  monkeypatch.setattr(backfill_summaries, "get_book_content", lambda book, content_dir: pages)
+  results = summarize_books([BOOK], None, "model")
+  assert isinstance(results[0], RuntimeError)
+  assert pages.closed
@@ -0,0 +1,136 @@
+"""Assisted (speculative) decoding: a small draft model proposes tokens the main model verifies."""
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Iterator
+
+from book_summarizer.config.config import setting
+from book_summarizer.llm.get_llm import get_transformers_version
+from book_summarizer.llm.model_registry import ModelEntry
+
+logger = logging.getLogger(__name__)
+
+# Drafts with another vocabulary (universal assisted decoding) need transformers 4.46.
+UNIVERSAL_ASSISTED_MIN_TRANSFORMERS = (4, 46)
+
+
+class ForwardCounter:
+  """Counts forward passes of a model made from the thread that created the counter."""
+
+  def __init__(self):
+    """Initializes the variables."""
+    self.thread_id = threading.get_ident()
+    self.count = 0
+
+  def __call__(self, module: Any, args: Any, output: Any) -> None:
+    if threading.get_ident() == self.thread_id:
+      self.count += 1
+
+
+@contextmanager
+def count_forwards(model: Any) -> Iterator[ForwardCounter]:
+  """Count the forward passes of a model in this thread while the block runs."""
+  counter = ForwardCounter()
+  handle = model.register_forward_hook(counter)
+  try:
+    yield counter
+  finally:
+    handle.remove()
+
+
+class AssistedStats:
+  """Acceptance of draft tokens across assisted generations.
+
+  Each verification step is one forward pass of the main model and yields the accepted draft
+  tokens plus one token of its own, and each draft forward pass proposes one token.
+  """
+
+  def __init__(self):
+    """Initializes the variables."""
+    self._lock = threading.Lock()
+    self.reset()
+
+  def reset(self) -> None:
+    """Start counting from zero."""
+    with self._lock:
+      self.generations = 0
+      self.generated_tokens = 0
+      self.verify_steps = 0
+      self.draft_tokens = 0
+
+  def record(self, generated_tokens: int, verify_steps: int, draft_tokens: int) -> None:
+    """Add the counts of one generation."""
+    with self._lock:
+      self.generations += 1
+      self.generated_tokens += generated_tokens
+      self.verify_steps += verify_steps
+      self.draft_tokens += draft_tokens
+
+  def stats(self) -> dict[str, Any]:
+    """Acceptance rate of draft tokens and tokens produced per main model forward pass."""
+    with self._lock:
+      accepted = max(0, self.generated_tokens - self.verify_steps)
+      return {
+          "draft_model_name": setting.LLM_DRAFT_MODEL_NAME,
+          "num_assistant_tokens": setting.LLM_NUM_ASSISTANT_TOKENS,
+          "generations": self.generations,
+          "generated_tokens": self.generated_tokens,
+          "draft_tokens": self.draft_tokens,
+          "accepted_tokens": accepted,
+          "acceptance_rate": accepted / self.draft_tokens if self.draft_tokens else None,
+          "tokens_per_verify_step": (self.generated_tokens / self.verify_steps
+                                     if self.verify_steps else None),
+      }
+
+
+assisted_stats = AssistedStats()
+
+
+_same_vocabulary: dict[tuple[str, str], bool] = {}
+# Pairs of models that generate without their draft, logged once.
+_unassisted: set[tuple[str, str]] = set()
+
+
+def has_same_vocabulary(entry: ModelEntry, draft_entry: ModelEntry) -> bool:
+  """Whether both tokenizers map text to the same ids, compared once per pair of models."""
+  key = (entry.model_name, draft_entry.model_name)
+  if key not in _same_vocabulary:
+    _same_vocabulary[key] = entry.tokenizer.get_vocab() == draft_entry.tokenizer.get_vocab()
+  return _same_vocabulary[key]
+
+
+def can_assist(entry: ModelEntry, draft_entry: ModelEntry) -> bool:
+  """Whether the installed transformers can draft for a model with this draft model."""
+  if has_same_vocabulary(entry, draft_entry):
+    return True
+  if get_transformers_version() >= UNIVERSAL_ASSISTED_MIN_TRANSFORMERS:
+    return True
+  key = (entry.model_name, draft_entry.model_name)
+  if key not in _unassisted:
+    _unassisted.add(key)
+    logger.warning("Not drafting %s with %s, their vocabularies differ and transformers is"
+                   " older than %d.%d", *key, *UNIVERSAL_ASSISTED_MIN_TRANSFORMERS)
+  return False
+
+
+def get_assisted_kwargs(entry: ModelEntry, draft_entry: ModelEntry) -> dict[str, Any]:
+  """generate() kwargs that let the draft model propose tokens for the main model."""
+  from transformers import GenerationConfig  # pylint: disable=import-outside-toplevel
+  kwargs: dict[str, Any] = {"assistant_model": draft_entry.model}
+  # Older versions draft a fixed number of tokens and reject the setting.
+  if hasattr(GenerationConfig(), "num_assistant_tokens"):
+    kwargs["num_assistant_tokens"] = setting.LLM_NUM_ASSISTANT_TOKENS
+  if not has_same_vocabulary(entry, draft_entry):
+    # Drafts with another vocabulary go through text, see universal assisted decoding.
+    kwargs.update(tokenizer=entry.tokenizer, assistant_tokenizer=draft_entry.tokenizer)
+  return kwargs
+
+
+def generate_assisted(entry: ModelEntry, draft_entry: ModelEntry, inputs: dict[str, Any],
+                      **kwargs: Any) -> Any:
+  """generate() of one prompt with the draft model, recording its acceptance statistics."""
+  with count_forwards(entry.model) as verify_steps, count_forwards(draft_entry.model) as drafts:
+    outputs = entry.model.generate(**inputs, **get_assisted_kwargs(entry, draft_entry), **kwargs)
+  assisted_stats.record(generated_tokens=outputs.shape[1] - inputs["input_ids"].shape[1],
+                        verify_steps=verify_steps.count, draft_tokens=drafts.count)
+  return outputs
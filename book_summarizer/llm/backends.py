@@ -0,0 +1,185 @@
+"""Generation backends behind the summarization service, selected with LLM_BACKEND."""
+import hashlib
+import threading
+import time
+from abc import ABC
+from abc import abstractmethod
+from typing import Any, Callable, Iterable, Iterator
+
+from book_summarizer.config.config import setting
+from book_summarizer.llm.batching import BatchScheduler
+from book_summarizer.llm.model_registry import model_registry
+from book_summarizer.llm.telemetry import record_generation
+
+
+class LLMBackend(ABC):
+  """Summarizes content of any length, blocking the calling inference worker."""
+
+  @abstractmethod
+  def summarize(self, content: str | Iterable[str], model_name: str, prompt_name: str,
+                **params: Any) -> str:
+    """Summary of the content."""
+
+  @abstractmethod
+  def stream_summary(self, content: str | Iterable[str], model_name: str, prompt_name: str,
+                     stop_event: threading.Event | None = None, **params: Any) -> Iterator[str]:
+    """Yield the summary text as it is generated, until done or the stop event is set."""
+
+  def summarize_batch(self, contents: list[str | Iterable[str]], model_name: str,
+                      prompt_name: str, **params: Any) -> list[str]:
+    """Summaries of several contents, backends that generate in batches override it."""
+    return [self.summarize(content, model_name=model_name, prompt_name=prompt_name, **params)
+            for content in contents]
+
+  def count_tokens(self, texts: list[str], model_name: str) -> list[int]:
+    """Number of tokens of each text, words unless the backend has a tokenizer."""
+    return [len(text.split()) for text in texts]
+
+  def warm_up(self, model_name: str) -> None:
+    """Load what the first request needs."""
+
+  def batching_stats(self, model_name: str) -> dict[str, Any] | None:
+    """Statistics of the micro-batching scheduler, None when batching is off."""
+    return None
+
+  def close(self) -> None:
+    """Release loaded models."""
+
+
+class TransformersBackend(LLMBackend):
+  """Hugging Face transformers models loaded through the model registry.
+
+  llm_summarize imports torch and transformers, so it is imported on first use and workers
+  that never summarize do not pay for it.
+  """
+
+  @property
+  def llm_summarize(self) -> Any:
+    from book_summarizer.llm import llm_summarize  # pylint: disable=import-outside-toplevel
+    return llm_summarize
+
+  def summarize(self, content: str | Iterable[str], model_name: str, prompt_name: str,
+                **params: Any) -> str:
+    return self.llm_summarize.get_content_summary(content, model_name=model_name,
+                                                  prompt_name=prompt_name, **params)
+
+  def stream_summary(self, content: str | Iterable[str], model_name: str, prompt_name: str,
+                     stop_event: threading.Event | None = None, **params: Any) -> Iterator[str]:
+    return self.llm_summarize.stream_content_summary(content, model_name=model_name,
+                                                     prompt_name=prompt_name,
+                                                     stop_event=stop_event, **params)
+
+  def summarize_batch(self, contents: list[str | Iterable[str]], model_name: str,
+                      prompt_name: str, **params: Any) -> list[str]:
+    return self.llm_summarize.get_content_summaries(contents, model_name=model_name,
+                                                    prompt_name=prompt_name, **params)
+
+  def count_tokens(self, texts: list[str], model_name: str) -> list[int]:
+    if not texts:
+      return []
+    tokenizer, _ = model_registry.get_llm_and_tokenizer(model_name=model_name)
+    return [len(ids) for ids in tokenizer(texts, add_special_tokens=False)["input_ids"]]
+
+  def warm_up(self, model_name: str) -> None:
+    model_registry.warm_up([model_name])
+    self.llm_summarize.warm_up_prefix_caches(model_name)
+
+  def batching_stats(self, model_name: str) -> dict[str, Any] | None:
+    if not setting.LLM_BATCHING_ENABLED:
+      return None
+    return self.llm_summarize.get_batch_scheduler(model_name=model_name).stats()
+
+  def close(self) -> None:
+    model_registry.clear()
+
+
+class StubBackend(LLMBackend):
+  """Deterministic offline backend with configurable latency, for load tests and benchmarks.
+
+  A generate call sleeps latency_ms plus token_latency_ms per summary word, once per batch
+  like a batched forward pass, and returns a hash of the input followed by its first words.
+  """
+
+  def __init__(self, latency_ms: float = setting.LLM_STUB_LATENCY_MS,
+               token_latency_ms: float = setting.LLM_STUB_TOKEN_LATENCY_MS,
+               summary_words: int = setting.LLM_STUB_SUMMARY_WORDS):
+    """Initializes the variables."""
+    self.latency_s = max(0.0, latency_ms) / 1000
+    self.token_latency_s = max(0.0, token_latency_ms) / 1000
+    self.summary_words = max(1, summary_words)
+    self._scheduler: BatchScheduler | None = None
+    self._lock = threading.Lock()
+
+  def make_summary(self, llm_input: str) -> list[str]:
+    """Words of the deterministic summary of a model input."""
+    digest = hashlib.sha256(llm_input.encode("utf-8")).hexdigest()[:12]
+    return [f"[{digest}]"] + llm_input.split()[:self.summary_words - 1]
+
+  def generate(self, llm_inputs: list[str]) -> list[str]:
+    """Summaries of several inputs at the cost of one batched generate call."""
+    time.sleep(self.latency_s + self.token_latency_s * self.summary_words)
+    record_generation(prompt_tokens=self.count_tokens(llm_inputs, model_name=""),
+                      generated_tokens=[self.summary_words] * len(llm_inputs),
+                      prefill_s=self.latency_s, decode_s=self.token_latency_s * self.summary_words)
+    return [" ".join(self.make_summary(llm_input)) for llm_input in llm_inputs]
+
+  def get_scheduler(self) -> BatchScheduler:
+    """Micro-batching scheduler shared by all stub requests."""
+    with self._lock:
+      if self._scheduler is None:
+        self._scheduler = BatchScheduler(generate_fn=self.generate)
+      return self._scheduler
+
+  def summarize(self, content: str | Iterable[str], model_name: str, prompt_name: str,
+                **params: Any) -> str:
+    llm_input = prompt_name + "\n" + (content if isinstance(content, str) else "".join(content))
+    if setting.LLM_BATCHING_ENABLED:
+      return self.get_scheduler().generate(llm_input)
+    return self.generate([llm_input])[0]
+
+  def summarize_batch(self, contents: list[str | Iterable[str]], model_name: str,
+                      prompt_name: str, **params: Any) -> list[str]:
+    return self.generate([prompt_name + "\n" + (content if isinstance(content, str)
+                                                 else "".join(content)) for content in contents])
+
+  def stream_summary(self, content: str | Iterable[str], model_name: str, prompt_name: str,
+                     stop_event: threading.Event | None = None, **params: Any) -> Iterator[str]:
+    stop_event = stop_event or threading.Event()
+    llm_input = prompt_name + "\n" + (content if isinstance(content, str) else "".join(content))
+    if stop_event.wait(self.latency_s):
+      return
+    for index, word in enumerate(self.make_summary(llm_input)):
+      if stop_event.wait(self.token_latency_s):
+        return
+      yield word if index == 0 else " " + word
+
+  def batching_stats(self, model_name: str) -> dict[str, Any] | None:
+    if not setting.LLM_BATCHING_ENABLED:
+      return None
+    return self.get_scheduler().stats()
+
+
+_backend_factories: dict[str, Callable[[], LLMBackend]] = {
+    "transformers": TransformersBackend,
+    "stub": StubBackend,
+}
+_backends: dict[str, LLMBackend] = {}
+_backends_lock = threading.Lock()
+
+
+def register_backend(name: str, factory: Callable[[], LLMBackend]) -> None:
+  """Make a backend selectable by name in LLM_BACKEND."""
+  with _backends_lock:
+    _backend_factories[name] = factory
+    _backends.pop(name, None)
+
+
+def get_backend(name: str | None = None) -> LLMBackend:
+  """Get the backend instance of a name, LLM_BACKEND by default."""
+  name = name or setting.LLM_BACKEND
+  with _backends_lock:
+    if name not in _backends:
+      if name not in _backend_factories:
+        raise ValueError(f"Unknown LLM backend {name}, expected one of {sorted(_backend_factories)}")
+      _backends[name] = _backend_factories[name]()
+    return _backends[name]
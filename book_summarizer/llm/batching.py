@@ -0,0 +1,111 @@
+"""Dynamic micro-batching of concurrent generation requests."""
+import logging
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from book_summarizer.config.config import setting
+from book_summarizer.llm.telemetry import RequestTelemetry
+from book_summarizer.llm.telemetry import current_request
+from book_summarizer.llm.telemetry import recording_into
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PendingRequest:
+  """A prompt waiting for a batch slot and the future its caller waits on."""
+  llm_input: str
+  future: Future
+  telemetry: RequestTelemetry | None = None
+
+
+class BatchScheduler:
+  """Groups concurrent prompts into one padded generate call."""
+
+  def __init__(self, generate_fn: Callable[[list[str]], list[str]],
+               max_batch_size: int = setting.LLM_MAX_BATCH_SIZE,
+               max_wait_ms: float = setting.LLM_MAX_BATCH_WAIT_MS):
+    """Initializes the variables."""
+    self.generate_fn = generate_fn
+    self.max_batch_size = max(1, max_batch_size)
+    self.max_wait_s = max(0.0, max_wait_ms) / 1000
+    self._queue: queue.Queue[PendingRequest] = queue.Queue()
+    self._worker: threading.Thread | None = None
+    self._lock = threading.Lock()
+    self._batch_sizes: Counter[int] = Counter()
+
+  def submit(self, llm_input: str) -> Future:
+    """Queue a prompt for the next batch."""
+    future: Future = Future()
+    self._queue.put(PendingRequest(llm_input=llm_input, future=future, telemetry=current_request()))
+    self._ensure_worker()
+    return future
+
+  def generate(self, llm_input: str) -> str:
+    """Queue a prompt and block until its output is ready."""
+    return self.submit(llm_input).result()
+
+  def _ensure_worker(self) -> None:
+    """Start the batching thread on first use."""
+    with self._lock:
+      if self._worker is None or not self._worker.is_alive():
+        self._worker = threading.Thread(target=self._run, name="llm-batcher", daemon=True)
+        self._worker.start()
+
+  def _collect(self) -> list[PendingRequest]:
+    """Wait for one request, then gather more until the batch is full or the wait expires."""
+    batch = [self._queue.get()]
+    deadline = time.monotonic() + self.max_wait_s
+    while len(batch) < self.max_batch_size:
+      remaining = deadline - time.monotonic()
+      try:
+        batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+      except queue.Empty:
+        break
+    # Callers that gave up while waiting are dropped from the batch.
+    return [request for request in batch if request.future.set_running_or_notify_cancel()]
+
+  def _run(self) -> None:
+    """Batching loop, runs forever on a daemon thread."""
+    while True:
+      batch = self._collect()
+      if not batch:
+        continue
+      try:
+        with recording_into([request.telemetry for request in batch]):
+          outputs = self.generate_fn([request.llm_input for request in batch])
+      except Exception as e:  # pylint: disable=broad-except
+        logger.error(f"Batch of {len(batch)} failed: {e}")
+        for request in batch:
+          request.future.set_exception(e)
+        continue
+      if len(outputs) != len(batch):
+        error = RuntimeError(f"Batch of {len(batch)} returned {len(outputs)} outputs")
+        logger.error(str(error))
+        for request in batch:
+          request.future.set_exception(error)
+        continue
+      with self._lock:
+        self._batch_sizes[len(batch)] += 1
+      for request, output in zip(batch, outputs):
+        request.future.set_result(output)
+
+  def stats(self) -> dict[str, Any]:
+    """Number of batches and their sizes."""
+    with self._lock:
+      batches = sum(self._batch_sizes.values())
+      requests = sum(size * count for size, count in self._batch_sizes.items())
+      return {
+          "max_batch_size": self.max_batch_size,
+          "max_wait_ms": self.max_wait_s * 1000,
+          "pending": self._queue.qsize(),
+          "batches": batches,
+          "requests": requests,
+          "mean_batch_size": requests / batches if batches else 0.0,
+          "batch_sizes": dict(sorted(self._batch_sizes.items())),
+      }
@@ -0,0 +1,63 @@
+"""Benchmark tokens/sec of assisted decoding with a draft model against plain generate.
+
+Run with `python -m book_summarizer.llm.benchmark.bench_assisted --model-name <model>
+--draft-model-name <small model>`.
+"""
+import argparse
+import time
+
+from book_summarizer.config.config import setting
+from book_summarizer.llm.assisted import assisted_stats
+from book_summarizer.llm.llm_summarize import generate_batch
+from book_summarizer.llm.model_registry import model_registry
+
+PROMPTS = [
+    "Summarize in one paragraph: Once there was a king who ruled a small kingdom by the sea.",
+    "Summarize in one paragraph: A young fairy leaves her forest to find the lost river.",
+    "Summarize in one paragraph: Two rival bakers in Paris compete for a royal contract.",
+]
+
+
+def run(model_name: str, max_new_tokens: int) -> float:
+  """Generated tokens/sec over the prompts, one prompt at a time."""
+  tokenizer, _ = model_registry.get_llm_and_tokenizer(model_name=model_name)
+  tokens, seconds = 0, 0.0
+  for prompt in PROMPTS:
+    start = time.perf_counter()
+    output = generate_batch([prompt], model_name=model_name, max_new_tokens=max_new_tokens)[0]
+    seconds += time.perf_counter() - start
+    tokens += len(tokenizer(output, add_special_tokens=False)["input_ids"])
+  return tokens / seconds
+
+
+def main() -> None:
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument("--model-name", default=setting.LLM_MODEL_NAME)
+  parser.add_argument("--draft-model-name", default=setting.LLM_DRAFT_MODEL_NAME,
+                      required=setting.LLM_DRAFT_MODEL_NAME is None)
+  parser.add_argument("--num-assistant-tokens", type=int, nargs="+", default=[3, 5, 8])
+  parser.add_argument("--max-new-tokens", type=int, default=128)
+  args = parser.parse_args()
+
+  setting.LLM_PREFIX_CACHE_ENABLED = False
+  model_registry.warm_up([args.model_name, args.draft_model_name])
+
+  setting.LLM_DRAFT_MODEL_NAME = None
+  plain = run(args.model_name, args.max_new_tokens)
+  print(f"{'mode':>9} {'draft k':>7} {'tokens/s':>9} {'speedup':>7} {'accepted':>8}"
+        f" {'tokens/step':>11}")
+  print(f"{'plain':>9} {'-':>7} {plain:>9.1f} {1.0:>6.1f}x {'-':>8} {'1.00':>11}")
+
+  setting.LLM_DRAFT_MODEL_NAME = args.draft_model_name
+  for num_assistant_tokens in args.num_assistant_tokens:
+    setting.LLM_NUM_ASSISTANT_TOKENS = num_assistant_tokens
+    assisted_stats.reset()
+    tokens_per_s = run(args.model_name, args.max_new_tokens)
+    stats = assisted_stats.stats()
+    print(f"{'assisted':>9} {num_assistant_tokens:>7} {tokens_per_s:>9.1f}"
+          f" {tokens_per_s / plain:>6.1f}x {stats['acceptance_rate'] or 0:>8.2f}"
+          f" {stats['tokens_per_verify_step'] or 0:>11.2f}")
+
+
+if __name__ == "__main__":
+  main()
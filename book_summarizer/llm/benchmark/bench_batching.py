@@ -0,0 +1,69 @@
+"""Benchmark generation throughput with and without micro-batching.
+
+Run with `python -m book_summarizer.llm.benchmark.bench_batching --model-name <model>`.
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from book_summarizer.config.config import setting
+from book_summarizer.llm.batching import BatchScheduler
+from book_summarizer.llm.llm_summarize import generate_batch
+from book_summarizer.llm.model_registry import model_registry
+
+PROMPTS = [
+    "Summarize in one paragraph: Once there was a king who ruled a small kingdom by the sea.",
+    "Summarize in one paragraph: A young fairy leaves her forest to find the lost river.",
+    "Summarize in one paragraph: Two rival bakers in Paris compete for a royal contract.",
+    "Summarize in one paragraph: A detective searches a snowed-in train for a missing letter.",
+]
+
+
+def run(concurrency: int, requests: int, model_name: str, max_new_tokens: int,
+        scheduler: BatchScheduler | None) -> dict[str, float]:
+  """Send `requests` prompts from `concurrency` threads and measure generated tokens/sec."""
+  tokenizer, _ = model_registry.get_llm_and_tokenizer(model_name=model_name)
+
+  def call(index: int) -> str:
+    llm_input = PROMPTS[index % len(PROMPTS)]
+    if scheduler is not None:
+      return scheduler.generate(llm_input)
+    return generate_batch([llm_input], model_name=model_name, max_new_tokens=max_new_tokens)[0]
+
+  start = time.perf_counter()
+  with ThreadPoolExecutor(max_workers=concurrency) as pool:
+    outputs = list(pool.map(call, range(requests)))
+  elapsed = time.perf_counter() - start
+  tokens = sum(len(tokenizer(output)["input_ids"]) for output in outputs)
+  return {"seconds": elapsed, "tokens": tokens, "tokens_per_s": tokens / elapsed}
+
+
+def main() -> None:
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument("--model-name", default=setting.LLM_MODEL_NAME)
+  parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+  parser.add_argument("--requests-per-level", type=int, default=32)
+  parser.add_argument("--max-new-tokens", type=int, default=64)
+  parser.add_argument("--max-batch-size", type=int, default=setting.LLM_MAX_BATCH_SIZE)
+  parser.add_argument("--max-wait-ms", type=float, default=setting.LLM_MAX_BATCH_WAIT_MS)
+  args = parser.parse_args()
+
+  model_registry.warm_up([args.model_name])
+  scheduler = BatchScheduler(
+      generate_fn=lambda llm_inputs: generate_batch(
+          llm_inputs, model_name=args.model_name, max_new_tokens=args.max_new_tokens),
+      max_batch_size=args.max_batch_size,
+      max_wait_ms=args.max_wait_ms)
+
+  print(f"{'concurrency':>11} {'mode':>9} {'seconds':>8} {'tokens':>7} {'tokens/s':>9}")
+  for concurrency in args.concurrency:
+    requests = max(args.requests_per_level, concurrency)
+    for mode, mode_scheduler in (("unbatched", None), ("batched", scheduler)):
+      result = run(concurrency, requests, args.model_name, args.max_new_tokens, mode_scheduler)
+      print(f"{concurrency:>11} {mode:>9} {result['seconds']:>8.2f} {result['tokens']:>7}"
+            f" {result['tokens_per_s']:>9.1f}")
+  print(f"batch sizes: {scheduler.stats()['batch_sizes']}")
+
+
+if __name__ == "__main__":
+  main()
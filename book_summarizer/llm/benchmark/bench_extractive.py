@@ -0,0 +1,64 @@
+"""Benchmark summary latency against input reduction of the extractive stage on long texts.
+
+Run with `python -m book_summarizer.llm.benchmark.bench_extractive --path <book.txt>`, without
+--path a synthetic text of --sentences sentences is used.
+"""
+import argparse
+import random
+import time
+
+from book_summarizer.config.config import setting
+from book_summarizer.llm.backends import get_backend
+from book_summarizer.llm.extractive import reduce_content
+
+SUBJECTS = ["The king", "The young fairy", "A baker", "The detective", "Her brother", "The village"]
+VERBS = ["visited", "feared", "rebuilt", "searched", "remembered", "sold", "guarded"]
+OBJECTS = ["the old mill", "the castle by the sea", "a red umbrella", "the lost river",
+           "the royal contract", "a snowed-in train", "the northern forest"]
+
+
+def make_text(sentences: int, seed: int = 0) -> str:
+  """Synthetic story of recurring characters and places."""
+  rng = random.Random(seed)
+  return " ".join(f"{rng.choice(SUBJECTS)} {rng.choice(VERBS)} {rng.choice(OBJECTS)}."
+                  for _ in range(sentences))
+
+
+def main() -> None:
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument("--model-name", default=setting.LLM_MODEL_NAME)
+  parser.add_argument("--backend", default=setting.LLM_BACKEND)
+  parser.add_argument("--path", default=None)
+  parser.add_argument("--sentences", type=int, default=2000)
+  parser.add_argument("--budgets", type=int, nargs="+", default=[512, 2048])
+  parser.add_argument("--methods", nargs="+", default=["textrank", "tfidf"])
+  args = parser.parse_args()
+
+  if args.path:
+    with open(args.path, encoding="utf-8") as book:
+      content = book.read()
+  else:
+    content = make_text(args.sentences)
+  backend = get_backend(args.backend)
+  backend.warm_up(args.model_name)
+  input_tokens = sum(backend.count_tokens([content], args.model_name))
+
+  print(f"{'method':>8} {'budget':>7} {'tokens':>7} {'reduction':>9} {'extract s':>9}"
+        f" {'summary s':>9} {'total s':>8}")
+  runs = [("off", input_tokens)] + [(method, budget) for method in args.methods
+                                    for budget in args.budgets]
+  for method, budget in runs:
+    start = time.perf_counter()
+    reduced = reduce_content(content, budget_tokens=budget, method=method,
+                             count_tokens=lambda texts: backend.count_tokens(texts, args.model_name))
+    extract_s = time.perf_counter() - start
+    tokens = sum(backend.count_tokens([reduced], args.model_name))
+    start = time.perf_counter()
+    backend.summarize(reduced, model_name=args.model_name, prompt_name=setting.LLM_PROMPT)
+    summary_s = time.perf_counter() - start
+    print(f"{method:>8} {budget:>7} {tokens:>7} {input_tokens / tokens:>8.1f}x {extract_s:>9.2f}"
+          f" {summary_s:>9.2f} {extract_s + summary_s:>8.2f}")
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,99 @@
+"""Benchmark latency, tokens/sec, memory and output similarity of fp32, bf16 and int8 models.
+
+Each precision is loaded in its own process so resident memory is not shared between them.
+Outputs are decoded greedily and compared token by token with the fp32 output.
+
+Run with `python -m book_summarizer.llm.benchmark.bench_precision --model-name <model>`.
+"""
+import argparse
+import difflib
+import multiprocessing
+import statistics
+import time
+from typing import Any
+
+import torch
+
+from book_summarizer.config.config import setting
+from book_summarizer.ingestion.document_text import get_rss_bytes
+from book_summarizer.llm.get_llm import get_llm_and_tokenizer
+from book_summarizer.llm.get_llm import PRECISIONS
+from book_summarizer.llm.model_registry import get_model_size_bytes
+
+TEXTS = [
+    "Once there was a king who ruled a small kingdom by the sea. He had three daughters, "
+    "and each of them wished to see the world beyond the cliffs.",
+    "The detective arrived at the station an hour late. The train had already left, and the "
+    "only witness was a porter who remembered nothing but a red umbrella.",
+    "In the spring of that year the village decided to rebuild the old mill. Nobody knew how "
+    "it worked, so they wrote to the university for help.",
+]
+
+
+def run_precision(model_name: str, precision: str, max_new_tokens: int,
+                  repeats: int) -> dict[str, Any]:
+  """Load the model in one precision and time greedy generation of every text."""
+  rss_before = get_rss_bytes()
+  start = time.perf_counter()
+  tokenizer, model = get_llm_and_tokenizer(model_name=model_name, precision=precision)
+  load_s = time.perf_counter() - start
+  pad_token_id = tokenizer.eos_token_id if tokenizer.pad_token_id is None else tokenizer.pad_token_id
+
+  timings, generated_tokens, outputs = [], 0, []
+  for text in TEXTS:
+    prompt = setting.LLM_PROMPT + "\n" + text
+    inputs = tokenizer(prompt, return_tensors="pt")
+    for _ in range(repeats):
+      start = time.perf_counter()
+      with torch.no_grad():
+        output = model.generate(**inputs, max_new_tokens=max_new_tokens, do_sample=False,
+                                pad_token_id=pad_token_id)
+      timings.append(time.perf_counter() - start)
+    new_tokens = output[0, inputs["input_ids"].shape[1]:].tolist()
+    generated_tokens += len(new_tokens) * repeats
+    outputs.append(new_tokens)
+  return {
+      "precision": precision,
+      "load_s": load_s,
+      "model_mb": get_model_size_bytes(model) / 2**20,
+      "rss_mb": (get_rss_bytes() - rss_before) / 2**20,
+      "latency_ms": statistics.median(timings) * 1000,
+      "tokens_per_s": generated_tokens / sum(timings),
+      "outputs": outputs,
+  }
+
+
+def similarity(outputs: list[list[int]], reference: list[list[int]]) -> float:
+  """Mean token sequence similarity with the reference outputs, 1.0 when identical."""
+  return statistics.mean(
+      difflib.SequenceMatcher(a=output, b=expected).ratio()
+      for output, expected in zip(outputs, reference))
+
+
+def main() -> None:
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument("--model-name", default=setting.LLM_MODEL_NAME)
+  parser.add_argument("--precisions", nargs="+", choices=PRECISIONS, default=list(PRECISIONS))
+  parser.add_argument("--max-new-tokens", type=int, default=64)
+  parser.add_argument("--repeats", type=int, default=3)
+  args = parser.parse_args()
+
+  results = []
+  context = multiprocessing.get_context("spawn")
+  with context.Pool(1, maxtasksperchild=1) as pool:
+    for precision in args.precisions:
+      results.append(pool.apply(run_precision, (args.model_name, precision,
+                                                args.max_new_tokens, args.repeats)))
+
+  reference = next((result["outputs"] for result in results if result["precision"] == "fp32"),
+                   results[0]["outputs"])
+  print(f"{'precision':>9} {'load s':>7} {'model MB':>8} {'rss MB':>7} {'latency ms':>10}"
+        f" {'tokens/s':>8} {'similarity':>10}")
+  for result in results:
+    print(f"{result['precision']:>9} {result['load_s']:>7.1f} {result['model_mb']:>8.1f}"
+          f" {result['rss_mb']:>7.0f} {result['latency_ms']:>10.1f}"
+          f" {result['tokens_per_s']:>8.1f} {similarity(result['outputs'], reference):>10.3f}")
+
+
+if __name__ == "__main__":
+  main()
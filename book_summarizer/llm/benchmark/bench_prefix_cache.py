@@ -0,0 +1,51 @@
+"""Benchmark prefill latency with and without the cached prompt prefix.
+
+Run with `python -m book_summarizer.llm.benchmark.bench_prefix_cache --model-name <model>`.
+"""
+import argparse
+import statistics
+import time
+
+from book_summarizer.config.config import setting
+from book_summarizer.llm.llm_summarize import generate_batch
+from book_summarizer.llm.llm_summarize import warm_up_prefix_caches
+from book_summarizer.llm.model_registry import model_registry
+
+CONTENT = "Once there was a king who ruled a small kingdom by the sea. "
+
+
+def measure(llm_inputs: list[str], model_name: str, repeats: int) -> float:
+  """Median seconds of a generate call producing one token, i.e. the prefill."""
+  timings = []
+  for _ in range(repeats):
+    start = time.perf_counter()
+    generate_batch(llm_inputs, model_name=model_name, max_new_tokens=1)
+    timings.append(time.perf_counter() - start)
+  return statistics.median(timings)
+
+
+def main() -> None:
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument("--model-name", default=setting.LLM_MODEL_NAME)
+  parser.add_argument("--content-sentences", type=int, nargs="+", default=[1, 8, 32])
+  parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8])
+  parser.add_argument("--repeats", type=int, default=5)
+  args = parser.parse_args()
+
+  model_registry.warm_up([args.model_name])
+  warm_up_prefix_caches(args.model_name)
+
+  print(f"{'sentences':>9} {'batch':>5} {'full ms':>8} {'cached ms':>9} {'speedup':>7}")
+  for sentences in args.content_sentences:
+    for batch_size in args.batch_sizes:
+      llm_inputs = [setting.LLM_PROMPT + "\n" + CONTENT * sentences] * batch_size
+      setting.LLM_PREFIX_CACHE_ENABLED = False
+      full = measure(llm_inputs, args.model_name, args.repeats)
+      setting.LLM_PREFIX_CACHE_ENABLED = True
+      cached = measure(llm_inputs, args.model_name, args.repeats)
+      print(f"{sentences:>9} {batch_size:>5} {full * 1000:>8.1f} {cached * 1000:>9.1f}"
+            f" {full / cached:>6.1f}x")
+
+
+if __name__ == "__main__":
+  main()
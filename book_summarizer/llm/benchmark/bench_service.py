@@ -0,0 +1,84 @@
+"""Benchmark queueing, batching and caching overhead of the summarization service.
+
+Requests go through summary_service.summarize with the stub backend, so the time above the
+stub latency is the overhead of the service itself.
+
+Run with `python -m book_summarizer.llm.benchmark.bench_service`.
+"""
+import argparse
+import asyncio
+import statistics
+import tempfile
+import time
+
+from book_summarizer.config.config import setting
+from book_summarizer.llm import summary_service
+from book_summarizer.llm.backends import StubBackend
+from book_summarizer.llm.inference_executor import get_default_workers
+from book_summarizer.llm.inference_executor import InferenceExecutor
+from book_summarizer.llm.summary_cache import SummaryCache
+
+
+async def run(concurrency: int, requests: int, distinct: int) -> dict[str, float]:
+  """Send `requests` summaries over `distinct` contents with `concurrency` in flight."""
+  semaphore = asyncio.Semaphore(concurrency)
+  latencies = []
+
+  async def call(index: int) -> None:
+    async with semaphore:
+      start = time.perf_counter()
+      await summary_service.summarize(f"Book {index % distinct}: once there was a king.",
+                                      model_name="stub")
+      latencies.append(time.perf_counter() - start)
+
+  start = time.perf_counter()
+  await asyncio.gather(*(call(index) for index in range(requests)))
+  elapsed = time.perf_counter() - start
+  latencies.sort()
+  return {
+      "requests_per_s": requests / elapsed,
+      "p50_ms": statistics.median(latencies) * 1000,
+      "p95_ms": latencies[int(0.95 * (len(latencies) - 1))] * 1000,
+  }
+
+
+def main() -> None:
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+  parser.add_argument("--requests-per-level", type=int, default=64)
+  parser.add_argument("--workers", type=int, default=8)
+  parser.add_argument("--latency-ms", type=float, default=setting.LLM_STUB_LATENCY_MS)
+  parser.add_argument("--token-latency-ms", type=float, default=setting.LLM_STUB_TOKEN_LATENCY_MS)
+  args = parser.parse_args()
+
+  setting.LLM_BACKEND = "stub"
+  backend = StubBackend(latency_ms=args.latency_ms, token_latency_ms=args.token_latency_ms)
+  summary_service.get_backend = lambda: backend
+  generate_ms = (backend.latency_s + backend.token_latency_s * backend.summary_words) * 1000
+  print(f"stub generate call: {generate_ms:.1f} ms")
+
+  modes = {
+      "direct": dict(batching=False, cache=False, distinct=None),
+      "batched": dict(batching=True, cache=False, distinct=None),
+      "cached": dict(batching=False, cache=True, distinct=4),
+  }
+  print(f"{'concurrency':>11} {'mode':>8} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8}")
+  with tempfile.TemporaryDirectory() as cache_dir:
+    for concurrency in args.concurrency:
+      requests = max(args.requests_per_level, concurrency)
+      for mode, options in modes.items():
+        setting.LLM_BATCHING_ENABLED = options["batching"]
+        setting.SUMMARY_CACHE_ENABLED = options["cache"]
+        summary_service.summary_cache = SummaryCache(path=f"{cache_dir}/{mode}-{concurrency}.db")
+        summary_service.inference_executor = InferenceExecutor(
+            max_workers=max(args.workers, get_default_workers()),
+            max_queue_size=max(requests, setting.LLM_INFERENCE_QUEUE_SIZE))
+        result = asyncio.run(run(concurrency, requests, options["distinct"] or requests))
+        summary_service.inference_executor.shutdown()
+        summary_service.summary_cache.close()
+        print(f"{concurrency:>11} {mode:>8} {result['requests_per_s']:>8.1f}"
+              f" {result['p50_ms']:>8.1f} {result['p95_ms']:>8.1f}")
+
+
+if __name__ == "__main__":
+  main()
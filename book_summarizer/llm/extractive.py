@@ -0,0 +1,118 @@
+"""Extractive pre-summarization: keep the most central sentences within a token budget."""
+import functools
+from typing import Callable, Iterable
+
+import nltk
+import numpy as np
+from nltk.tokenize.punkt import PunktSentenceTokenizer
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+EXTRACTIVE_MODES = ("off", "textrank", "tfidf")
+
+
+@functools.lru_cache(maxsize=1)
+def get_sentence_tokenizer() -> Callable[[str], list[str]]:
+  """nltk's trained punkt model, or untrained punkt when its data is not downloaded."""
+  try:
+    nltk.sent_tokenize("Punkt is available.")
+    return nltk.sent_tokenize
+  except LookupError:
+    return PunktSentenceTokenizer().tokenize
+
+
+def split_sentences(content: str) -> list[str]:
+  """Sentences of the content, without blank ones."""
+  return [sentence for sentence in get_sentence_tokenizer()(content) if sentence.strip()]
+
+
+def rank_sentences(sentences: list[str], method: str = "textrank", damping: float = 0.85,
+                   iterations: int = 50, tolerance: float = 1e-6) -> np.ndarray:
+  """Centrality score of every sentence in the cosine similarity graph of their TF-IDF vectors.
+
+  tfidf scores a sentence by the sum of its similarities to all others, textrank by PageRank
+  over the same graph. The similarity matrix S = X X^T is never built: products with it are
+  computed as X (X^T v), so memory stays linear in the number of sentences.
+  """
+  if method not in ("textrank", "tfidf"):
+    raise ValueError(f"Unknown extractive method {method}")
+  try:
+    vectors = TfidfVectorizer(stop_words="english", sublinear_tf=True).fit_transform(sentences)
+  except ValueError:
+    # Only stop words, nothing to rank by.
+    return np.zeros(len(sentences))
+  vectors = vectors.astype(np.float32)
+  self_similarity = np.asarray(vectors.multiply(vectors).sum(axis=1)).ravel()
+
+  def similarity_dot(v: np.ndarray) -> np.ndarray:
+    """S v without the diagonal, i.e. without each sentence's similarity to itself."""
+    return vectors @ (vectors.T @ v) - self_similarity * v
+
+  degree = similarity_dot(np.ones(len(sentences), dtype=np.float32))
+  if method == "tfidf":
+    return degree
+
+  count = len(sentences)
+  inverse_degree = np.divide(1.0, degree, out=np.zeros_like(degree), where=degree > 0)
+  scores = np.full(count, 1.0 / count, dtype=np.float32)
+  for _ in range(iterations):
+    updated = (1 - damping) / count + damping * similarity_dot(scores * inverse_degree)
+    if np.abs(updated - scores).sum() < tolerance:
+      return updated
+    scores = updated
+  return scores
+
+
+def select_sentences(sentences: list[str], scores: np.ndarray, token_counts: list[int],
+                     budget_tokens: int) -> list[str]:
+  """Highest scored sentences that fit the budget together, in their original order."""
+  return [sentences[index] for index in select_indices(scores, token_counts, budget_tokens)]
+
+
+def select_indices(scores: np.ndarray, token_counts: list[int], budget_tokens: int) -> np.ndarray:
+  """Sorted indices of the highest scored sentences that fit the budget together."""
+  counts = np.asarray(token_counts)
+  order = np.argsort(-scores, kind="stable")
+  # Sentences are taken by rank while they fit, shorter ones can still fill the remainder.
+  fits = np.cumsum(counts[order]) <= budget_tokens
+  selected = order[fits]
+  remaining = budget_tokens - counts[selected].sum()
+  for index in order[~fits]:
+    if counts[index] <= remaining:
+      selected = np.append(selected, index)
+      remaining -= counts[index]
+  return np.sort(selected)
+
+
+def reduce_content(content: str | Iterable[str], budget_tokens: int,
+                   count_tokens: Callable[[list[str]], list[int]], method: str = "textrank",
+                   pool_factor: int = 4) -> str | Iterable[str]:
+  """Content reduced to its most central sentences, one per line, unchanged when the mode is off.
+
+  Pages are scored as they are read: once the sentences kept so far exceed pool_factor times
+  the budget, they are cut down to the most central ones within half of that. Centrality of a
+  long book is therefore judged against the surviving sentences rather than every sentence,
+  in exchange for memory bounded by the budget instead of the book.
+  """
+  if method == "off":
+    return content
+  pieces = [content] if isinstance(content, str) else content
+  pool_tokens = pool_factor * budget_tokens
+  sentences: list[str] = []
+  token_counts: list[int] = []
+  for piece in pieces:
+    page_sentences = split_sentences(piece)
+    sentences += page_sentences
+    token_counts += count_tokens(page_sentences)
+    if sum(token_counts) > pool_tokens:
+      sentences, token_counts = select_central(sentences, token_counts, pool_tokens // 2, method)
+  if sum(token_counts) > budget_tokens:
+    sentences, token_counts = select_central(sentences, token_counts, budget_tokens, method)
+  return "\n".join(sentences)
+
+
+def select_central(sentences: list[str], token_counts: list[int], budget_tokens: int,
+                   method: str) -> tuple[list[str], list[int]]:
+  """Most central sentences within the budget and their token counts, in original order."""
+  scores = rank_sentences(sentences, method=method)
+  selected = select_indices(scores, token_counts, budget_tokens)
+  return [sentences[index] for index in selected], [token_counts[index] for index in selected]
@@ -1,12 +1,69 @@
 """Get LLM to perform different tasks"""
+import os
+import re
 
-from transformers import AutoTokenizer, AutoModelForCausalLM
+import torch
+import transformers
+from transformers import AutoConfig, AutoTokenizer, AutoModelForCausalLM
 
 from book_summarizer.config.config import setting
 
-def get_llm_and_tokenizer(model_name: str=setting.LLM_MODEL_NAME) -> tuple[object, object]:
-  """Get LLM and tokenizer"""
+PRECISIONS = ("fp32", "bf16", "int8")
+
+
+def get_transformers_version() -> tuple[int, int]:
+  """Major and minor version of the installed transformers."""
+  major, minor = re.findall(r"\d+", transformers.__version__)[:2]
+  return int(major), int(minor)
+
+
+def get_quantized_model_path(model_name: str) -> str:
+  """Path of the int8 weights of a model, tied to the torch and transformers versions."""
+  safe_name = re.sub(r"[^A-Za-z0-9_.-]+", "--", model_name)
+  return os.path.join(setting.LLM_QUANTIZED_MODEL_DIR,
+                      f"{safe_name}-int8-torch{torch.__version__}"
+                      f"-transformers{transformers.__version__}.pt")
+
+
+def quantize_int8(model: torch.nn.Module) -> torch.nn.Module:
+  """Dynamic int8 quantization of the linear layers for CPU inference."""
+  return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def load_int8_weights(model: torch.nn.Module, path: str) -> torch.nn.Module:
+  """Load stored int8 weights into a model quantized over the same architecture."""
+  # Only tensors are unpickled, the module itself is rebuilt from the model config.
+  model.load_state_dict(torch.load(path, weights_only=True))
+  return model
+
+
+def load_int8_model(model_name: str) -> torch.nn.Module:
+  """Load the quantized model from disk, quantizing and saving its weights on first use."""
+  path = get_quantized_model_path(model_name)
+  if os.path.exists(path):
+    # The fp32 weights are not read, the random ones are replaced by the stored int8 weights.
+    config = AutoConfig.from_pretrained(model_name)
+    return load_int8_weights(quantize_int8(AutoModelForCausalLM.from_config(config)), path)
+  model = quantize_int8(AutoModelForCausalLM.from_pretrained(model_name))
+  os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+  torch.save(model.state_dict(), f"{path}.tmp")
+  os.replace(f"{path}.tmp", path)
+  return model
+
+
+def get_llm_and_tokenizer(model_name: str=setting.LLM_MODEL_NAME,
+                          precision: str | None = None) -> tuple[object, object]:
+  """Get LLM and tokenizer, in fp32, bf16 or int8 precision (default LLM_PRECISION)"""
+  precision = precision or setting.LLM_PRECISION
+  if precision not in PRECISIONS:
+    raise ValueError(f"Unknown precision {precision}, expected one of {PRECISIONS}")
 
   tokenizer = AutoTokenizer.from_pretrained(model_name)
-  model = AutoModelForCausalLM.from_pretrained(model_name)
-  return tokenizer, model
\ No newline at end of file
+  if precision == "int8":
+    model = load_int8_model(model_name)
+  elif precision == "bf16":
+    model = AutoModelForCausalLM.from_pretrained(model_name, torch_dtype=torch.bfloat16)
+  else:
+    model = AutoModelForCausalLM.from_pretrained(model_name)
+  model.eval()
+  return tokenizer, model
@@ -0,0 +1,113 @@
+"""Bounded worker pool that runs blocking LLM inference off the event loop."""
+import asyncio
+import statistics
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from book_summarizer.config.config import setting
+from book_summarizer.utils.exception_utils import InferenceQueueFullError
+
+
+def get_default_workers() -> int:
+  """LLM_INFERENCE_WORKERS, raised to LLM_MAX_BATCH_SIZE when batching so batches can fill."""
+  if setting.LLM_BATCHING_ENABLED:
+    return max(setting.LLM_INFERENCE_WORKERS, setting.LLM_MAX_BATCH_SIZE)
+  return setting.LLM_INFERENCE_WORKERS
+
+
+class InferenceExecutor:
+  """Runs inference calls on a fixed number of threads with a bounded wait queue."""
+
+  def __init__(self, max_workers: int | None = None,
+               max_queue_size: int = setting.LLM_INFERENCE_QUEUE_SIZE, wait_window: int = 1000):
+    """Initializes the variables."""
+    self.max_workers = max(1, get_default_workers() if max_workers is None else max_workers)
+    self.max_queue_size = max(0, max_queue_size)
+    self._executor: ThreadPoolExecutor | None = None
+    self._lock = threading.Lock()
+    self._queued = 0
+    self._running = 0
+    self._completed = 0
+    self._rejected = 0
+    self._wait_times: deque[float] = deque(maxlen=wait_window)
+
+  def _get_executor(self) -> ThreadPoolExecutor:
+    """Create the thread pool on first use."""
+    if self._executor is None:
+      self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                          thread_name_prefix="inference")
+    return self._executor
+
+  def submit(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+    """Queue a call, raising InferenceQueueFullError when no slot is free."""
+    with self._lock:
+      # Every worker and queue slot takes one call. Calls count as queued until their thread
+      # starts, even when a worker is free, so the check is on running and queued together.
+      if self._queued + self._running >= self.max_workers + self.max_queue_size:
+        self._rejected += 1
+        raise InferenceQueueFullError(
+            f"Inference queue is full ({self._queued} waiting, {self._running} running)")
+      self._queued += 1
+      executor = self._get_executor()
+    submitted_at = time.perf_counter()
+
+    def task() -> Any:
+      with self._lock:
+        self._queued -= 1
+        self._running += 1
+        self._wait_times.append(time.perf_counter() - submitted_at)
+      try:
+        return func(*args, **kwargs)
+      finally:
+        with self._lock:
+          self._running -= 1
+          self._completed += 1
+
+    def release_cancelled(future: Future) -> None:
+      # A call cancelled before it started never runs `task`, so free its slot here.
+      if future.cancelled():
+        with self._lock:
+          self._queued -= 1
+
+    future = executor.submit(task)
+    future.add_done_callback(release_cancelled)
+    return future
+
+  async def run(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Run a blocking call on the pool and await its result."""
+    return await asyncio.wrap_future(self.submit(func, *args, **kwargs))
+
+  def stats(self) -> dict[str, Any]:
+    """Queue depth, worker usage and recent queue wait times in seconds."""
+    with self._lock:
+      wait_times = sorted(self._wait_times)
+      stats = {
+          "max_workers": self.max_workers,
+          "max_queue_size": self.max_queue_size,
+          "queued": self._queued,
+          "running": self._running,
+          "completed": self._completed,
+          "rejected": self._rejected,
+      }
+    if wait_times:
+      stats.update({
+          "wait_mean_s": statistics.fmean(wait_times),
+          "wait_p50_s": wait_times[len(wait_times) // 2],
+          "wait_p95_s": wait_times[int(len(wait_times) * 0.95)],
+          "wait_max_s": wait_times[-1],
+      })
+    return stats
+
+  def shutdown(self) -> None:
+    """Cancel queued calls and stop the pool once running calls finish."""
+    with self._lock:
+      executor, self._executor = self._executor, None
+    if executor is not None:
+      executor.shutdown(wait=False, cancel_futures=True)
+
+
+inference_executor = InferenceExecutor()
@@ -1,18 +1,210 @@
-from book_summarizer.llm.get_llm import get_llm_and_tokenizer
-from book_summarizer.llm.prompts.book_prompt import book_summary_prompt
+import queue
+import threading
+import time
+from typing import Any, Callable, Iterable, Iterator
+
+import torch
+from transformers import StoppingCriteria
+from transformers import StoppingCriteriaList
+from transformers import TextIteratorStreamer
+
+from book_summarizer.llm.assisted import can_assist, generate_assisted
+from book_summarizer.llm.batching import BatchScheduler
+from book_summarizer.llm.map_reduce import build_final_input
+from book_summarizer.llm.model_registry import ModelEntry, model_registry
+from book_summarizer.llm.prefix_cache import find_shared_prefix, get_prefix_cache, is_prefix_cache_supported
+from book_summarizer.llm.prompts.book_prompt import chunk_summary_prompt, reduce_summary_prompt
+from book_summarizer.llm.telemetry import record_generation
 from book_summarizer.config.config import setting
 
+_batch_schedulers: dict[str, BatchScheduler] = {}
+_batch_schedulers_lock = threading.Lock()
+
+def get_prompt_prefixes() -> list[str]:
+    """Constant prompt prefixes whose key/value cache is reused across generations."""
+    return [prompt + "\n" for prompt in (setting.LLM_PROMPT, chunk_summary_prompt, reduce_summary_prompt)]
+
+def get_draft_entry(entry: ModelEntry) -> ModelEntry | None:
+    """Registry entry of the draft model for assisted decoding of a model.
+
+    None when no draft model is configured or the installed transformers cannot use it.
+    """
+    draft_model_name = setting.LLM_DRAFT_MODEL_NAME
+    if not draft_model_name or draft_model_name == entry.model_name:
+        return None
+    draft_entry = model_registry.get(model_name=draft_model_name)
+    return draft_entry if can_assist(entry, draft_entry) else None
+
+def build_generation_inputs(entry: ModelEntry, llm_inputs: list[str], use_prefix_cache: bool=True) -> dict[str, Any]:
+    """Tokenized inputs for generate, reusing the cached prefix when all inputs share one.
+
+    Older transformers without the cache API always take the uncached path.
+    """
+    tokenizer = entry.tokenizer
+    if setting.LLM_PREFIX_CACHE_ENABLED and use_prefix_cache and is_prefix_cache_supported():
+        prefix = find_shared_prefix(llm_inputs, get_prompt_prefixes())
+        if prefix is not None:
+            prefix_cache = get_prefix_cache(entry, prefix)
+            inputs = prefix_cache.build_inputs(tokenizer, [llm_input[len(prefix):] for llm_input in llm_inputs])
+            if inputs is not None:
+                return inputs
+    # The registry set the tokenizer up to pad on the left, see load_llm_and_tokenizer.
+    return dict(tokenizer(llm_inputs, return_tensors="pt", padding=True))
+
+def warm_up_prefix_caches(model_name: str=setting.LLM_MODEL_NAME) -> None:
+    """Compute the prompt prefix caches of a model ahead of the first request."""
+    entry = model_registry.get(model_name=model_name)
+    get_draft_entry(entry)
+    if setting.LLM_PREFIX_CACHE_ENABLED and is_prefix_cache_supported():
+        for prefix in get_prompt_prefixes():
+            get_prefix_cache(entry, prefix)
+
+class GenerationTimer(StoppingCriteria):
+    """Times the first generated token and tracks the sequence length, never stops generation."""
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.first_token_at = None
+        self.sequence_length = 0
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs: Any) -> torch.BoolTensor:
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+        self.sequence_length = input_ids.shape[1]
+        return torch.zeros((input_ids.shape[0],), dtype=torch.bool, device=input_ids.device)
+
+    def record(self, prompt_tokens: list[int], generated_tokens: list[int]) -> None:
+        """Record the finished generation in the telemetry of the requests it served."""
+        finished_at = time.perf_counter()
+        first_token_at = self.first_token_at or finished_at
+        record_generation(prompt_tokens, generated_tokens, prefill_s=first_token_at - self.started_at,
+                          decode_s=finished_at - first_token_at)
+
+def generate_batch(llm_inputs: list[str], model_name: str=setting.LLM_MODEL_NAME, max_new_tokens: int=setting.LLM_MAX_NEW_TOKENS) -> list[str]:
+    """Generate outputs for several prompts with one padded generate call."""
+    entry = model_registry.get(model_name=model_name)
+    tokenizer, model = entry.tokenizer, entry.model
+    draft_entry = get_draft_entry(entry) if len(llm_inputs) == 1 else None
+    # The draft model keeps its own cache, so assisted generation starts from the full prompt.
+    inputs = build_generation_inputs(entry, llm_inputs, use_prefix_cache=draft_entry is None)
+    timer = GenerationTimer()
+    generate_kwargs = dict(max_new_tokens=max_new_tokens, pad_token_id=tokenizer.pad_token_id,
+                           stopping_criteria=StoppingCriteriaList([timer]))
+    if draft_entry is not None:
+        outputs = generate_assisted(entry, draft_entry, inputs, **generate_kwargs)
+    else:
+        outputs = model.generate(**inputs, **generate_kwargs)
+    generated = outputs[:, inputs["input_ids"].shape[1]:]
+    timer.record(prompt_tokens=inputs["attention_mask"].sum(dim=1).tolist(),
+                 generated_tokens=(generated != tokenizer.pad_token_id).sum(dim=1).tolist())
+    return tokenizer.batch_decode(generated, skip_special_tokens=True)
+
+def get_batch_scheduler(model_name: str=setting.LLM_MODEL_NAME) -> BatchScheduler:
+    """Get the micro-batching scheduler of a model."""
+    with _batch_schedulers_lock:
+        if model_name not in _batch_schedulers:
+            _batch_schedulers[model_name] = BatchScheduler(
+                generate_fn=lambda llm_inputs: generate_batch(llm_inputs, model_name=model_name))
+        return _batch_schedulers[model_name]
+
 def get_llm_output(llm_input: str, model_name: str=setting.LLM_MODEL_NAME) -> str:
-    tokenizer, model = get_llm_and_tokenizer(model_name=model_name)
-    inputs = tokenizer(llm_input, return_tensors="pt")
-    outputs = model.generate(**inputs, max_length=1000)
-    return tokenizer.decode(outputs[0], skip_special_tokens=True)
-
-def get_content_summary(content: str, model_name: str=setting.LLM_MODEL_NAME, prompt_name: str=setting.LLM_PROMPT)-> str:
-# Example usage
-    llm_input = book_summary_prompt + "\n" + content
-    summary = get_llm_output(llm_input=llm_input, model_name=model_name)
-    return summary
+    if setting.LLM_BATCHING_ENABLED:
+        return get_batch_scheduler(model_name=model_name).generate(llm_input)
+    return generate_batch([llm_input], model_name=model_name)[0]
+
+class StopOnEvent(StoppingCriteria):
+    """Stops generation once an event is set, e.g. when the client went away."""
+
+    def __init__(self, stop_event: threading.Event):
+        self.stop_event = stop_event
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs: Any) -> torch.BoolTensor:
+        return torch.full((input_ids.shape[0],), self.stop_event.is_set(), dtype=torch.bool, device=input_ids.device)
+
+def stream_llm_output(llm_input: str, model_name: str=setting.LLM_MODEL_NAME, stop_event: threading.Event | None=None,
+                      max_new_tokens: int=setting.LLM_MAX_NEW_TOKENS) -> Iterator[str]:
+    """Yield generated text piece by piece while the model is decoding."""
+    entry = model_registry.get(model_name=model_name)
+    tokenizer, model = entry.tokenizer, entry.model
+    stop_event = stop_event or threading.Event()
+    streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True,
+                                    timeout=setting.LLM_STREAM_TIMEOUT_S)
+    draft_entry = get_draft_entry(entry)
+    inputs = build_generation_inputs(entry, [llm_input], use_prefix_cache=draft_entry is None)
+    timer = GenerationTimer()
+    generate_kwargs = dict(max_new_tokens=max_new_tokens, streamer=streamer, pad_token_id=tokenizer.pad_token_id,
+                           stopping_criteria=StoppingCriteriaList([StopOnEvent(stop_event), timer]))
+    if draft_entry is not None:
+        target, target_kwargs = generate_assisted, dict(entry=entry, draft_entry=draft_entry, inputs=inputs, **generate_kwargs)
+    else:
+        target, target_kwargs = model.generate, dict(**inputs, **generate_kwargs)
+    errors: list[BaseException] = []
+
+    def generate() -> None:
+        try:
+            target(**target_kwargs)
+        except BaseException as e:  # pylint: disable=broad-exception-caught
+            # Ends the stream so the consumer does not wait for text that never comes.
+            errors.append(e)
+            streamer.end()
+
+    generation = threading.Thread(target=generate, name="llm-stream")
+    generation.start()
+    try:
+        try:
+            yield from streamer
+        except queue.Empty:
+            raise TimeoutError(f"No text generated for {setting.LLM_STREAM_TIMEOUT_S} s") from None
+        if errors:
+            raise errors[0]
+    finally:
+        # Also reached when the consumer stops iterating early.
+        stop_event.set()
+        generation.join()
+        prompt_tokens = inputs["input_ids"].shape[1]
+        timer.record(prompt_tokens=[prompt_tokens], generated_tokens=[max(0, timer.sequence_length - prompt_tokens)])
+
+def get_generate_fn(model_name: str=setting.LLM_MODEL_NAME) -> Callable[[list[str]], list[str]]:
+    """Generation function for map-reduce, single prompts go through the batch scheduler."""
+    def generate_fn(llm_inputs: list[str]) -> list[str]:
+        if len(llm_inputs) == 1:
+            return [get_llm_output(llm_input=llm_inputs[0], model_name=model_name)]
+        return generate_batch(llm_inputs, model_name=model_name)
+    return generate_fn
+
+def get_final_input(content: str | Iterable[str], model_name: str=setting.LLM_MODEL_NAME, prompt_name: str=setting.LLM_PROMPT,
+                    chunk_tokens: int=setting.LLM_CHUNK_TOKENS, chunk_overlap: int=setting.LLM_CHUNK_OVERLAP,
+                    reduce_fan_in: int=setting.LLM_REDUCE_FAN_IN) -> str:
+    """Reduce content of any length to the model input that produces the final summary."""
+    tokenizer, model = model_registry.get_llm_and_tokenizer(model_name=model_name)
+    return build_final_input(content, tokenizer=tokenizer, model=model, generate_fn=get_generate_fn(model_name), prompt=prompt_name,
+                             chunk_tokens=chunk_tokens, chunk_overlap=chunk_overlap, reduce_fan_in=reduce_fan_in)
+
+def get_content_summary(content: str | Iterable[str], model_name: str=setting.LLM_MODEL_NAME, prompt_name: str=setting.LLM_PROMPT,
+                        chunk_tokens: int=setting.LLM_CHUNK_TOKENS, chunk_overlap: int=setting.LLM_CHUNK_OVERLAP,
+                        reduce_fan_in: int=setting.LLM_REDUCE_FAN_IN)-> str:
+    """Summarize content of any length, splitting it into chunks that fit the model context."""
+    final_input = get_final_input(content, model_name=model_name, prompt_name=prompt_name, chunk_tokens=chunk_tokens,
+                                  chunk_overlap=chunk_overlap, reduce_fan_in=reduce_fan_in)
+    return get_llm_output(llm_input=final_input, model_name=model_name)
+
+def get_content_summaries(contents: list[str | Iterable[str]], model_name: str=setting.LLM_MODEL_NAME,
+                          prompt_name: str=setting.LLM_PROMPT, chunk_tokens: int=setting.LLM_CHUNK_TOKENS,
+                          chunk_overlap: int=setting.LLM_CHUNK_OVERLAP, reduce_fan_in: int=setting.LLM_REDUCE_FAN_IN) -> list[str]:
+    """Summarize several contents, their final summaries are generated in one padded batch."""
+    final_inputs = [get_final_input(content, model_name=model_name, prompt_name=prompt_name, chunk_tokens=chunk_tokens,
+                                    chunk_overlap=chunk_overlap, reduce_fan_in=reduce_fan_in) for content in contents]
+    return generate_batch(final_inputs, model_name=model_name) if final_inputs else []
+
+def stream_content_summary(content: str | Iterable[str], model_name: str=setting.LLM_MODEL_NAME, prompt_name: str=setting.LLM_PROMPT,
+                           stop_event: threading.Event | None=None, chunk_tokens: int=setting.LLM_CHUNK_TOKENS,
+                           chunk_overlap: int=setting.LLM_CHUNK_OVERLAP, reduce_fan_in: int=setting.LLM_REDUCE_FAN_IN) -> Iterator[str]:
+    """Summarize content of any length, streaming the text of the final summary."""
+    final_input = get_final_input(content, model_name=model_name, prompt_name=prompt_name, chunk_tokens=chunk_tokens,
+                                  chunk_overlap=chunk_overlap, reduce_fan_in=reduce_fan_in)
+    if stop_event is not None and stop_event.is_set():
+        return
+    yield from stream_llm_output(final_input, model_name=model_name, stop_event=stop_event)
 
 if __name__ == "__main__":
     book_content = "Once there was a king"  # Your book content here
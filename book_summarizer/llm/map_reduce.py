@@ -0,0 +1,150 @@
+"""Token-aware map-reduce summarization of content longer than the model context."""
+import itertools
+import re
+from typing import Any, Callable, Iterable, Iterator
+
+from book_summarizer.config.config import setting
+from book_summarizer.llm.prompts.book_prompt import chunk_summary_prompt
+from book_summarizer.llm.prompts.book_prompt import reduce_summary_prompt
+
+# Tokens kept free for special tokens and the separator between prompt and text.
+PROMPT_MARGIN_TOKENS = 16
+
+PARAGRAPH_END = re.compile(r"\n\s*\n")
+
+
+def get_context_window(tokenizer: Any, model: Any) -> int:
+  """Number of positions the model can attend to."""
+  limits = [getattr(tokenizer, "model_max_length", None),
+            getattr(getattr(model, "config", None), "max_position_embeddings", None)]
+  # Tokenizers without a limit report a huge sentinel value.
+  limits = [limit for limit in limits if isinstance(limit, int) and 0 < limit < 10**9]
+  return min(limits) if limits else setting.LLM_CHUNK_TOKENS
+
+
+def count_tokens(tokenizer: Any, text: str) -> int:
+  """Number of tokens in a text."""
+  return len(tokenizer(text, add_special_tokens=False)["input_ids"])
+
+
+def iter_text_blocks(content: str | Iterable[str], block_chars: int = 16_384) -> Iterator[str]:
+  """Yield content in paragraph-aligned blocks so it is never tokenized in one piece."""
+  if not isinstance(content, str):
+    yield from content
+    return
+  start = 0
+  while start < len(content):
+    end = min(start + block_chars, len(content))
+    if end < len(content):
+      paragraph_end = None
+      for paragraph_end in PARAGRAPH_END.finditer(content, start, end):
+        pass
+      if paragraph_end is not None and paragraph_end.end() > start:
+        end = paragraph_end.end()
+    yield content[start:end]
+    start = end
+
+
+def iter_token_chunks(tokenizer: Any, blocks: Iterable[str], chunk_tokens: int,
+                      overlap: int) -> Iterator[str]:
+  """Yield text chunks of at most `chunk_tokens` tokens, consecutive chunks sharing `overlap`."""
+  if not 0 <= overlap < chunk_tokens:
+    raise ValueError(f"Chunk overlap {overlap} must be smaller than chunk size {chunk_tokens}")
+  buffer: list[int] = []
+  fresh_tokens = 0
+  for block in blocks:
+    token_ids = tokenizer(block, add_special_tokens=False)["input_ids"]
+    buffer.extend(token_ids)
+    fresh_tokens += len(token_ids)
+    while len(buffer) >= chunk_tokens:
+      yield tokenizer.decode(buffer[:chunk_tokens], skip_special_tokens=True)
+      buffer = buffer[chunk_tokens - overlap:]
+      fresh_tokens = len(buffer) - overlap
+  # The tail holds only already summarized overlap unless new tokens arrived.
+  if fresh_tokens > 0:
+    yield tokenizer.decode(buffer, skip_special_tokens=True)
+
+
+def iter_batches(items: Iterable[str], batch_size: int) -> Iterator[list[str]]:
+  """Group items into lists of `batch_size`."""
+  batch = []
+  for item in items:
+    batch.append(item)
+    if len(batch) == batch_size:
+      yield batch
+      batch = []
+  if batch:
+    yield batch
+
+
+def build_final_input(content: str | Iterable[str],
+                      tokenizer: Any,
+                      model: Any,
+                      generate_fn: Callable[[list[str]], list[str]],
+                      prompt: str = setting.LLM_PROMPT,
+                      chunk_tokens: int = setting.LLM_CHUNK_TOKENS,
+                      chunk_overlap: int = setting.LLM_CHUNK_OVERLAP,
+                      reduce_fan_in: int = setting.LLM_REDUCE_FAN_IN,
+                      batch_size: int = setting.LLM_MAX_BATCH_SIZE,
+                      max_new_tokens: int = setting.LLM_MAX_NEW_TOKENS) -> str:
+  """Summarize chunks of the content and merge partial summaries into the final model input.
+
+  Content is consumed block by block and partial summaries are merged as soon as
+  `reduce_fan_in` of them exist on a level, so memory is bounded by the chunk size and the
+  tree depth rather than by the length of the content.
+  """
+  if reduce_fan_in < 2:
+    raise ValueError(f"Reduce fan-in must be at least 2, got {reduce_fan_in}")
+  prompt_tokens = max(count_tokens(tokenizer, text)
+                      for text in (prompt, chunk_summary_prompt, reduce_summary_prompt))
+  budget = get_context_window(tokenizer, model) - prompt_tokens - max_new_tokens \
+      - PROMPT_MARGIN_TOKENS
+  if budget <= chunk_overlap:
+    raise ValueError(f"Context window leaves only {budget} tokens per chunk")
+  chunk_tokens = min(chunk_tokens, budget)
+  # A reduce input joins `reduce_fan_in` summaries and must fit in one chunk as well.
+  reduce_fan_in = max(2, min(reduce_fan_in, chunk_tokens // max_new_tokens))
+
+  def with_prompt(text_prompt: str, texts: list[str]) -> list[str]:
+    return [text_prompt + "\n" + text for text in texts]
+
+  chunks = iter_token_chunks(tokenizer, iter_text_blocks(content), chunk_tokens, chunk_overlap)
+  head = list(itertools.islice(chunks, 2))
+  if len(head) <= 1:
+    # Content that fits in one chunk is summarized directly.
+    return with_prompt(prompt, head or [""])[0]
+
+  # levels[i] holds summaries that each cover reduce_fan_in ** i chunks, earliest level last.
+  levels: list[list[str]] = []
+
+  def push(summary: str, level: int = 0) -> None:
+    while True:
+      if len(levels) == level:
+        levels.append([])
+      levels[level].append(summary)
+      if len(levels[level]) < reduce_fan_in:
+        return
+      summary = generate_fn(with_prompt(reduce_summary_prompt, ["\n\n".join(levels[level])]))[0]
+      levels[level] = []
+      level += 1
+
+  for batch in iter_batches(itertools.chain(head, chunks), batch_size):
+    for summary in generate_fn(with_prompt(chunk_summary_prompt, batch)):
+      push(summary)
+
+  # Higher levels cover earlier content, so read them first to keep the story in order.
+  pending = [summary for level in reversed(levels) for summary in level]
+  while len(pending) > reduce_fan_in:
+    groups = ["\n\n".join(group) for group in iter_batches(pending, reduce_fan_in)]
+    pending = []
+    for batch in iter_batches(groups, batch_size):
+      pending.extend(generate_fn(with_prompt(reduce_summary_prompt, batch)))
+  return with_prompt(prompt, ["\n\n".join(pending)])[0]
+
+
+def summarize_map_reduce(content: str | Iterable[str], tokenizer: Any, model: Any,
+                         generate_fn: Callable[[list[str]], list[str]], **params: Any) -> str:
+  """Summarize content of any length into one summary."""
+  final_input = build_final_input(content, tokenizer=tokenizer, model=model,
+                                  generate_fn=generate_fn, **params)
+  return generate_fn([final_input])[0]
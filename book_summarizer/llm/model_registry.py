@@ -0,0 +1,173 @@
+"""Process-wide registry of loaded LLMs and tokenizers with LRU eviction."""
+import gc
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from dataclasses import field
+from typing import Any, Callable, Iterable
+
+from book_summarizer.config.config import setting
+from book_summarizer.llm.telemetry import record_model_load
+
+logger = logging.getLogger(__name__)
+
+
+def load_llm_and_tokenizer(**kwargs: Any) -> tuple[Any, Any]:
+  """get_llm_and_tokenizer, importing torch and transformers only when a model is loaded.
+
+  The tokenizer is set up for batched generation here, inference threads share it read-only.
+  """
+  from book_summarizer.llm.get_llm import get_llm_and_tokenizer  # pylint: disable=import-outside-toplevel
+  tokenizer, model = get_llm_and_tokenizer(**kwargs)
+  if tokenizer.pad_token is None:
+    tokenizer.pad_token = tokenizer.eos_token
+  # Decoder-only models continue from the last position, so pad on the left.
+  tokenizer.padding_side = "left"
+  return tokenizer, model
+
+
+def get_model_size_bytes(model: Any) -> int:
+  """Bytes held by the tensors of a torch model, including packed int8 weights."""
+  if not hasattr(model, "state_dict"):
+    return 0
+  import torch  # pylint: disable=import-outside-toplevel
+  tensors = {}
+  for value in model.state_dict().values():
+    # Dynamically quantized linear layers store (weight, bias) tuples.
+    for tensor in value if isinstance(value, tuple) else (value,):
+      if isinstance(tensor, torch.Tensor):
+        # Tied weights appear under several names.
+        tensors[(tensor.data_ptr(), tensor.numel())] = tensor
+  return sum(tensor.numel() * tensor.element_size() for tensor in tensors.values())
+
+
+@dataclass
+class ModelEntry:
+  """A loaded model with its tokenizer and load statistics."""
+  model_name: str
+  tokenizer: Any
+  model: Any
+  load_time_s: float
+  precision: str
+  resident_bytes: int
+  loaded_at: float = field(default_factory=time.time)
+  hits: int = 0
+  # Key/value caches of constant prompt prefixes, see prefix_cache.py.
+  prefix_caches: dict[str, Any] = field(default_factory=dict)
+
+  def stats(self) -> dict[str, Any]:
+    """Load statistics of the entry."""
+    return {
+        "model_name": self.model_name,
+        "precision": self.precision,
+        "load_time_s": round(self.load_time_s, 3),
+        "resident_mb": round(self.resident_bytes / 2**20, 1),
+        "loaded_at": self.loaded_at,
+        "hits": self.hits,
+    }
+
+
+class ModelRegistry:
+  """Loads each model once per process and keeps the most recently used ones."""
+
+  def __init__(self, max_size: int = setting.LRU_CACHE_SIZE,
+               loader: Callable[..., tuple[Any, Any]] = load_llm_and_tokenizer):
+    """Initializes the variables."""
+    self.max_size = max(1, max_size)
+    self._loader = loader
+    self._entries: OrderedDict[str, ModelEntry] = OrderedDict()
+    self._lock = threading.Lock()
+    self._load_locks: dict[str, threading.Lock] = {}
+
+  def _lookup(self, model_name: str) -> ModelEntry | None:
+    """Return a loaded entry and mark it as most recently used."""
+    entry = self._entries.get(model_name)
+    if entry is not None:
+      self._entries.move_to_end(model_name)
+      entry.hits += 1
+    return entry
+
+  def get(self, model_name: str = setting.LLM_MODEL_NAME) -> ModelEntry:
+    """Get the entry for a model, loading it on first use."""
+    with self._lock:
+      entry = self._lookup(model_name)
+      if entry is not None:
+        return entry
+      load_lock = self._load_locks.setdefault(model_name, threading.Lock())
+
+    # Only one thread loads a given model, the others wait for it.
+    with load_lock:
+      with self._lock:
+        entry = self._lookup(model_name)
+        if entry is not None:
+          return entry
+
+      start = time.perf_counter()
+      tokenizer, model = self._loader(model_name=model_name)
+      entry = ModelEntry(model_name=model_name,
+                         tokenizer=tokenizer,
+                         model=model,
+                         load_time_s=time.perf_counter() - start,
+                         precision=setting.LLM_PRECISION,
+                         resident_bytes=get_model_size_bytes(model))
+      record_model_load(entry.load_time_s)
+      logger.info("Loaded %s (%s) in %.1fs (%.0f MB)", model_name, entry.precision,
+                  entry.load_time_s, entry.resident_bytes / 2**20)
+
+      with self._lock:
+        self._entries[model_name] = entry
+        self._load_locks.pop(model_name, None)
+        evicted = self._evict_overflow()
+    if evicted:
+      gc.collect()
+    return entry
+
+  def get_llm_and_tokenizer(self, model_name: str = setting.LLM_MODEL_NAME) -> tuple[Any, Any]:
+    """Get the tokenizer and model, loading them on first use."""
+    entry = self.get(model_name)
+    return entry.tokenizer, entry.model
+
+  def _evict_overflow(self) -> list[str]:
+    """Drop least recently used entries above the size limit."""
+    evicted = []
+    while len(self._entries) > self.max_size:
+      model_name, _ = self._entries.popitem(last=False)
+      evicted.append(model_name)
+      logger.info("Evicted %s from model registry", model_name)
+    return evicted
+
+  def warm_up(self, model_names: Iterable[str]) -> list[ModelEntry]:
+    """Load the given models ahead of the first request."""
+    return [self.get(model_name) for model_name in model_names]
+
+  def evict(self, model_name: str) -> bool:
+    """Remove a model from the registry."""
+    with self._lock:
+      entry = self._entries.pop(model_name, None)
+    if entry is None:
+      return False
+    del entry
+    gc.collect()
+    return True
+
+  def clear(self) -> None:
+    """Remove all models from the registry."""
+    with self._lock:
+      self._entries.clear()
+    gc.collect()
+
+  def stats(self) -> list[dict[str, Any]]:
+    """Load statistics of every entry, most recently used last."""
+    with self._lock:
+      return [entry.stats() for entry in self._entries.values()]
+
+  def __contains__(self, model_name: str) -> bool:
+    return model_name in self._entries
+
+  def __len__(self) -> int:
+    return len(self._entries)
+
+
+model_registry = ModelRegistry(max_size=setting.LRU_CACHE_SIZE)
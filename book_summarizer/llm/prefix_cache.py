@@ -0,0 +1,94 @@
+"""Key/value cache of constant prompt prefixes, computed once per loaded model."""
+import threading
+from typing import Any, Iterable
+
+import torch
+
+from book_summarizer.llm.get_llm import get_transformers_version
+from book_summarizer.llm.model_registry import ModelEntry
+
+# Cache objects made of layers, which DynamicCache can be built from, appeared in 4.56.
+PREFIX_CACHE_MIN_TRANSFORMERS = (4, 56)
+
+
+def is_prefix_cache_supported() -> bool:
+  """Whether the installed transformers has the cache API prefix caches are built on."""
+  return get_transformers_version() >= PREFIX_CACHE_MIN_TRANSFORMERS
+
+
+class PrefixCache:
+  """Attention key/values of a prompt prefix, reused by every generation that starts with it."""
+
+  def __init__(self, tokenizer: Any, model: Any, prefix: str):
+    """Runs the prefix through the model once."""
+    self.prefix = prefix
+    self.prefix_ids = tokenizer(prefix, return_tensors="pt")["input_ids"]
+    self.config = model.config
+    with torch.no_grad():
+      past_key_values = model(self.prefix_ids.to(model.device), use_cache=True).past_key_values
+    # Only the tensors are kept, each call builds its own cache object around them.
+    self.key_values = [(layer.keys, layer.values) for layer in past_key_values.layers]
+
+  def split_tokens(self, tokenizer: Any, suffixes: list[str]) -> list[list[int]] | None:
+    """Tokens of each prefix + suffix after the prefix tokens, None if an input does not have them.
+
+    Inputs are tokenized whole, as without the cache. A subword tokenizer may merge the end of
+    the prefix with the start of a suffix, the cached prefix does not apply to those inputs.
+    """
+    prefix_ids = self.prefix_ids[0].tolist()
+    input_ids = tokenizer([self.prefix + suffix for suffix in suffixes])["input_ids"]
+    suffix_ids = []
+    for ids in input_ids:
+      ids = list(ids)
+      if len(ids) <= len(prefix_ids) or ids[:len(prefix_ids)] != prefix_ids:
+        return None
+      suffix_ids.append(ids[len(prefix_ids):])
+    return suffix_ids
+
+  def build_inputs(self, tokenizer: Any, suffixes: list[str]) -> dict[str, Any] | None:
+    """Generate kwargs for prefix + suffix inputs, None when the cached prefix does not apply.
+
+    Rows are laid out as [prefix][padding][suffix]. Padding is masked out and position ids
+    follow the attention mask, so each row continues right after its own suffix while all
+    rows share the prefix positions held in the cache.
+    """
+    from transformers import DynamicCache  # pylint: disable=import-outside-toplevel
+    suffix_ids = self.split_tokens(tokenizer, suffixes)
+    if suffix_ids is None:
+      return None
+    pad_token_id = tokenizer.eos_token_id if tokenizer.pad_token_id is None else tokenizer.pad_token_id
+    width = max(len(ids) for ids in suffix_ids)
+    padded = torch.tensor([[pad_token_id] * (width - len(ids)) + ids for ids in suffix_ids])
+    suffix_mask = torch.tensor([[0] * (width - len(ids)) + [1] * len(ids) for ids in suffix_ids])
+
+    batch_size = len(suffixes)
+    prefix_ids = self.prefix_ids.expand(batch_size, -1)
+    # The new cache copies the prefix tensors once, expanded to the batch, and generate()
+    # extends that copy, never the tensors kept here.
+    past_key_values = DynamicCache(
+        ddp_cache_data=[(keys.expand(batch_size, -1, -1, -1), values.expand(batch_size, -1, -1, -1))
+                        for keys, values in self.key_values],
+        config=self.config)
+    return {
+        "input_ids": torch.cat([prefix_ids, padded], dim=1),
+        "attention_mask": torch.cat([torch.ones_like(prefix_ids), suffix_mask], dim=1),
+        "past_key_values": past_key_values,
+    }
+
+
+_prefix_cache_lock = threading.Lock()
+
+
+def get_prefix_cache(entry: ModelEntry, prefix: str) -> PrefixCache:
+  """Prefix cache of a loaded model, kept on its registry entry so eviction frees it."""
+  with _prefix_cache_lock:
+    if prefix not in entry.prefix_caches:
+      entry.prefix_caches[prefix] = PrefixCache(entry.tokenizer, entry.model, prefix)
+    return entry.prefix_caches[prefix]
+
+
+def find_shared_prefix(llm_inputs: list[str], prefixes: Iterable[str]) -> str | None:
+  """Longest of the known prefixes that every input starts with."""
+  matches = [prefix for prefix in prefixes
+             if prefix and all(llm_input.startswith(prefix) for llm_input in llm_inputs)]
+  return max(matches, key=len, default=None)
@@ -49,4 +49,18 @@ Major themes include societal expectations around marriage and class, and person
 ---
 Below is the book content, Go!
 
-"""
\ No newline at end of file
+"""
+
+chunk_summary_prompt = """
+Summarize the following part of a book. Keep the plot events in order, name the characters involved and note any themes that appear. Do not add information that is not in the text.
+
+Below is the part of the book, Go!
+
+"""
+
+reduce_summary_prompt = """
+The following are summaries of consecutive parts of a book. Combine them into one summary that keeps the plot events in order, the main characters and the themes. Do not add information that is not in the summaries.
+
+Below are the partial summaries, Go!
+
+"""
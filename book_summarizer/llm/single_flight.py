@@ -0,0 +1,58 @@
+"""Single-flight execution: concurrent calls with the same key share one run."""
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable
+
+
+@dataclass
+class Flight:
+  """A running call and the number of callers waiting for it."""
+  task: asyncio.Task
+  waiters: int = 0
+
+
+class SingleFlight:
+  """Coalesces concurrent calls by key on one event loop.
+
+  The first caller of a key starts the call, later callers wait for the same task. A caller
+  that is cancelled stops waiting, and the call itself is only cancelled when no caller is
+  left waiting for it.
+  """
+
+  def __init__(self):
+    """Initializes the variables."""
+    self._flights: dict[str, Flight] = {}
+    self.started = 0
+    self.joined = 0
+
+  async def run(self, key: str, func: Callable[[], Awaitable[Any]]) -> tuple[Any, bool]:
+    """Result of func, run now or shared with the call in flight, and whether it was shared."""
+    flight = self._flights.get(key)
+    shared = flight is not None
+    if flight is None:
+      flight = Flight(task=asyncio.ensure_future(func()))
+      self._flights[key] = flight
+      flight.task.add_done_callback(lambda _: self._forget(key, flight))
+      self.started += 1
+    else:
+      self.joined += 1
+    flight.waiters += 1
+    try:
+      return await asyncio.shield(flight.task), shared
+    except asyncio.CancelledError:
+      if flight.waiters == 1 and not flight.task.done():
+        # Callers arriving from now on start a new flight instead of joining a cancelled one.
+        self._forget(key, flight)
+        flight.task.cancel()
+      raise
+    finally:
+      flight.waiters -= 1
+
+  def _forget(self, key: str, flight: Flight) -> None:
+    """Let the next call of the key start a new flight."""
+    if self._flights.get(key) is flight:
+      del self._flights[key]
+
+  def stats(self) -> dict[str, int]:
+    """Calls in flight, calls started and calls that joined one in flight."""
+    return {"in_flight": len(self._flights), "started": self.started, "joined": self.joined}
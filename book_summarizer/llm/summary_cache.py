@@ -0,0 +1,228 @@
+"""Content-addressed cache of generated summaries with a memory and a disk tier."""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any
+
+from book_summarizer.config.config import setting
+
+WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_content(content: str) -> str:
+  """Normalize unicode and whitespace so trivially different copies share a key."""
+  return WHITESPACE.sub(" ", unicodedata.normalize("NFC", content)).strip()
+
+
+def hash_text(text: str) -> str:
+  """Hex sha256 of a text."""
+  return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def make_cache_key(model_name: str, prompt: str, content: str, params: dict[str, Any]) -> str:
+  """Key of a summary from everything that changes the generated output."""
+  key_data = json.dumps(
+      {
+          "model_name": model_name,
+          "prompt": hash_text(prompt),
+          "content": hash_text(normalize_content(content)),
+          "params": params,
+      },
+      sort_keys=True)
+  return hash_text(key_data)
+
+
+@dataclass
+class CachedSummary:
+  """A cached summary with what it was generated by."""
+  summary: str
+  model_name: str
+  prompt_hash: str
+  precision: str
+
+
+class SummaryCache:
+  """In-memory LRU in front of a size-limited SQLite store that survives restarts.
+
+  Every worker has its own memory tier. Deletions bump a generation number in the store, and
+  a worker that sees a new generation clears its memory tier, so entries deleted through any
+  worker are not served by the others.
+  """
+
+  def __init__(self, path: str = setting.SUMMARY_CACHE_PATH,
+               memory_size: int = setting.SUMMARY_CACHE_MEMORY_SIZE,
+               disk_max_entries: int = setting.SUMMARY_CACHE_DISK_MAX_ENTRIES):
+    """Initializes the variables."""
+    self.path = path
+    self.memory_size = max(0, memory_size)
+    self.disk_max_entries = max(0, disk_max_entries)
+    self._memory: OrderedDict[str, CachedSummary] = OrderedDict()
+    self._lock = threading.Lock()
+    self._connection: sqlite3.Connection | None = None
+    # Invalidation generation of the store the memory tier matches.
+    self._generation: int | None = None
+    self._counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0,
+                      "memory_evictions": 0, "disk_evictions": 0}
+
+  def _connect(self) -> sqlite3.Connection:
+    """Open the store on first use."""
+    if self._connection is None:
+      if os.path.dirname(self.path):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+      connection = sqlite3.connect(self.path, check_same_thread=False)
+      connection.execute("PRAGMA journal_mode=WAL")
+      connection.execute("""
+          CREATE TABLE IF NOT EXISTS summaries (
+              key TEXT PRIMARY KEY,
+              model_name TEXT NOT NULL,
+              prompt_hash TEXT NOT NULL,
+              summary TEXT NOT NULL,
+              created_at REAL NOT NULL,
+              last_access REAL NOT NULL,
+              precision TEXT NOT NULL DEFAULT '')""")
+      columns = [row[1] for row in connection.execute("PRAGMA table_info(summaries)")]
+      if "precision" not in columns:
+        # Stores written before the precision was recorded, their entries count as stale.
+        connection.execute("ALTER TABLE summaries ADD COLUMN precision TEXT NOT NULL DEFAULT ''")
+      connection.execute(
+          "CREATE INDEX IF NOT EXISTS ix_summaries_last_access ON summaries (last_access)")
+      connection.execute("""
+          CREATE TABLE IF NOT EXISTS invalidations (
+              id INTEGER PRIMARY KEY CHECK (id = 0),
+              generation INTEGER NOT NULL)""")
+      connection.execute("INSERT OR IGNORE INTO invalidations VALUES (0, 0)")
+      connection.commit()
+      self._connection = connection
+    return self._connection
+
+  def _remember(self, key: str, entry: CachedSummary) -> None:
+    """Put an entry in the memory tier, evicting the least recently used one."""
+    if not self.memory_size:
+      return
+    self._memory[key] = entry
+    self._memory.move_to_end(key)
+    while len(self._memory) > self.memory_size:
+      self._memory.popitem(last=False)
+      self._counters["memory_evictions"] += 1
+
+  def _sync_memory(self, connection: sqlite3.Connection) -> None:
+    """Clear the memory tier when entries were deleted since it was filled."""
+    generation = connection.execute("SELECT generation FROM invalidations").fetchone()[0]
+    if generation != self._generation:
+      self._memory.clear()
+      self._generation = generation
+
+  def get(self, key: str) -> str | None:
+    """Cached summary for a key, or None."""
+    with self._lock:
+      connection = self._connect()
+      self._sync_memory(connection)
+      entry = self._memory.get(key)
+      if entry is not None:
+        self._memory.move_to_end(key)
+        self._counters["memory_hits"] += 1
+        return entry.summary
+
+      row = connection.execute(
+          "SELECT summary, model_name, prompt_hash, precision FROM summaries WHERE key = ?",
+          (key,)).fetchone()
+      if row is None:
+        self._counters["misses"] += 1
+        return None
+      connection.execute("UPDATE summaries SET last_access = ? WHERE key = ?", (time.time(), key))
+      connection.commit()
+      self._counters["disk_hits"] += 1
+      entry = CachedSummary(summary=row[0], model_name=row[1], prompt_hash=row[2],
+                            precision=row[3])
+      self._remember(key, entry)
+      return entry.summary
+
+  def set(self, key: str, summary: str, model_name: str, prompt: str,
+          precision: str = setting.LLM_PRECISION) -> None:
+    """Store a summary in both tiers."""
+    entry = CachedSummary(summary=summary, model_name=model_name, prompt_hash=hash_text(prompt),
+                          precision=precision)
+    now = time.time()
+    with self._lock:
+      connection = self._connect()
+      self._sync_memory(connection)
+      self._remember(key, entry)
+      if not self.disk_max_entries:
+        return
+      connection.execute(
+          """INSERT OR REPLACE INTO summaries
+                 (key, model_name, prompt_hash, summary, created_at, last_access, precision)
+                 VALUES (?, ?, ?, ?, ?, ?, ?)""",
+          (key, entry.model_name, entry.prompt_hash, entry.summary, now, now, entry.precision))
+      evicted = connection.execute(
+          """DELETE FROM summaries WHERE key IN (
+                 SELECT key FROM summaries ORDER BY last_access
+                 LIMIT MAX((SELECT COUNT(*) FROM summaries) - ?, 0))""",
+          (self.disk_max_entries,)).rowcount
+      connection.commit()
+      self._counters["disk_evictions"] += evicted
+
+  def invalidate(self, model_name: str | None = None, prompt: str | None = None) -> int:
+    """Delete entries of a model and/or prompt, or every entry when neither is given."""
+    conditions, values = [], []
+    if model_name is not None:
+      conditions.append("model_name = ?")
+      values.append(model_name)
+    if prompt is not None:
+      conditions.append("prompt_hash = ?")
+      values.append(hash_text(prompt))
+    where = " AND ".join(conditions) or "1 = 1"
+    return self._delete(where, values)
+
+  def invalidate_stale(self, model_name: str = setting.LLM_MODEL_NAME,
+                       prompt: str = setting.LLM_PROMPT,
+                       precision: str = setting.LLM_PRECISION) -> int:
+    """Delete entries generated by any other model, prompt or precision than the given ones."""
+    prompt_hash = hash_text(prompt)
+    return self._delete("model_name != ? OR prompt_hash != ? OR precision != ?",
+                        [model_name, prompt_hash, precision])
+
+  def _delete(self, where: str, values: list[str]) -> int:
+    """Delete matching entries and return how many were on disk.
+
+    The memory tiers of all workers are cleared, they refill from the disk tier.
+    """
+    with self._lock:
+      connection = self._connect()
+      deleted = connection.execute(f"DELETE FROM summaries WHERE {where}", values).rowcount  # nosec
+      connection.execute("UPDATE invalidations SET generation = generation + 1")
+      connection.commit()
+      self._sync_memory(connection)
+    return deleted
+
+  def stats(self) -> dict[str, Any]:
+    """Hit/miss counters and tier sizes."""
+    with self._lock:
+      disk_entries = self._connect().execute("SELECT COUNT(*) FROM summaries").fetchone()[0]
+      lookups = sum(self._counters[name] for name in ("memory_hits", "disk_hits", "misses"))
+      hits = self._counters["memory_hits"] + self._counters["disk_hits"]
+      return {
+          **self._counters,
+          "hit_rate": hits / lookups if lookups else 0.0,
+          "memory_entries": len(self._memory),
+          "memory_size": self.memory_size,
+          "disk_entries": disk_entries,
+          "disk_max_entries": self.disk_max_entries,
+      }
+
+  def close(self) -> None:
+    """Close the disk store."""
+    with self._lock:
+      if self._connection is not None:
+        self._connection.close()
+        self._connection = None
+
+
+summary_cache = SummaryCache()
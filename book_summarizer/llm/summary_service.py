@@ -0,0 +1,192 @@
+"""Summarization service used by the API: cache lookup in front of queued inference."""
+import asyncio
+import logging
+import threading
+import time
+from typing import Any, AsyncIterator, Iterable
+
+from fastapi.concurrency import run_in_threadpool
+
+from book_summarizer.config.config import setting
+from book_summarizer.llm.backends import LLMBackend
+from book_summarizer.llm.backends import get_backend
+from book_summarizer.llm.inference_executor import inference_executor
+from book_summarizer.llm.single_flight import SingleFlight
+from book_summarizer.llm.summary_cache import make_cache_key
+from book_summarizer.llm.summary_cache import summary_cache
+from book_summarizer.llm.telemetry import RequestTelemetry
+from book_summarizer.llm.telemetry import track_request
+
+logger = logging.getLogger(__name__)
+
+# Summaries being generated in this worker, keyed like the summary cache.
+summary_flights = SingleFlight()
+
+
+def get_generation_params(chunk_tokens: int = setting.LLM_CHUNK_TOKENS,
+                          chunk_overlap: int = setting.LLM_CHUNK_OVERLAP,
+                          reduce_fan_in: int = setting.LLM_REDUCE_FAN_IN,
+                          extractive: str = setting.LLM_EXTRACTIVE_MODE,
+                          extractive_tokens: int = setting.LLM_EXTRACTIVE_TOKENS) -> dict[str, Any]:
+  """Parameters that change the generated summary."""
+  return {
+      "backend": setting.LLM_BACKEND,
+      "precision": setting.LLM_PRECISION,
+      "extractive": extractive,
+      "extractive_tokens": extractive_tokens if extractive != "off" else None,
+      "chunk_tokens": chunk_tokens,
+      "chunk_overlap": chunk_overlap,
+      "reduce_fan_in": reduce_fan_in,
+      "max_new_tokens": setting.LLM_MAX_NEW_TOKENS,
+  }
+
+
+def get_request_key(content: str | Iterable[str], content_key: str | None, model_name: str,
+                    prompt: str, params: dict[str, Any]) -> str | None:
+  """Key of the summary a request produces, None when the content cannot be identified."""
+  if content_key is None and not isinstance(content, str):
+    # Streamed content has no key unless the caller identifies it, e.g. by file hash.
+    return None
+  return make_cache_key(model_name, prompt, content_key or content, get_generation_params(**params))
+
+
+def get_cache_key(content: str | Iterable[str], content_key: str | None, model_name: str,
+                  prompt: str, params: dict[str, Any]) -> str | None:
+  """Cache key of a request, None when it cannot be cached."""
+  if not setting.SUMMARY_CACHE_ENABLED:
+    return None
+  return get_request_key(content, content_key, model_name, prompt, params)
+
+
+async def store_summary(key: str, summary: str, model_name: str, prompt: str) -> None:
+  """Cache a generated summary, a failing cache write does not fail the request."""
+  try:
+    await run_in_threadpool(summary_cache.set, key, summary, model_name, prompt)
+  except Exception as e:  # pylint: disable=broad-exception-caught
+    logger.error(f"Could not cache summary {key}: {e}")
+
+
+def extract(backend: LLMBackend, content: str | Iterable[str], model_name: str, extractive: str,
+            extractive_tokens: int) -> str | Iterable[str]:
+  """Content after the optional extractive stage, run on the inference worker."""
+  if extractive == "off":
+    return content
+  # nltk and scikit-learn are only imported by workers that use the extractive stage.
+  from book_summarizer.llm.extractive import reduce_content  # pylint: disable=import-outside-toplevel
+  return reduce_content(content, budget_tokens=extractive_tokens, method=extractive,
+                        count_tokens=lambda texts: backend.count_tokens(texts, model_name))
+
+
+async def summarize(content: str | Iterable[str], model_name: str = setting.LLM_MODEL_NAME,
+                    prompt: str = setting.LLM_PROMPT, content_key: str | None = None,
+                    extractive: str = setting.LLM_EXTRACTIVE_MODE,
+                    extractive_tokens: int = setting.LLM_EXTRACTIVE_TOKENS,
+                    telemetry: RequestTelemetry | None = None, **params: Any) -> str:
+  """Summary of the content, served from the cache when the same request was seen before.
+
+  Concurrent requests for the same text content share one generation. Inference counters of
+  the request are recorded into `telemetry` when one is given. Page iterators with a close()
+  method are closed once inference is done reading them, also when the request fails or is
+  cancelled.
+  """
+  close = None if isinstance(content, str) else getattr(content, "close", None)
+  submitted = False
+  telemetry = telemetry or RequestTelemetry()
+  all_params = dict(params, extractive=extractive, extractive_tokens=extractive_tokens)
+  key = get_cache_key(content, content_key, model_name, prompt, all_params)
+
+  def generate() -> str:
+    telemetry.queue_wait_s = time.perf_counter() - submitted_at
+    with track_request(telemetry):
+      backend = get_backend()
+      return backend.summarize(extract(backend, content, model_name, extractive, extractive_tokens),
+                               model_name=model_name, prompt_name=prompt, **params)
+
+  async def generate_and_cache() -> str:
+    nonlocal submitted
+    future = inference_executor.submit(generate)
+    if close is not None:
+      # Runs when inference finishes, or at once when the request cancels a queued call.
+      future.add_done_callback(lambda _: close())
+      submitted = True
+    summary = await asyncio.wrap_future(future)
+    if key is not None:
+      await store_summary(key, summary, model_name, prompt)
+    return summary
+
+  try:
+    if key is not None:
+      summary = await run_in_threadpool(summary_cache.get, key)
+      if summary is not None:
+        telemetry.cache_hit = True
+        return summary
+
+    submitted_at = time.perf_counter()
+    if not isinstance(content, str):
+      # Page iterators read files owned by their request, so they are never shared.
+      return await generate_and_cache()
+    flight_key = get_request_key(content, content_key, model_name, prompt, all_params)
+    summary, telemetry.coalesced = await summary_flights.run(flight_key, generate_and_cache)
+    return summary
+  finally:
+    if close is not None and not submitted:
+      close()
+
+
+async def stream_summary(content: str | Iterable[str], model_name: str = setting.LLM_MODEL_NAME,
+                         prompt: str = setting.LLM_PROMPT, content_key: str | None = None,
+                         extractive: str = setting.LLM_EXTRACTIVE_MODE,
+                         extractive_tokens: int = setting.LLM_EXTRACTIVE_TOKENS,
+                         telemetry: RequestTelemetry | None = None,
+                         **params: Any) -> AsyncIterator[str]:
+  """Yield the summary text as it is generated.
+
+  Generation holds an inference worker until it finishes or the consumer stops iterating,
+  which also stops decoding. A complete summary is stored in the cache.
+  """
+  telemetry = telemetry or RequestTelemetry()
+  key = get_cache_key(content, content_key, model_name, prompt,
+                      dict(params, extractive=extractive, extractive_tokens=extractive_tokens))
+  if key is not None:
+    summary = await run_in_threadpool(summary_cache.get, key)
+    if summary is not None:
+      telemetry.cache_hit = True
+      yield summary
+      return
+
+  loop = asyncio.get_running_loop()
+  pieces: asyncio.Queue[str | None] = asyncio.Queue()
+  stop_event = threading.Event()
+  submitted_at = time.perf_counter()
+
+  def produce() -> str:
+    telemetry.queue_wait_s = time.perf_counter() - submitted_at
+    generated = []
+    backend = get_backend()
+    try:
+      with track_request(telemetry):
+        extracted = extract(backend, content, model_name, extractive, extractive_tokens)
+        for text in backend.stream_summary(extracted, model_name=model_name, prompt_name=prompt,
+                                           stop_event=stop_event, **params):
+          if not text:
+            continue
+          generated.append(text)
+          loop.call_soon_threadsafe(pieces.put_nowait, text)
+    finally:
+      loop.call_soon_threadsafe(pieces.put_nowait, None)
+    return "".join(generated)
+
+  future = inference_executor.submit(produce)
+  completed = False
+  try:
+    while (text := await pieces.get()) is not None:
+      yield text
+    summary = await asyncio.wrap_future(future)
+    completed = True
+  finally:
+    if not completed:
+      # The consumer went away or failed: drop the queued call or stop decoding.
+      stop_event.set()
+      future.cancel()
+  if key is not None:
+    await store_summary(key, summary, model_name, prompt)
@@ -0,0 +1,195 @@
+"""Per-request inference telemetry, exported as Prometheus histograms."""
+import bisect
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Iterator
+
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+SECONDS_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+class Histogram:
+  """Cumulative histogram in the Prometheus text exposition format."""
+
+  def __init__(self, name: str, documentation: str, buckets: tuple[float, ...]):
+    """Initializes the variables."""
+    self.name = name
+    self.documentation = documentation
+    self.buckets = buckets
+    self._counts = [0] * (len(buckets) + 1)
+    self._sum = 0.0
+    self._lock = threading.Lock()
+
+  def observe(self, value: float) -> None:
+    with self._lock:
+      self._counts[bisect.bisect_left(self.buckets, value)] += 1
+      self._sum += value
+
+  def render(self) -> list[str]:
+    with self._lock:
+      counts, total = list(self._counts), self._sum
+    lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+    cumulative = 0
+    for bound, count in zip(list(self.buckets) + ["+Inf"], counts):
+      cumulative += count
+      lines.append(f'{self.name}_bucket{{le="{bound}"}} {cumulative}')
+    lines += [f"{self.name}_sum {total}", f"{self.name}_count {cumulative}"]
+    return lines
+
+
+class Counter:
+  """Counter with labels, in the Prometheus text exposition format."""
+
+  def __init__(self, name: str, documentation: str, labels: tuple[str, ...]):
+    """Initializes the variables."""
+    self.name = name
+    self.documentation = documentation
+    self.labels = labels
+    self._values: dict[tuple[str, ...], int] = {}
+    self._lock = threading.Lock()
+
+  def inc(self, *label_values: str) -> None:
+    with self._lock:
+      self._values[label_values] = self._values.get(label_values, 0) + 1
+
+  def render(self) -> list[str]:
+    with self._lock:
+      values = dict(self._values)
+    lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+    for label_values, count in values.items():
+      labels = ",".join(f'{label}="{value}"' for label, value in zip(self.labels, label_values))
+      lines.append(f"{self.name}{{{labels}}} {count}")
+    return lines
+
+
+PROMPT_TOKENS = Histogram("llm_prompt_tokens", "Prompt tokens per summary request.", TOKEN_BUCKETS)
+GENERATED_TOKENS = Histogram("llm_generated_tokens", "Generated tokens per summary request.",
+                             TOKEN_BUCKETS)
+PREFILL_SECONDS = Histogram("llm_prefill_seconds",
+                            "Time to the first generated token, summed over generate calls.",
+                            SECONDS_BUCKETS)
+DECODE_SECONDS = Histogram("llm_decode_seconds",
+                           "Time after the first generated token, summed over generate calls.",
+                           SECONDS_BUCKETS)
+TOKENS_PER_SECOND = Histogram("llm_tokens_per_second",
+                              "Generated tokens per second of generation time.", RATE_BUCKETS)
+QUEUE_WAIT_SECONDS = Histogram("llm_queue_wait_seconds",
+                               "Time a summary request waited for an inference worker.",
+                               SECONDS_BUCKETS)
+MODEL_LOAD_SECONDS = Histogram("llm_model_load_seconds", "Time to load a model.", SECONDS_BUCKETS)
+REQUESTS = Counter("llm_requests_total", "Summary requests that ran inference, by outcome.",
+                   ("cold_load", "outcome"))
+METRICS = (PROMPT_TOKENS, GENERATED_TOKENS, PREFILL_SECONDS, DECODE_SECONDS, TOKENS_PER_SECOND,
+           QUEUE_WAIT_SECONDS, MODEL_LOAD_SECONDS, REQUESTS)
+
+
+@dataclass
+class RequestTelemetry:
+  """Inference counters of one summary request, over all its generate calls."""
+  prompt_tokens: int = 0
+  generated_tokens: int = 0
+  prefill_s: float = 0.0
+  decode_s: float = 0.0
+  queue_wait_s: float = 0.0
+  cold_load: bool = False
+  cache_hit: bool = False
+  # Served by the generation of an identical request that was already in flight.
+  coalesced: bool = False
+
+  @property
+  def tokens_per_s(self) -> float:
+    seconds = self.prefill_s + self.decode_s
+    return self.generated_tokens / seconds if seconds else 0.0
+
+  def to_headers(self) -> dict[str, str]:
+    """Response headers for debugging a single request."""
+    return {
+        "X-LLM-Prompt-Tokens": str(self.prompt_tokens),
+        "X-LLM-Generated-Tokens": str(self.generated_tokens),
+        "X-LLM-Prefill-Seconds": f"{self.prefill_s:.3f}",
+        "X-LLM-Decode-Seconds": f"{self.decode_s:.3f}",
+        "X-LLM-Tokens-Per-Second": f"{self.tokens_per_s:.1f}",
+        "X-LLM-Queue-Wait-Seconds": f"{self.queue_wait_s:.3f}",
+        "X-LLM-Cold-Load": str(self.cold_load).lower(),
+        "X-Summary-Cache": "hit" if self.cache_hit else "miss",
+        "X-LLM-Coalesced": str(self.coalesced).lower(),
+    }
+
+
+# Requests whose generations are being recorded in this context. Batched generate calls
+# record into one entry per row, other calls into the request that made them.
+_current_requests: ContextVar[list[RequestTelemetry]] = ContextVar("current_requests", default=[])
+
+
+def current_request() -> RequestTelemetry | None:
+  """Telemetry of the request running in this context."""
+  requests = _current_requests.get()
+  return requests[0] if len(requests) == 1 else None
+
+
+@contextmanager
+def recording_into(requests: list[RequestTelemetry | None]) -> Iterator[None]:
+  """Record generations of the block into the given requests, e.g. the rows of a batch."""
+  token = _current_requests.set([request or RequestTelemetry() for request in requests])
+  try:
+    yield
+  finally:
+    _current_requests.reset(token)
+
+
+@contextmanager
+def track_request(telemetry: RequestTelemetry) -> Iterator[RequestTelemetry]:
+  """Record the generations of the block into telemetry, then export it to the histograms.
+
+  Requests that fail are exported too, with an error outcome.
+  """
+  outcome = "error"
+  try:
+    with recording_into([telemetry]):
+      yield telemetry
+    outcome = "ok"
+  finally:
+    export_request(telemetry, outcome)
+
+
+def export_request(telemetry: RequestTelemetry, outcome: str) -> None:
+  """Add the counters of a finished request to the histograms."""
+  PROMPT_TOKENS.observe(telemetry.prompt_tokens)
+  GENERATED_TOKENS.observe(telemetry.generated_tokens)
+  PREFILL_SECONDS.observe(telemetry.prefill_s)
+  DECODE_SECONDS.observe(telemetry.decode_s)
+  TOKENS_PER_SECOND.observe(telemetry.tokens_per_s)
+  QUEUE_WAIT_SECONDS.observe(telemetry.queue_wait_s)
+  REQUESTS.inc(str(telemetry.cold_load).lower(), outcome)
+
+
+def record_generation(prompt_tokens: list[int], generated_tokens: list[int], prefill_s: float,
+                      decode_s: float) -> None:
+  """Add one generate call, with token counts per row, to the requests being recorded."""
+  requests = _current_requests.get()
+  if len(requests) == len(prompt_tokens):
+    rows = [([prompt], [generated]) for prompt, generated in zip(prompt_tokens, generated_tokens)]
+  else:
+    # All rows belong to one request, e.g. the chunks of a map-reduce level.
+    rows = [(prompt_tokens, generated_tokens)] * len(requests)
+  for request, (prompts, generated) in zip(requests, rows):
+    request.prompt_tokens += sum(prompts)
+    request.generated_tokens += sum(generated)
+    request.prefill_s += prefill_s
+    request.decode_s += decode_s
+
+
+def record_model_load(seconds: float) -> None:
+  """Export a model load and mark the request that waited for it as a cold load."""
+  MODEL_LOAD_SECONDS.observe(seconds)
+  for request in _current_requests.get():
+    request.cold_load = True
+
+
+def render_metrics() -> str:
+  """All metrics in the Prometheus text exposition format."""
+  return "\n".join(line for metric in METRICS for line in metric.render()) + "\n"
+
@@ -0,0 +1,72 @@
+"""Test cases for assisted decoding."""
+import threading
+
+import torch
+from transformers import GPT2Config
+from transformers import GPT2LMHeadModel
+
+from book_summarizer.llm import assisted
+from book_summarizer.llm.assisted import assisted_stats
+from book_summarizer.llm.assisted import can_assist
+from book_summarizer.llm.assisted import count_forwards
+from book_summarizer.llm.assisted import generate_assisted
+from book_summarizer.llm.model_registry import ModelEntry
+
+
+class VocabTokenizer:
+  """Tokenizer stand-in exposing only the vocabulary."""
+
+  def __init__(self, letters: int = 26):
+    """Initializes the variables."""
+    self.letters = letters
+
+  def get_vocab(self):
+    return {chr(97 + index): index for index in range(self.letters)}
+
+
+def make_entry(model_name: str, letters: int = 26) -> ModelEntry:
+  torch.manual_seed(0)
+  model = GPT2LMHeadModel(GPT2Config(vocab_size=101, n_positions=128, n_embd=16, n_layer=2,
+                                     n_head=2)).eval()
+  return ModelEntry(model_name=model_name, tokenizer=VocabTokenizer(letters), model=model,
+                    load_time_s=0.0, precision="fp32", resident_bytes=0)
+
+
+def test_forward_counter_ignores_other_threads():
+  """Forward passes of other threads are not counted."""
+  entry = make_entry("model")
+  input_ids = torch.tensor([[1, 2, 3]])
+  with count_forwards(entry.model) as counter:
+    entry.model(input_ids)
+    thread = threading.Thread(target=entry.model, args=(input_ids,))
+    thread.start()
+    thread.join()
+  assert counter.count == 1
+
+
+def test_identical_draft_matches_plain_generate():
+  """Greedy assisted generation returns the main model's tokens and records acceptance."""
+  assisted_stats.reset()
+  entry, draft_entry = make_entry("model"), make_entry("draft")
+  inputs = {"input_ids": torch.tensor([[5, 6, 7, 8]]), "attention_mask": torch.ones(1, 4)}
+
+  plain = entry.model.generate(**inputs, max_new_tokens=12, do_sample=False, pad_token_id=0)
+  outputs = generate_assisted(entry, draft_entry, inputs, max_new_tokens=12, do_sample=False,
+                              pad_token_id=0)
+
+  assert torch.equal(outputs, plain)
+  stats = assisted_stats.stats()
+  assert stats["generations"] == 1
+  assert stats["generated_tokens"] == 12
+  assert stats["draft_tokens"] > 0
+  assert stats["tokens_per_verify_step"] >= 1
+
+
+def test_other_vocabulary_needs_universal_assisted_decoding(monkeypatch):
+  """A draft with another vocabulary is only used by transformers that translate between them."""
+  entry, same, other = make_entry("model"), make_entry("same"), make_entry("other", letters=20)
+  assert can_assist(entry, other)
+
+  monkeypatch.setattr(assisted, "get_transformers_version", lambda: (4, 33))
+  assert can_assist(entry, same)
+  assert not can_assist(entry, other)
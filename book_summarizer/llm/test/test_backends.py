@@ -0,0 +1,49 @@
+"""Test cases for the LLM backends."""
+import threading
+import time
+
+import pytest
+
+from book_summarizer.llm.backends import StubBackend
+from book_summarizer.llm.backends import get_backend
+from book_summarizer.llm.backends import register_backend
+
+
+def test_stub_summary_is_deterministic():
+  """The same input gives the same summary, streamed or not."""
+  backend = StubBackend(latency_ms=0, token_latency_ms=0, summary_words=4)
+  summary = backend.summarize("Once there was a king", model_name="model", prompt_name="Summarize")
+
+  assert summary == backend.summarize(["Once there ", "was a king"], model_name="model",
+                                      prompt_name="Summarize")
+  assert summary != backend.summarize("Once there was a queen", model_name="model",
+                                      prompt_name="Summarize")
+  assert summary.endswith("Summarize Once there")
+  assert "".join(backend.stream_summary("Once there was a king", model_name="model",
+                                        prompt_name="Summarize")) == summary
+  assert backend.summarize_batch(["Once there was a king", ["Once there ", "was a king"]],
+                                 model_name="model", prompt_name="Summarize") == [summary] * 2
+
+
+def test_stub_latency_and_stop_event():
+  """Generation takes the configured latency and streaming stops when the event is set."""
+  backend = StubBackend(latency_ms=50, token_latency_ms=10, summary_words=5)
+  start = time.perf_counter()
+  backend.summarize("content", model_name="model", prompt_name="prompt")
+  assert time.perf_counter() - start >= 0.1
+
+  stop_event = threading.Event()
+  pieces = []
+  for piece in backend.stream_summary("a b c d", model_name="model", prompt_name="prompt",
+                                      stop_event=stop_event):
+    pieces.append(piece)
+    stop_event.set()
+  assert len(pieces) == 1
+
+
+def test_backend_registry():
+  """Backends are created once per name and unknown names are rejected."""
+  register_backend("fast-stub", lambda: StubBackend(latency_ms=0, token_latency_ms=0))
+  assert get_backend("fast-stub") is get_backend("fast-stub")
+  with pytest.raises(ValueError):
+    get_backend("missing")
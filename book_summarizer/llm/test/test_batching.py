@@ -0,0 +1,44 @@
+"""Test cases for micro-batching of generation requests."""
+from concurrent.futures import ThreadPoolExecutor
+
+from book_summarizer.llm.batching import BatchScheduler
+
+
+def test_concurrent_requests_share_a_batch():
+  """Concurrent prompts are generated together and each caller gets its own output."""
+  calls = []
+
+  def generate_fn(llm_inputs: list[str]) -> list[str]:
+    calls.append(list(llm_inputs))
+    return [llm_input.upper() for llm_input in llm_inputs]
+
+  scheduler = BatchScheduler(generate_fn=generate_fn, max_batch_size=4, max_wait_ms=200)
+  prompts = [f"prompt {index}" for index in range(4)]
+  with ThreadPoolExecutor(max_workers=4) as pool:
+    outputs = list(pool.map(scheduler.generate, prompts))
+
+  assert outputs == [prompt.upper() for prompt in prompts]
+  assert all(len(batch) <= 4 for batch in calls)
+  assert len(calls) < 4
+  assert scheduler.stats()["requests"] == 4
+
+
+def test_batch_failure_reaches_every_caller():
+  """An exception in generation is raised for each request of the batch."""
+
+  def generate_fn(llm_inputs: list[str]) -> list[str]:
+    raise RuntimeError("out of memory")
+
+  scheduler = BatchScheduler(generate_fn=generate_fn, max_batch_size=2, max_wait_ms=10)
+  future = scheduler.submit("prompt")
+
+  assert isinstance(future.exception(timeout=5), RuntimeError)
+
+
+def test_missing_outputs_fail_the_batch():
+  """A generate call returning fewer outputs than prompts fails every request of the batch."""
+  scheduler = BatchScheduler(generate_fn=lambda llm_inputs: llm_inputs[:1], max_batch_size=2,
+                             max_wait_ms=200)
+  futures = [scheduler.submit("first"), scheduler.submit("second")]
+
+  assert all(isinstance(future.exception(timeout=5), RuntimeError) for future in futures)
@@ -0,0 +1,51 @@
+"""Test cases for extractive pre-summarization."""
+import numpy as np
+import pytest
+
+from book_summarizer.llm.extractive import rank_sentences
+from book_summarizer.llm.extractive import reduce_content
+from book_summarizer.llm.extractive import select_sentences
+
+SENTENCES = [
+    "The king ruled the kingdom by the sea.",
+    "The king loved the sea and the kingdom.",
+    "A cat slept.",
+    "The kingdom by the sea feared the king.",
+]
+
+
+def count_words(texts: list[str]) -> list[int]:
+  return [len(text.split()) for text in texts]
+
+
+@pytest.mark.parametrize("method", ["textrank", "tfidf"])
+def test_central_sentences_rank_first(method):
+  """Sentences sharing the main topic outrank the unrelated one."""
+  scores = rank_sentences(SENTENCES, method=method)
+  assert np.argmin(scores) == 2
+
+
+def test_selection_fits_budget_in_original_order():
+  """Selected sentences fit the budget and keep their order in the text."""
+  scores = np.array([3.0, 1.0, 0.5, 2.0])
+  selected = select_sentences(SENTENCES, scores, count_words(SENTENCES), budget_tokens=19)
+  assert selected == [SENTENCES[0], SENTENCES[2], SENTENCES[3]]
+
+
+def test_reduce_content():
+  """Content is reduced to the budget, and left alone when it fits or the mode is off."""
+  content = " ".join(SENTENCES * 20)
+  reduced = reduce_content(content, budget_tokens=40, count_tokens=count_words)
+  assert 0 < len(reduced.split()) <= 40
+  assert reduce_content(content, budget_tokens=40, count_tokens=count_words, method="off") == content
+  assert reduce_content(["The king ruled. ", "The sea."], budget_tokens=40,
+                        count_tokens=count_words) == "The king ruled.\nThe sea."
+
+
+def test_reduce_content_scores_pages_incrementally():
+  """Pages are cut down as they are read, the result still fits the budget in order."""
+  pages = iter([" ".join(SENTENCES)] * 50)
+  reduced = reduce_content(pages, budget_tokens=40, count_tokens=count_words, pool_factor=2)
+  sentences = reduced.split("\n")
+  assert 0 < sum(count_words(sentences)) <= 40
+  assert "A cat slept." not in sentences
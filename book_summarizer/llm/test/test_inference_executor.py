@@ -0,0 +1,69 @@
+"""Test cases for the bounded inference executor."""
+import asyncio
+import threading
+
+import pytest
+
+from book_summarizer.config.config import setting
+from book_summarizer.llm.inference_executor import InferenceExecutor
+from book_summarizer.utils.exception_utils import InferenceQueueFullError
+
+
+def test_run_returns_result():
+  """Calls run on the pool and their wait time is recorded."""
+  executor = InferenceExecutor(max_workers=2, max_queue_size=2)
+
+  result = asyncio.run(executor.run(lambda text: text.upper(), "summary"))
+
+  assert result == "SUMMARY"
+  stats = executor.stats()
+  assert stats["completed"] == 1
+  assert "wait_p95_s" in stats
+  executor.shutdown()
+
+
+def test_full_queue_rejects_requests():
+  """Requests beyond the running and queued slots are rejected immediately."""
+  executor = InferenceExecutor(max_workers=1, max_queue_size=1)
+  started, release = threading.Event(), threading.Event()
+
+  def block() -> bool:
+    started.set()
+    return release.wait()
+
+  running = executor.submit(block)
+  started.wait(timeout=5)
+  queued = executor.submit(lambda: "queued")
+  with pytest.raises(InferenceQueueFullError):
+    executor.submit(lambda: "rejected")
+
+  assert executor.stats()["rejected"] == 1
+  release.set()
+  assert running.result(timeout=5)
+  assert queued.result(timeout=5) == "queued"
+  assert executor.stats()["queued"] == 0
+  executor.shutdown()
+
+
+def test_free_workers_accept_calls_without_a_queue():
+  """Calls submitted back to back all start when there are enough free workers."""
+  executor = InferenceExecutor(max_workers=2, max_queue_size=0)
+  release = threading.Event()
+
+  futures = [executor.submit(release.wait) for _ in range(2)]
+  with pytest.raises(InferenceQueueFullError):
+    executor.submit(release.wait)
+
+  release.set()
+  assert all(future.result(timeout=5) for future in futures)
+  executor.shutdown()
+
+
+def test_batching_sizes_the_pool_to_a_batch(monkeypatch):
+  """With batching enabled a batch worth of requests can wait on the batcher at once."""
+  monkeypatch.setattr(setting, "LLM_INFERENCE_WORKERS", 1)
+  monkeypatch.setattr(setting, "LLM_MAX_BATCH_SIZE", 8)
+  monkeypatch.setattr(setting, "LLM_BATCHING_ENABLED", True)
+  assert InferenceExecutor().max_workers == 8
+  monkeypatch.setattr(setting, "LLM_BATCHING_ENABLED", False)
+  assert InferenceExecutor().max_workers == 1
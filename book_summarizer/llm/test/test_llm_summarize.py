@@ -0,0 +1,66 @@
+"""Test cases for generation with the registry models."""
+import threading
+
+import torch
+
+from book_summarizer.llm import llm_summarize
+from book_summarizer.llm import prefix_cache
+from book_summarizer.llm.model_registry import ModelEntry
+
+
+class StubTokenizer:
+  """Tokenizer with one token per character."""
+  pad_token = eos_token = "<pad>"
+  pad_token_id = eos_token_id = 0
+  padding_side = "left"
+
+  def __call__(self, texts, return_tensors=None, padding=False):
+    length = max(len(text) for text in texts)
+    input_ids = torch.tensor([[0] * (length - len(text)) + [ord(char) for char in text]
+                              for text in texts])
+    return {"input_ids": input_ids, "attention_mask": (input_ids != 0).long()}
+
+
+class FailingModel:
+  """Model whose generation fails, e.g. out of memory."""
+
+  def generate(self, **kwargs):
+    raise RuntimeError("out of memory")
+
+
+def test_stream_ends_when_generation_fails(monkeypatch):
+  """A failing generation ends the stream and raises in the consumer instead of blocking."""
+  entry = ModelEntry(model_name="stub", tokenizer=StubTokenizer(), model=FailingModel(),
+                     load_time_s=0.0, precision="fp32", resident_bytes=0)
+  monkeypatch.setattr(llm_summarize.model_registry, "get", lambda model_name: entry)
+  monkeypatch.setattr(llm_summarize.setting, "LLM_DRAFT_MODEL_NAME", None)
+  results = []
+
+  def consume():
+    try:
+      results.extend(llm_summarize.stream_llm_output("A king", model_name="stub"))
+    except RuntimeError as e:
+      results.append(e)
+
+  consumer = threading.Thread(target=consume)
+  consumer.start()
+  consumer.join(timeout=10)
+
+  assert not consumer.is_alive()
+  assert isinstance(results[-1], RuntimeError) and str(results[-1]) == "out of memory"
+  assert "".join(results[:-1]) == ""
+
+
+def test_older_transformers_skip_the_prefix_cache(monkeypatch):
+  """Without the cache API of recent transformers inputs are tokenized without a prefix cache."""
+  entry = ModelEntry(model_name="stub", tokenizer=StubTokenizer(), model=FailingModel(),
+                     load_time_s=0.0, precision="fp32", resident_bytes=0)
+  monkeypatch.setattr(llm_summarize.setting, "LLM_PREFIX_CACHE_ENABLED", True)
+  monkeypatch.setattr(prefix_cache, "get_transformers_version", lambda: (4, 33))
+  llm_input = llm_summarize.get_prompt_prefixes()[0] + "A king"
+
+  inputs = llm_summarize.build_generation_inputs(entry, [llm_input])
+
+  assert "past_key_values" not in inputs
+  assert inputs["input_ids"].shape[1] == len(llm_input)
+  assert not entry.prefix_caches
@@ -0,0 +1,87 @@
+"""Test cases for map-reduce summarization."""
+from types import SimpleNamespace
+
+import pytest
+
+from book_summarizer.llm.map_reduce import iter_token_chunks
+from book_summarizer.llm.map_reduce import summarize_map_reduce
+from book_summarizer.llm.prompts.book_prompt import chunk_summary_prompt
+from book_summarizer.llm.prompts.book_prompt import reduce_summary_prompt
+
+
+class WordTokenizer:
+  """Tokenizer with one token per whitespace separated word."""
+  model_max_length = 10**30
+
+  def __init__(self):
+    self.vocab: list[str] = []
+
+  def __call__(self, text: str, add_special_tokens: bool = True) -> dict[str, list[int]]:
+    ids = []
+    for word in text.split():
+      if word not in self.vocab:
+        self.vocab.append(word)
+      ids.append(self.vocab.index(word))
+    return {"input_ids": ids}
+
+  def decode(self, ids: list[int], skip_special_tokens: bool = True) -> str:
+    return " ".join(self.vocab[i] for i in ids)
+
+
+def test_chunks_respect_size_and_overlap():
+  """Chunks hold at most chunk_tokens words and repeat the overlap of the previous chunk."""
+  tokenizer = WordTokenizer()
+  words = [f"w{index}" for index in range(25)]
+
+  chunks = list(iter_token_chunks(tokenizer, [" ".join(words[:12]), " ".join(words[12:])],
+                                  chunk_tokens=10, overlap=2))
+
+  assert chunks[0].split() == words[:10]
+  assert chunks[1].split() == words[8:18]
+  assert chunks[-1].split()[-1] == "w24"
+  assert all(len(chunk.split()) <= 10 for chunk in chunks)
+
+
+def test_chunk_overlap_must_be_smaller_than_chunk():
+  """Overlap equal to the chunk size is rejected."""
+  with pytest.raises(ValueError):
+    list(iter_token_chunks(WordTokenizer(), ["a b c"], chunk_tokens=2, overlap=2))
+
+
+def test_long_content_is_reduced_to_one_summary():
+  """Every chunk is summarized and partial summaries are merged into the final prompt."""
+  calls: list[list[str]] = []
+
+  def generate_fn(llm_inputs: list[str]) -> list[str]:
+    calls.append(llm_inputs)
+    return ["partial"] * len(llm_inputs)
+
+  content = " ".join(f"word{index}" for index in range(1000))
+  model = SimpleNamespace(config=SimpleNamespace(max_position_embeddings=10**6))
+
+  summary = summarize_map_reduce(content, tokenizer=WordTokenizer(), model=model,
+                                 generate_fn=generate_fn, prompt="BOOK", chunk_tokens=100,
+                                 chunk_overlap=0, reduce_fan_in=3, batch_size=4,
+                                 max_new_tokens=10)
+
+  map_inputs = [text for batch in calls for text in batch if text.startswith(chunk_summary_prompt)]
+  assert len(map_inputs) == 10
+  assert any(text.startswith(reduce_summary_prompt) for batch in calls for text in batch)
+  assert calls[-1][0].startswith("BOOK")
+  assert summary == "partial"
+
+
+def test_short_content_is_summarized_directly():
+  """Content that fits one chunk needs a single call with the book prompt."""
+  calls: list[list[str]] = []
+
+  def generate_fn(llm_inputs: list[str]) -> list[str]:
+    calls.append(llm_inputs)
+    return ["summary"]
+
+  summary = summarize_map_reduce("a short story", tokenizer=WordTokenizer(), model=None,
+                                 generate_fn=generate_fn, prompt="BOOK", chunk_tokens=100,
+                                 chunk_overlap=10, max_new_tokens=10)
+
+  assert summary == "summary"
+  assert calls == [["BOOK\na short story"]]
@@ -0,0 +1,79 @@
+"""Test cases for the model registry."""
+from unittest.mock import MagicMock
+
+import torch
+
+from book_summarizer.llm.get_llm import load_int8_weights
+from book_summarizer.llm.get_llm import quantize_int8
+from book_summarizer.llm.model_registry import ModelRegistry
+from book_summarizer.llm.model_registry import get_model_size_bytes
+
+
+def make_loader() -> MagicMock:
+  """Loader returning a fresh (tokenizer, model) pair per call."""
+  return MagicMock(side_effect=lambda model_name: (f"tokenizer-{model_name}", object()))
+
+
+def test_model_is_loaded_once():
+  """Repeated lookups reuse the loaded model."""
+  loader = make_loader()
+  registry = ModelRegistry(max_size=2, loader=loader)
+
+  first = registry.get_llm_and_tokenizer("model-a")
+  second = registry.get_llm_and_tokenizer("model-a")
+
+  assert first == second
+  assert loader.call_count == 1
+  assert registry.stats()[0]["hits"] == 1
+
+
+def test_least_recently_used_model_is_evicted():
+  """Models above the size limit are evicted in LRU order."""
+  loader = make_loader()
+  registry = ModelRegistry(max_size=2, loader=loader)
+
+  registry.warm_up(["model-a", "model-b"])
+  registry.get("model-a")
+  registry.get("model-c")
+
+  assert "model-a" in registry
+  assert "model-b" not in registry
+  assert "model-c" in registry
+  assert [entry["model_name"] for entry in registry.stats()] == ["model-a", "model-c"]
+
+
+def test_evict_and_reload():
+  """An evicted model is loaded again on the next lookup."""
+  loader = make_loader()
+  registry = ModelRegistry(max_size=2, loader=loader)
+
+  registry.get("model-a")
+  assert registry.evict("model-a")
+  assert not registry.evict("model-a")
+  registry.get("model-a")
+
+  assert loader.call_count == 2
+  assert len(registry) == 1
+
+
+def test_model_size_counts_int8_weights():
+  """Packed int8 weights are counted and are about a quarter of the fp32 size."""
+  model = torch.nn.Sequential(torch.nn.Linear(256, 256), torch.nn.Linear(256, 256))
+  fp32_bytes = get_model_size_bytes(model)
+  int8_bytes = get_model_size_bytes(quantize_int8(model))
+  assert 0 < int8_bytes < fp32_bytes / 3
+
+
+def test_int8_weights_round_trip(tmp_path):
+  """Stored int8 weights load without unpickling modules and give the same outputs."""
+  torch.manual_seed(0)
+  model = quantize_int8(torch.nn.Sequential(torch.nn.Linear(16, 16), torch.nn.ReLU(),
+                                            torch.nn.Linear(16, 4)))
+  path = str(tmp_path / "model.pt")
+  torch.save(model.state_dict(), path)
+  fresh = quantize_int8(torch.nn.Sequential(torch.nn.Linear(16, 16), torch.nn.ReLU(),
+                                            torch.nn.Linear(16, 4)))
+  loaded = load_int8_weights(fresh, path)
+
+  inputs = torch.randn(3, 16)
+  assert torch.equal(loaded(inputs), model(inputs))
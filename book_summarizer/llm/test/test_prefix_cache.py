@@ -0,0 +1,94 @@
+"""Test cases for prompt prefix key/value caching."""
+import pytest
+import torch
+from tokenizers import decoders
+from tokenizers import models
+from tokenizers import pre_tokenizers
+from tokenizers import Tokenizer
+from tokenizers import trainers
+from transformers import GPT2Config
+from transformers import GPT2LMHeadModel
+from transformers import PreTrainedTokenizerFast
+
+from book_summarizer.llm.prefix_cache import find_shared_prefix
+from book_summarizer.llm.prefix_cache import is_prefix_cache_supported
+from book_summarizer.llm.prefix_cache import PrefixCache
+
+
+class CharTokenizer:
+  """Tokenizer with one token per character."""
+  pad_token_id = 0
+  eos_token_id = 0
+
+  def __call__(self, text, return_tensors=None, add_special_tokens=True):
+    texts = [text] if isinstance(text, str) else text
+    input_ids = [[ord(char) % 100 + 1 for char in item] for item in texts]
+    if return_tensors == "pt":
+      return {"input_ids": torch.tensor(input_ids)}
+    return {"input_ids": input_ids if not isinstance(text, str) else input_ids[0]}
+
+
+requires_cache_api = pytest.mark.skipif(not is_prefix_cache_supported(),
+                                        reason="prefix caches need transformers >= 4.56")
+
+
+def make_bpe_tokenizer() -> PreTrainedTokenizerFast:
+  """Byte-level BPE tokenizer trained on a few words, so "book" is a single token."""
+  tokenizer = Tokenizer(models.BPE())
+  tokenizer.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+  tokenizer.decoder = decoders.ByteLevel()
+  trainer = trainers.BpeTrainer(vocab_size=300, special_tokens=["<eos>"],
+                                initial_alphabet=pre_tokenizers.ByteLevel.alphabet())
+  tokenizer.train_from_iterator(["Summarize this book:\n a king and a fairy queen"] * 50, trainer)
+  return PreTrainedTokenizerFast(tokenizer_object=tokenizer, eos_token="<eos>", pad_token="<eos>",
+                                 padding_side="left")
+
+
+def test_find_shared_prefix():
+  """The longest known prefix shared by all inputs is used."""
+  prefixes = ["Summarize:\n", "Summarize:\nPart\n", "Combine:\n"]
+
+  assert find_shared_prefix(["Summarize:\nPart\na", "Summarize:\nPart\nb"], prefixes) \
+      == "Summarize:\nPart\n"
+  assert find_shared_prefix(["Summarize:\na", "Combine:\nb"], prefixes) is None
+
+
+@requires_cache_api
+def test_cached_prefix_generates_same_tokens():
+  """Generation from the cached prefix matches generation from the full input."""
+  torch.manual_seed(0)
+  model = GPT2LMHeadModel(GPT2Config(vocab_size=101, n_positions=128, n_embd=16, n_layer=2,
+                                     n_head=2)).eval()
+  tokenizer = CharTokenizer()
+  prefix_cache = PrefixCache(tokenizer, model, "Summarize this book:\n")
+
+  inputs = prefix_cache.build_inputs(tokenizer, ["a king", "a fairy queen"])
+  cached = model.generate(**inputs, max_new_tokens=5, do_sample=False, pad_token_id=0)
+  inputs.pop("past_key_values")
+  full = model.generate(**inputs, max_new_tokens=5, do_sample=False, pad_token_id=0)
+
+  assert torch.equal(cached, full)
+  assert prefix_cache.build_inputs(tokenizer, ["a king", ""]) is None
+
+
+@requires_cache_api
+def test_prefix_merged_with_suffix_is_not_cached():
+  """With a subword tokenizer the cache only applies when the prefix tokens are unchanged."""
+  torch.manual_seed(0)
+  model = GPT2LMHeadModel(GPT2Config(vocab_size=300, n_positions=128, n_embd=16, n_layer=2,
+                                     n_head=2)).eval()
+  tokenizer = make_bpe_tokenizer()
+
+  # "boo" + "k" is tokenized as "book", so the cached "boo" token never occurs.
+  assert PrefixCache(tokenizer, model, "Summarize this boo").build_inputs(tokenizer, ["k"]) is None
+
+  prefix_cache = PrefixCache(tokenizer, model, "Summarize this book:\n")
+  texts = ["Summarize this book:\n a king", "Summarize this book:\n a fairy queen"]
+  inputs = prefix_cache.build_inputs(tokenizer, [text[len(prefix_cache.prefix):] for text in texts])
+  cached = model.generate(**inputs, max_new_tokens=5, do_sample=False, pad_token_id=0)
+  full = model.generate(**tokenizer(texts, return_tensors="pt", padding=True), max_new_tokens=5,
+                        do_sample=False, pad_token_id=0)
+
+  assert torch.equal(cached[:, -5:], full[:, -5:])
+  # The cached tensors are not extended by generation.
+  assert prefix_cache.key_values[0][0].shape[-2] == prefix_cache.prefix_ids.shape[1]
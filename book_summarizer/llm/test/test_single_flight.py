@@ -0,0 +1,82 @@
+"""Test cases for coalescing identical in-flight requests."""
+import asyncio
+import threading
+from unittest.mock import patch
+
+import pytest
+
+from book_summarizer.config.config import setting
+from book_summarizer.llm import summary_service
+from book_summarizer.llm.backends import StubBackend
+from book_summarizer.llm.single_flight import SingleFlight
+from book_summarizer.llm.telemetry import RequestTelemetry
+
+
+def test_identical_requests_share_one_generation(monkeypatch):
+  """Concurrent requests for the same content reach the model once."""
+  monkeypatch.setattr(setting, "SUMMARY_CACHE_ENABLED", False)
+  backend = StubBackend(latency_ms=0, token_latency_ms=0)
+  monkeypatch.setattr(summary_service, "get_backend", lambda: backend)
+  release = threading.Event()
+
+  def fake_summarize(content, **kwargs):
+    release.wait(timeout=5)
+    return f"summary of {content}"
+
+  async def run_all() -> tuple[list[str], list[RequestTelemetry]]:
+    telemetries = [RequestTelemetry() for _ in range(4)]
+    requests = [summary_service.summarize("a king", model_name="model", telemetry=telemetry)
+                for telemetry in telemetries[:3]]
+    requests.append(summary_service.summarize("a queen", model_name="model",
+                                              telemetry=telemetries[3]))
+    tasks = [asyncio.ensure_future(request) for request in requests]
+    await asyncio.sleep(0.05)
+    release.set()
+    return await asyncio.gather(*tasks), telemetries
+
+  with patch.object(backend, "summarize", side_effect=fake_summarize) as generate:
+    summaries, telemetries = asyncio.run(run_all())
+
+  assert summaries == ["summary of a king"] * 3 + ["summary of a queen"]
+  assert generate.call_count == 2
+  assert [telemetry.coalesced for telemetry in telemetries] == [False, True, True, False]
+
+
+def test_flight_is_cancelled_with_its_last_waiter():
+  """Cancelling one waiter keeps the shared call running, cancelling all of them stops it."""
+  async def run() -> None:
+    flights = SingleFlight()
+    started, release, cancelled = asyncio.Event(), asyncio.Event(), asyncio.Event()
+
+    async def func() -> str:
+      started.set()
+      try:
+        await release.wait()
+      except asyncio.CancelledError:
+        cancelled.set()
+        raise
+      return "done"
+
+    first = asyncio.ensure_future(flights.run("key", func))
+    second = asyncio.ensure_future(flights.run("key", func))
+    await started.wait()
+    first.cancel()
+    await asyncio.sleep(0)
+    assert not cancelled.is_set()
+    release.set()
+    assert await second == ("done", True)
+    with pytest.raises(asyncio.CancelledError):
+      await first
+
+    release.clear()
+    cancelled.clear()
+    third = asyncio.ensure_future(flights.run("key", func))
+    await asyncio.sleep(0)
+    third.cancel()
+    with pytest.raises(asyncio.CancelledError):
+      await third
+    await asyncio.sleep(0)
+    assert cancelled.is_set()
+    assert flights.stats() == {"in_flight": 0, "started": 2, "joined": 1}
+
+  asyncio.run(run())
@@ -0,0 +1,75 @@
+"""Test cases for the summary cache."""
+import sqlite3
+
+from book_summarizer.llm.summary_cache import hash_text
+from book_summarizer.llm.summary_cache import make_cache_key
+from book_summarizer.llm.summary_cache import SummaryCache
+
+PARAMS = {"chunk_tokens": 2048, "chunk_overlap": 128}
+
+
+def test_key_ignores_whitespace_differences():
+  """Copies of a text that only differ in whitespace share a key."""
+  key_a = make_cache_key("model", "prompt", "Once there was\n\na king. ", PARAMS)
+  key_b = make_cache_key("model", "prompt", "Once  there was a king.", PARAMS)
+  key_c = make_cache_key("other-model", "prompt", "Once there was a king.", PARAMS)
+
+  assert key_a == key_b
+  assert key_a != key_c
+
+
+def test_summaries_persist_across_instances(tmp_path):
+  """A summary stored by one cache instance is a disk hit for the next one."""
+  path = str(tmp_path / "cache.sqlite3")
+  SummaryCache(path=path).set("key", "summary", "model", "prompt")
+
+  cache = SummaryCache(path=path)
+  assert cache.get("key") == "summary"
+  assert cache.get("key") == "summary"
+  assert cache.get("missing") is None
+  stats = cache.stats()
+  assert (stats["disk_hits"], stats["memory_hits"], stats["misses"]) == (1, 1, 1)
+
+
+def test_disk_tier_evicts_least_recently_used(tmp_path):
+  """The disk tier keeps at most disk_max_entries summaries."""
+  cache = SummaryCache(path=str(tmp_path / "cache.sqlite3"), memory_size=0, disk_max_entries=2)
+  for index in range(3):
+    cache.set(f"key{index}", f"summary{index}", "model", "prompt")
+
+  assert cache.get("key0") is None
+  assert cache.get("key2") == "summary2"
+  assert cache.stats()["disk_evictions"] == 1
+
+
+def test_invalidate_stale_entries(tmp_path):
+  """Entries of another model or prompt are removed from both tiers."""
+  cache = SummaryCache(path=str(tmp_path / "cache.sqlite3"))
+  cache.set("old-model", "summary", "model-a", "prompt")
+  cache.set("old-prompt", "summary", "model-b", "old prompt")
+  cache.set("old-precision", "summary", "model-b", "prompt", precision="fp32")
+  cache.set("current", "summary", "model-b", "prompt", precision="int8")
+
+  assert cache.invalidate_stale(model_name="model-b", prompt="prompt", precision="int8") == 3
+  assert cache.get("old-model") is None
+  assert cache.get("old-prompt") is None
+  assert cache.get("old-precision") is None
+  assert cache.get("current") == "summary"
+  assert cache.invalidate() == 1
+
+
+def test_store_without_precision_is_migrated(tmp_path):
+  """Entries of a store written before precisions were recorded count as stale."""
+  path = str(tmp_path / "cache.sqlite3")
+  connection = sqlite3.connect(path)
+  connection.execute("""CREATE TABLE summaries (key TEXT PRIMARY KEY, model_name TEXT NOT NULL,
+                        prompt_hash TEXT NOT NULL, summary TEXT NOT NULL,
+                        created_at REAL NOT NULL, last_access REAL NOT NULL)""")
+  connection.execute("INSERT INTO summaries VALUES ('old', 'model', ?, 'summary', 0, 0)",
+                     (hash_text("prompt"),))
+  connection.commit()
+  connection.close()
+  cache = SummaryCache(path=path)
+
+  assert cache.get("old") == "summary"
+  assert cache.invalidate_stale(model_name="model", prompt="prompt", precision="fp32") == 1
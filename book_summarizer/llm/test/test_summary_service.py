@@ -0,0 +1,111 @@
+"""Test cases for the summarization service."""
+import asyncio
+import sqlite3
+from unittest.mock import patch
+
+import pytest
+
+from book_summarizer.config.config import setting
+from book_summarizer.llm import summary_service
+from book_summarizer.llm.backends import StubBackend
+from book_summarizer.llm.summary_cache import SummaryCache
+from book_summarizer.utils.exception_utils import InferenceQueueFullError
+
+
+def test_summary_is_served_from_cache(tmp_path, monkeypatch):
+  """A repeated request does not reach the model."""
+  monkeypatch.setattr(setting, "SUMMARY_CACHE_ENABLED", True)
+  monkeypatch.setattr(summary_service, "summary_cache",
+                      SummaryCache(path=str(tmp_path / "cache.sqlite3")))
+  backend = StubBackend(latency_ms=0, token_latency_ms=0)
+  monkeypatch.setattr(summary_service, "get_backend", lambda: backend)
+  with patch.object(backend, "summarize", return_value="summary") as generate:
+    first = asyncio.run(summary_service.summarize("Once there was a king", model_name="model"))
+    second = asyncio.run(summary_service.summarize("Once there was  a king", model_name="model"))
+
+  assert first == second == "summary"
+  assert generate.call_count == 1
+
+
+def test_stream_summary_yields_generated_pieces(monkeypatch):
+  """Streamed pieces arrive in order and stop the generator when the consumer leaves."""
+  monkeypatch.setattr(setting, "SUMMARY_CACHE_ENABLED", False)
+  backend = StubBackend(latency_ms=0, token_latency_ms=0)
+  monkeypatch.setattr(summary_service, "get_backend", lambda: backend)
+  stop_events = []
+
+  def fake_stream(content, stop_event, **kwargs):
+    stop_events.append(stop_event)
+    yield from ["Once ", "there ", "was ", "a ", "king"]
+
+  async def consume(limit: int) -> list[str]:
+    pieces = summary_service.stream_summary("content", model_name="model")
+    received = []
+    async for piece in pieces:
+      received.append(piece)
+      if len(received) == limit:
+        break
+    await pieces.aclose()
+    return received
+
+  with patch.object(backend, "stream_summary", side_effect=fake_stream):
+    assert "".join(asyncio.run(consume(limit=10))) == "Once there was a king"
+    assert not stop_events[-1].is_set()
+    assert asyncio.run(consume(limit=2)) == ["Once ", "there "]
+    assert stop_events[-1].is_set()
+
+
+def test_failing_cache_write_still_returns_summary(tmp_path, monkeypatch):
+  """A locked cache store loses the entry, not the generated summary."""
+  monkeypatch.setattr(setting, "SUMMARY_CACHE_ENABLED", True)
+  cache = SummaryCache(path=str(tmp_path / "cache.sqlite3"))
+  monkeypatch.setattr(summary_service, "summary_cache", cache)
+  backend = StubBackend(latency_ms=0, token_latency_ms=0)
+  monkeypatch.setattr(summary_service, "get_backend", lambda: backend)
+
+  async def consume() -> str:
+    return "".join([piece async for piece in summary_service.stream_summary("A queen",
+                                                                            model_name="model")])
+
+  with patch.object(cache, "set", side_effect=sqlite3.OperationalError("database is locked")), \
+      patch.object(backend, "summarize", return_value="summary"), \
+      patch.object(backend, "stream_summary", return_value=iter(["a ", "summary"])):
+    assert asyncio.run(summary_service.summarize("A king", model_name="model")) == "summary"
+    assert asyncio.run(consume()) == "a summary"
+
+
+def test_deletions_clear_other_workers_memory(tmp_path):
+  """An entry deleted through one worker is no longer served from another's memory tier."""
+  path = str(tmp_path / "cache.sqlite3")
+  worker_a, worker_b = SummaryCache(path=path), SummaryCache(path=path)
+  worker_a.set("key", "summary", "model", "prompt")
+  assert worker_b.get("key") == "summary"
+
+  assert worker_a.invalidate(model_name="model") == 1
+  assert worker_b.get("key") is None
+
+
+def test_page_iterator_is_closed_after_inference(monkeypatch):
+  """Iterable content is closed once inference is done with it, also when it is rejected."""
+  monkeypatch.setattr(setting, "SUMMARY_CACHE_ENABLED", False)
+  backend = StubBackend(latency_ms=0, token_latency_ms=0)
+  monkeypatch.setattr(summary_service, "get_backend", lambda: backend)
+
+  class Pages:
+    closed = 0
+
+    def __iter__(self):
+      return iter(["Once there was ", "a king"])
+
+    def close(self):
+      Pages.closed += 1
+
+  with patch.object(backend, "summarize", return_value="summary"):
+    assert asyncio.run(summary_service.summarize(Pages(), model_name="model")) == "summary"
+  assert Pages.closed == 1
+
+  full = InferenceQueueFullError("full")
+  with patch.object(summary_service.inference_executor, "submit", side_effect=full), \
+      pytest.raises(InferenceQueueFullError):
+    asyncio.run(summary_service.summarize(Pages(), model_name="model"))
+  assert Pages.closed == 2
@@ -0,0 +1,88 @@
+"""Test cases for inference telemetry."""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from book_summarizer.config.config import setting
+from book_summarizer.llm import summary_service
+from book_summarizer.llm.backends import StubBackend
+from book_summarizer.llm.batching import BatchScheduler
+from book_summarizer.llm.telemetry import Histogram
+from book_summarizer.llm.telemetry import RequestTelemetry
+from book_summarizer.llm.telemetry import record_generation
+from book_summarizer.llm.telemetry import REQUESTS
+from book_summarizer.llm.telemetry import render_metrics
+from book_summarizer.llm.telemetry import track_request
+
+
+def test_histogram_renders_cumulative_buckets():
+  """Bucket counts are cumulative and end with +Inf, sum and count."""
+  histogram = Histogram("latency_seconds", "Latency.", (0.1, 1))
+  for value in (0.05, 0.5, 5):
+    histogram.observe(value)
+  assert histogram.render()[2:] == [
+      'latency_seconds_bucket{le="0.1"} 1',
+      'latency_seconds_bucket{le="1"} 2',
+      'latency_seconds_bucket{le="+Inf"} 3',
+      "latency_seconds_sum 5.55",
+      "latency_seconds_count 3",
+  ]
+
+
+def test_generations_add_up_per_request():
+  """All rows of a generate call made by one request are counted for that request."""
+  telemetry = RequestTelemetry()
+  with track_request(telemetry):
+    record_generation([10, 20], [5, 7], prefill_s=0.5, decode_s=1.5)
+    record_generation([30], [4], prefill_s=0.25, decode_s=0.75)
+  assert (telemetry.prompt_tokens, telemetry.generated_tokens) == (60, 16)
+  assert telemetry.tokens_per_s == 16 / 3.0
+  assert "llm_generated_tokens_count" in render_metrics()
+
+
+def test_failed_requests_are_exported_as_errors():
+  """A request failing inside track_request still reaches the metrics, labelled error."""
+  def count(outcome: str) -> int:
+    return sum(int(line.split()[-1]) for line in REQUESTS.render()
+               if f'outcome="{outcome}"' in line)
+
+  errors, ok = count("error"), count("ok")
+  with pytest.raises(RuntimeError), track_request(RequestTelemetry()):
+    record_generation([10], [5], prefill_s=0.5, decode_s=1.5)
+    raise RuntimeError("out of memory")
+
+  assert (count("error"), count("ok")) == (errors + 1, ok)
+  assert 'llm_requests_total{cold_load="false",outcome="error"}' in render_metrics()
+
+
+def test_batched_rows_are_attributed_to_their_requests():
+  """Each request in a micro-batch gets the tokens of its own row."""
+  backend = StubBackend(latency_ms=20, token_latency_ms=0, summary_words=3)
+  scheduler = BatchScheduler(generate_fn=backend.generate, max_batch_size=2, max_wait_ms=200)
+
+  def call(llm_input: str) -> RequestTelemetry:
+    telemetry = RequestTelemetry()
+    with track_request(telemetry):
+      scheduler.generate(llm_input)
+    return telemetry
+
+  with ThreadPoolExecutor(max_workers=2) as pool:
+    short, long = pool.map(call, ["one two", "one two three four five"])
+  assert (short.prompt_tokens, long.prompt_tokens) == (2, 5)
+  assert short.generated_tokens == long.generated_tokens == 3
+  assert scheduler.stats()["batch_sizes"] == {2: 1}
+
+
+def test_summarize_records_queue_wait_and_cache_hit(monkeypatch):
+  """The service fills the caller's telemetry."""
+  monkeypatch.setattr(setting, "SUMMARY_CACHE_ENABLED", False)
+  backend = StubBackend(latency_ms=0, token_latency_ms=0, summary_words=4)
+  monkeypatch.setattr(summary_service, "get_backend", lambda: backend)
+  telemetry = RequestTelemetry()
+  asyncio.run(summary_service.summarize("Once there was a king", model_name="model",
+                                        telemetry=telemetry))
+  assert telemetry.generated_tokens == 4
+  assert telemetry.prompt_tokens > 0
+  assert not telemetry.cache_hit
+  assert telemetry.to_headers()["X-LLM-Generated-Tokens"] == "4"
@@ -0,0 +1,242 @@
+"""Cosine neighbour indexes over the ratings matrix: exact brute force or approximate IVF.
+
+An index answers "which books are most similar to these rating vectors" and is saved next to
+the artifacts it was built from. The IVF index embeds every book into the top singular
+directions of the normalized ratings, clusters the embeddings with spherical k-means and only
+considers the books of the clusters closest to a query. Those are ranked by their embeddings
+and the best of them scored exactly on the sparse ratings.
+"""
+import json
+import math
+import os
+from abc import ABC
+from abc import abstractmethod
+from typing import Any
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse import diags
+
+from book_summarizer.config.config import setting
+from book_summarizer.recommendation.neighbours import select_top_k
+
+INDEX_FILE = "index.json"
+
+
+def get_row_norms(matrix: csr_matrix) -> np.ndarray:
+  """L2 norm of every row."""
+  return np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel()).astype(np.float32)
+
+
+def normalize_dense(vectors: np.ndarray) -> np.ndarray:
+  """Rows scaled to unit length, zero rows stay zero."""
+  norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+  return np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+
+class NeighbourIndex(ABC):
+  """Finds the books with the highest cosine similarity to query rating vectors."""
+  name: str
+
+  def __init__(self, matrix: csr_matrix, norms: np.ndarray | None = None):
+    """Initializes the variables."""
+    self.matrix = matrix
+    self.norms = get_row_norms(matrix) if norms is None else norms
+
+  @abstractmethod
+  def search(self, queries: Any, k: int,
+             exclude: np.ndarray | None = None) -> tuple[np.ndarray, np.ndarray]:
+    """Book rows and similarities of the k books most similar to each query row.
+
+    Returns int32 rows and float32 similarities of shape (n_queries, k), best first and
+    padded with -1. `exclude` holds one book per query to leave out, usually itself.
+    """
+
+  def params(self) -> dict[str, Any]:
+    """Parameters stored with the index."""
+    return {}
+
+  def arrays(self) -> dict[str, np.ndarray]:
+    """Arrays stored with the index."""
+    return {}
+
+  def save(self, directory: str) -> None:
+    """Write the index to an artifact version directory."""
+    for name, array in self.arrays().items():
+      np.save(os.path.join(directory, f"index_{name}.npy"), np.ascontiguousarray(array),
+              allow_pickle=False)
+    with open(os.path.join(directory, INDEX_FILE), "w", encoding="utf-8") as index_file:
+      json.dump({"type": self.name, "params": self.params(), "arrays": sorted(self.arrays())},
+                index_file)
+
+  def score(self, queries: csr_matrix, query_norms: np.ndarray, rows: np.ndarray,
+            query: int) -> np.ndarray:
+    """Exact cosine similarities of some books to one query."""
+    dots = np.asarray((self.matrix[rows] @ queries[query].T).todense()).ravel()
+    norms = self.norms[rows] * query_norms[query]
+    return np.divide(dots, norms, out=np.zeros_like(dots), where=norms > 0)
+
+
+class BruteForceIndex(NeighbourIndex):
+  """Scores every book, exact."""
+  name = "brute"
+
+  def __init__(self, matrix: csr_matrix, norms: np.ndarray | None = None,
+               block_size: int = 256):
+    """Initializes the variables."""
+    super().__init__(matrix, norms)
+    self.block_size = block_size
+
+  def search(self, queries: Any, k: int,
+             exclude: np.ndarray | None = None) -> tuple[np.ndarray, np.ndarray]:
+    queries = csr_matrix(queries, dtype=np.float32)
+    query_norms = get_row_norms(queries)
+    indices = np.empty((queries.shape[0], k), dtype=np.int32)
+    scores = np.empty((queries.shape[0], k), dtype=np.float32)
+    for start in range(0, queries.shape[0], self.block_size):
+      stop = min(start + self.block_size, queries.shape[0])
+      dots = (queries[start:stop] @ self.matrix.T).toarray()
+      norms = np.outer(query_norms[start:stop], self.norms)
+      similarities = np.divide(dots, norms, out=np.zeros_like(dots), where=norms > 0)
+      if exclude is not None:
+        similarities[np.arange(stop - start), exclude[start:stop]] = -np.inf
+      indices[start:stop], scores[start:stop] = select_top_k(similarities, k)
+    return indices, scores
+
+
+def get_singular_basis(matrix: csr_matrix, dimensions: int, rng: np.random.Generator,
+                       oversampling: int = 10, power_iterations: int = 2) -> np.ndarray:
+  """Top right singular vectors of a sparse matrix by randomized range finding, (n_cols, d)."""
+  width = min(dimensions + oversampling, *matrix.shape)
+  basis, _ = np.linalg.qr(matrix @ rng.standard_normal((matrix.shape[1], width)).astype(np.float32))
+  for _ in range(power_iterations):
+    basis, _ = np.linalg.qr(matrix @ np.asarray(matrix.T @ basis))
+  _, _, right = np.linalg.svd(np.asarray(matrix.T @ basis).T, full_matrices=False)
+  return np.ascontiguousarray(right[:dimensions].T, dtype=np.float32)
+
+
+def spherical_kmeans(vectors: np.ndarray, n_lists: int, iterations: int,
+                     rng: np.random.Generator) -> np.ndarray:
+  """Unit-length centroids of n_lists clusters of unit-length vectors."""
+  centroids = vectors[rng.choice(len(vectors), n_lists, replace=False)].copy()
+  for _ in range(iterations):
+    assignment = np.argmax(vectors @ centroids.T, axis=1)
+    sums = np.zeros_like(centroids)
+    np.add.at(sums, assignment, vectors)
+    empty = ~sums.any(axis=1)
+    # Empty clusters restart from random vectors.
+    sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]
+    centroids = normalize_dense(sums)
+  return centroids
+
+
+class IVFIndex(NeighbourIndex):
+  """Inverted lists over embeddings of the books, searched n_probes lists at a time.
+
+  Recall rises with n_probes, at the cost of ranking more books per query, and with
+  n_rerank, the number of them scored exactly.
+  """
+  name = "ivf"
+
+  def __init__(self, matrix: csr_matrix, projection: np.ndarray, embeddings: np.ndarray,
+               centroids: np.ndarray, list_offsets: np.ndarray, list_items: np.ndarray,
+               norms: np.ndarray | None = None, n_probes: int = setting.RECOMMENDATION_IVF_PROBES,
+               n_rerank: int = setting.RECOMMENDATION_IVF_RERANK):
+    """Initializes the variables."""
+    super().__init__(matrix, norms)
+    self.projection = projection
+    self.embeddings = embeddings
+    self.centroids = centroids
+    self.list_offsets = list_offsets
+    self.list_items = list_items
+    self.n_probes = n_probes
+    self.n_rerank = n_rerank
+
+  def embed(self, queries: csr_matrix) -> np.ndarray:
+    """Unit-length embeddings of rating vectors."""
+    return normalize_dense(np.asarray(queries @ self.projection, dtype=np.float32))
+
+  @classmethod
+  def build(cls, matrix: Any, n_lists: int = setting.RECOMMENDATION_IVF_LISTS,
+            dimensions: int = setting.RECOMMENDATION_IVF_DIMENSIONS,
+            n_probes: int = setting.RECOMMENDATION_IVF_PROBES, iterations: int = 10,
+            sample_per_list: int = 256, seed: int = 0) -> "IVFIndex":
+    """Cluster the books of a ratings matrix, n_lists=0 picks about sqrt(n_books) lists."""
+    matrix = csr_matrix(matrix, dtype=np.float32)
+    rng = np.random.default_rng(seed)
+    n_items = matrix.shape[0]
+    n_lists = min(n_items, n_lists or max(1, round(math.sqrt(n_items))))
+    norms = get_row_norms(matrix)
+    normalized = diags(np.divide(1, norms, out=np.zeros_like(norms), where=norms > 0)) @ matrix
+    projection = get_singular_basis(csr_matrix(normalized), dimensions, rng)
+    embeddings = normalize_dense(np.asarray(normalized @ projection, dtype=np.float32))
+    # Centroids are trained on a sample, every book is then assigned to its closest one.
+    sample = rng.choice(n_items, min(n_items, n_lists * sample_per_list), replace=False)
+    centroids = spherical_kmeans(embeddings[sample], n_lists, iterations, rng)
+    assignment = np.argmax(embeddings @ centroids.T, axis=1)
+    list_items = np.argsort(assignment, kind="stable").astype(np.int32)
+    list_offsets = np.searchsorted(assignment[list_items], np.arange(n_lists + 1))
+    return cls(matrix, projection, embeddings, centroids, list_offsets, list_items, norms=norms,
+               n_probes=n_probes)
+
+  def params(self) -> dict[str, Any]:
+    return {"n_lists": len(self.centroids), "dimensions": self.projection.shape[1]}
+
+  def arrays(self) -> dict[str, np.ndarray]:
+    return {"projection": self.projection, "embeddings": self.embeddings,
+            "centroids": self.centroids, "list_offsets": self.list_offsets,
+            "list_items": self.list_items}
+
+  def search(self, queries: Any, k: int,
+             exclude: np.ndarray | None = None) -> tuple[np.ndarray, np.ndarray]:
+    queries = csr_matrix(queries, dtype=np.float32)
+    query_norms = get_row_norms(queries)
+    n_probes = min(self.n_probes, len(self.centroids))
+    embedded = self.embed(queries)
+    probes = np.argpartition(-(embedded @ self.centroids.T), n_probes - 1, axis=1)[:, :n_probes]
+    indices = np.full((queries.shape[0], k), -1, dtype=np.int32)
+    scores = np.zeros((queries.shape[0], k), dtype=np.float32)
+    for query, lists in enumerate(probes):
+      rows = np.concatenate([self.list_items[self.list_offsets[lst]:self.list_offsets[lst + 1]]
+                             for lst in lists])
+      if exclude is not None:
+        rows = rows[rows != exclude[query]]
+      # Probed lists holding only the excluded book leave the query without neighbours.
+      if not len(rows):
+        continue
+      if len(rows) > self.n_rerank:
+        closeness = self.embeddings[rows] @ embedded[query]
+        rows = rows[np.argpartition(-closeness, self.n_rerank - 1)[:self.n_rerank]]
+      similarities = self.score(queries, query_norms, rows, query)
+      found, found_scores = select_top_k(similarities[np.newaxis], k)
+      indices[query] = np.where(found[0] >= 0, rows[found[0]], -1)
+      scores[query] = found_scores[0]
+    return indices, scores
+
+
+INDEX_TYPES: dict[str, type[NeighbourIndex]] = {
+    "brute": BruteForceIndex,
+    "ivf": IVFIndex,
+}
+
+
+def build_index(name: str, matrix: Any, **params: Any) -> NeighbourIndex:
+  """Build an index of a type from INDEX_TYPES over a ratings matrix."""
+  if name not in INDEX_TYPES:
+    raise ValueError(f"Unknown neighbour index {name}, expected one of {sorted(INDEX_TYPES)}")
+  if name == "brute":
+    return BruteForceIndex(csr_matrix(matrix, dtype=np.float32), **params)
+  return INDEX_TYPES[name].build(matrix, **params)
+
+
+def load_index(directory: str, matrix: csr_matrix,
+               norms: np.ndarray | None = None) -> NeighbourIndex:
+  """Memory-map the index saved in a version directory, brute force when there is none."""
+  index_path = os.path.join(directory, INDEX_FILE)
+  if not os.path.exists(index_path):
+    return BruteForceIndex(matrix, norms)
+  with open(index_path, encoding="utf-8") as index_file:
+    index_data = json.load(index_file)
+  arrays = {name: np.load(os.path.join(directory, f"index_{name}.npy"), mmap_mode="r")
+            for name in index_data["arrays"]}
+  return INDEX_TYPES[index_data["type"]](matrix, norms=norms, **arrays)
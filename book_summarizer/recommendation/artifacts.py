@@ -0,0 +1,336 @@
+"""Versioned recommendation artifacts stored as NumPy arrays that workers memory-map.
+
+A version is a directory of one .npy file per array. The CURRENT file of the artifact root
+names the published version and is replaced atomically, so readers see either the old or
+the new version, never a partly written one.
+"""
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any, Iterable
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from book_summarizer.config.config import setting
+from book_summarizer.recommendation.ann import build_index
+from book_summarizer.recommendation.ann import get_row_norms
+from book_summarizer.recommendation.ann import load_index
+from book_summarizer.recommendation.ann import NeighbourIndex
+from book_summarizer.recommendation.neighbours import compute_neighbour_table
+from book_summarizer.recommendation.user_scoring import get_similarity_matrix
+from book_summarizer.recommendation.user_scoring import score_users
+from book_summarizer.utils.exception_utils import ArtifactsUnavailableError
+from book_summarizer.utils.exception_utils import UnknownUserError
+
+logger = logging.getLogger(__name__)
+
+CURRENT_FILE = "CURRENT"
+MANIFEST_FILE = "manifest.json"
+
+
+def new_version() -> str:
+  """Version name that sorts by publication time."""
+  return f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:6]}"
+
+
+def get_current_version(root: str) -> str | None:
+  """Published version of an artifact root, None when nothing was published."""
+  try:
+    with open(os.path.join(root, CURRENT_FILE), encoding="utf-8") as current:
+      return current.read().strip() or None
+  except FileNotFoundError:
+    return None
+
+
+def write_array(directory: str, name: str, array: np.ndarray) -> None:
+  """Store one array of a version."""
+  np.save(os.path.join(directory, f"{name}.npy"), np.ascontiguousarray(array), allow_pickle=False)
+
+
+def publish_version(root: str, version: str) -> None:
+  """Point CURRENT to a version in one atomic rename."""
+  tmp_path = os.path.join(root, f".{CURRENT_FILE}.{uuid.uuid4().hex}")
+  with open(tmp_path, "w", encoding="utf-8") as current:
+    current.write(version)
+  os.replace(tmp_path, os.path.join(root, CURRENT_FILE))
+
+
+def prune_versions(root: str, keep: int) -> list[str]:
+  """Remove all but the `keep` newest versions, never the published one."""
+  current = get_current_version(root)
+  manifests = {name: os.path.join(root, name, MANIFEST_FILE) for name in os.listdir(root)}
+  versions = sorted((name for name, path in manifests.items() if os.path.isfile(path)),
+                    key=lambda name: os.path.getmtime(manifests[name]))
+  removed = [version for version in versions[:-keep] if version != current] if keep > 0 else []
+  for version in removed:
+    # Workers still mapping the removed files keep them readable until they switch.
+    shutil.rmtree(os.path.join(root, version), ignore_errors=True)
+  return removed
+
+
+def save_artifacts(root: str, matrix: Any, titles: Iterable[str], user_ids: Iterable[int],
+                   neighbours: tuple[np.ndarray, np.ndarray] | None = None,
+                   index: NeighbourIndex | None = None, version: str | None = None,
+                   keep_versions: int = 3) -> str:
+  """Write a new version of the artifacts and publish it, returns the version.
+
+  `matrix` holds the ratings of each title (rows) by each user (columns), `neighbours` the
+  neighbour rows and similarities from compute_neighbour_table and `index` the neighbour
+  index for books beyond the table, see ann.py.
+  """
+  matrix = csr_matrix(matrix, dtype=np.float32)
+  matrix.sort_indices()
+  titles = np.asarray(list(titles), dtype=str)
+  user_ids = np.asarray(list(user_ids), dtype=np.int64)
+  if matrix.shape != (len(titles), len(user_ids)):
+    raise ValueError(f"Matrix of shape {matrix.shape} does not match {len(titles)} titles "
+                     f"and {len(user_ids)} users")
+
+  version = version or new_version()
+  os.makedirs(root, exist_ok=True)
+  tmp_dir = os.path.join(root, f".{version}.tmp")
+  shutil.rmtree(tmp_dir, ignore_errors=True)
+  os.makedirs(tmp_dir)
+  # Matching index dtypes let scipy use the mapped arrays without converting them.
+  index_dtype = np.int32 if matrix.nnz < 2**31 else np.int64
+  # The ratings matrix has one row per book and one column per user.
+  arrays = {"data": matrix.data, "indices": matrix.indices.astype(index_dtype),
+            "indptr": matrix.indptr.astype(index_dtype), "titles": titles, "user_ids": user_ids}
+  # The same ratings with one row per user, to read the books each user rated.
+  user_ratings = matrix.T.tocsr()
+  user_ratings.sort_indices()
+  arrays.update({"user_data": user_ratings.data,
+                 "user_indices": user_ratings.indices.astype(index_dtype),
+                 "user_indptr": user_ratings.indptr.astype(index_dtype)})
+  if neighbours is not None:
+    # Precomputed most similar books of every book, see neighbours.py.
+    arrays["neighbour_indices"] = np.asarray(neighbours[0], dtype=np.int32)
+    arrays["neighbour_scores"] = np.asarray(neighbours[1], dtype=np.float32)
+  for name, array in arrays.items():
+    write_array(tmp_dir, name, array)
+  if index is not None:
+    index.save(tmp_dir)
+  with open(os.path.join(tmp_dir, MANIFEST_FILE), "w", encoding="utf-8") as manifest:
+    json.dump({"version": version, "shape": list(matrix.shape), "nnz": int(matrix.nnz),
+               "arrays": sorted(arrays), "created_at": time.time()}, manifest)
+  os.replace(tmp_dir, os.path.join(root, version))
+  publish_version(root, version)
+  prune_versions(root, keep_versions)
+  return version
+
+
+def publish_ratings(root: str, matrix: Any, titles: Iterable[str], user_ids: Iterable[int],
+                    index_name: str = setting.RECOMMENDATION_INDEX,
+                    k: int = setting.RECOMMENDATION_NEIGHBOURS,
+                    workers: int = setting.RECOMMENDATION_WORKERS) -> str:
+  """Build the neighbour index and table of a ratings matrix and publish them as artifacts."""
+  index = build_index(index_name, matrix)
+  # The exact table is computed block by block, faster than querying the brute force index.
+  neighbours = compute_neighbour_table(matrix, k=k, workers=workers,
+                                       index=index if index_name != "brute" else None)
+  return save_artifacts(root, matrix, titles, user_ids, neighbours=neighbours, index=index)
+
+
+@dataclass
+class RecommendationArtifacts:
+  """One loaded version: the ratings matrix over memory-mapped arrays and its indexes."""
+  version: str
+  directory: str
+  matrix: csr_matrix
+  titles: np.ndarray
+  user_ids: np.ndarray
+  norms: np.ndarray
+  index: NeighbourIndex
+  user_ratings: csr_matrix
+  # Positions of user_ids in ascending order, to find the rows of users.
+  user_order: np.ndarray
+  neighbour_indices: np.ndarray | None = None
+  neighbour_scores: np.ndarray | None = None
+  # The neighbour table as a sparse (n_items, n_items) matrix.
+  similarity: csr_matrix | None = None
+
+  @property
+  def n_items(self) -> int:
+    return self.matrix.shape[0]
+
+  def neighbours(self, item: int, count: int) -> tuple[np.ndarray, np.ndarray]:
+    """Cosine similarities and rows of the `count` books most similar to a book, best first.
+
+    A slice of the precomputed table when it has enough columns, otherwise a search of the
+    neighbour index. Books without any common reader are left out.
+    """
+    if not 0 <= item < self.n_items:
+      raise IndexError(f"Item {item} is not one of the {self.n_items} items")
+    if self.neighbour_indices is not None and count <= self.neighbour_indices.shape[1]:
+      nearest, scores = self.neighbour_indices[item, :count], self.neighbour_scores[item, :count]
+    else:
+      found, found_scores = self.index.search(self.matrix[item], max(count, 0),
+                                              exclude=np.array([item]))
+      nearest, scores = found[0], found_scores[0]
+    return scores[nearest >= 0], nearest[nearest >= 0]
+
+  def similar_titles(self, item: int, count: int = setting.RECOMMENDATION_COUNT) -> list[str]:
+    """The title of a book followed by the titles most similar to it, `count` in total."""
+    _, nearest = self.neighbours(item, count - 1)
+    return [str(title) for title in self.titles[np.concatenate(([item], nearest))]]
+
+  def get_user_rows(self, user_ids: Iterable[int]) -> np.ndarray:
+    """Row of each user in user_ratings, -1 for users without ratings."""
+    user_ids = np.asarray(list(user_ids), dtype=np.int64)
+    if len(self.user_ids) == 0:
+      return np.full(len(user_ids), -1)
+    positions = np.searchsorted(self.user_ids, user_ids, sorter=self.user_order)
+    rows = self.user_order[np.minimum(positions, len(self.user_ids) - 1)]
+    return np.where(self.user_ids[rows] == user_ids, rows, -1)
+
+  def recommend_for_users(
+      self, user_ids: Iterable[int],
+      count: int = setting.RECOMMENDATION_COUNT) -> tuple[np.ndarray, np.ndarray]:
+    """Rows and scores of the `count` best unrated books of each user, best first.
+
+    Returns arrays of shape (n_users, count) padded with -1, users without ratings get no
+    books. All users are scored with one sparse product against the similarity matrix.
+    """
+    if self.similarity is None:
+      raise FileNotFoundError(f"Recommendation artifacts {self.version} have no neighbour table")
+    rows = self.get_user_rows(user_ids)
+    known = np.flatnonzero(rows >= 0)
+    indices = np.full((len(rows), count), -1, dtype=np.int32)
+    scores = np.zeros((len(rows), count), dtype=np.float32)
+    if len(known) == 1:
+      # A slice avoids copying the ratings of a single user through fancy indexing.
+      ratings = self.user_ratings[rows[known[0]]:rows[known[0]] + 1]
+    else:
+      ratings = self.user_ratings[rows[known]]
+    indices[known], scores[known] = score_users(ratings, self.similarity, count)
+    return indices, scores
+
+  def recommend_titles(self, user_id: int, count: int = setting.RECOMMENDATION_COUNT) -> list[str]:
+    """Titles of the best unrated books of a user."""
+    if self.get_user_rows([user_id])[0] < 0:
+      raise UnknownUserError(f"User {user_id} has no ratings in {self.version}")
+    indices, _ = self.recommend_for_users([user_id], count)
+    return [str(title) for title in self.titles[indices[0][indices[0] >= 0]]]
+
+
+def load_artifacts(root: str, version: str | None = None) -> RecommendationArtifacts:
+  """Memory-map a version of the artifacts, the published one by default."""
+  version = version or get_current_version(root)
+  if version is None:
+    raise FileNotFoundError(f"No recommendation artifacts published in {root}")
+  directory = os.path.join(root, version)
+  with open(os.path.join(directory, MANIFEST_FILE), encoding="utf-8") as manifest:
+    manifest_data = json.load(manifest)
+  shape = tuple(manifest_data["shape"])
+  arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+            for name in manifest_data["arrays"]}
+  # scipy keeps the mapped arrays as they are when dtypes already match, so nothing is copied.
+  matrix = csr_matrix((arrays["data"], arrays["indices"], arrays["indptr"]), shape=shape,
+                      copy=False)
+  titles = arrays["titles"]
+  norms = get_row_norms(matrix)
+  if "user_indptr" in arrays:
+    user_ratings = csr_matrix((arrays["user_data"], arrays["user_indices"], arrays["user_indptr"]),
+                              shape=shape[::-1], copy=False)
+  else:
+    user_ratings = matrix.T.tocsr()
+  neighbour_indices = arrays.get("neighbour_indices")
+  neighbour_scores = arrays.get("neighbour_scores")
+  return RecommendationArtifacts(
+      version=version,
+      directory=directory,
+      matrix=matrix,
+      titles=titles,
+      user_ids=arrays["user_ids"],
+      norms=norms,
+      index=load_index(directory, matrix, norms),
+      user_ratings=user_ratings,
+      user_order=np.argsort(arrays["user_ids"], kind="stable"),
+      neighbour_indices=neighbour_indices,
+      neighbour_scores=neighbour_scores,
+      similarity=get_similarity_matrix(neighbour_indices, neighbour_scores)
+      if neighbour_indices is not None else None)
+
+
+class ArtifactStore:
+  """Keeps the published artifacts of a root loaded and switches to new versions.
+
+  The published version is checked at most every `reload_seconds`, a new one is loaded by a
+  single thread and swapped in with one assignment while requests keep using the old one.
+  A version that fails to load is logged and retried after `reload_seconds`, the loaded one
+  keeps being served meanwhile.
+  """
+
+  def __init__(self, root: str = setting.RECOMMENDATION_ARTIFACTS_DIR,
+               reload_seconds: float = setting.RECOMMENDATION_RELOAD_SECONDS):
+    """Initializes the variables."""
+    self.root = root
+    self.reload_seconds = reload_seconds
+    self._artifacts: RecommendationArtifacts | None = None
+    self._checked_at = 0.0
+    self._lock = threading.Lock()
+    self.reloads = 0
+
+  def get(self) -> RecommendationArtifacts:
+    """Loaded artifacts of the published version.
+
+    Raises ArtifactsUnavailableError while no version has ever loaded.
+    """
+    artifacts = self._artifacts
+    if artifacts is not None and time.monotonic() - self._checked_at < self.reload_seconds:
+      return artifacts
+    with self._lock:
+      if self._artifacts is not None and time.monotonic() - self._checked_at < self.reload_seconds:
+        return self._artifacts
+      version = get_current_version(self.root)
+      if self._artifacts is None or (version is not None and version != self._artifacts.version):
+        start = time.perf_counter()
+        try:
+          artifacts = load_artifacts(self.root, version)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+          if self._artifacts is None:
+            raise ArtifactsUnavailableError(f"No recommendation artifacts loaded: {e}") from e
+          logger.error("Keeping recommendation artifacts %s, loading %s failed: %s",
+                       self._artifacts.version, version, e)
+        else:
+          self._artifacts = artifacts
+          self.reloads += 1
+          logger.info("Loaded recommendation artifacts %s in %.3fs", artifacts.version,
+                      time.perf_counter() - start)
+      self._checked_at = time.monotonic()
+      return self._artifacts
+
+  def stats(self) -> dict[str, Any]:
+    """Loaded version and number of loads."""
+    artifacts = self._artifacts
+    return {"version": artifacts.version if artifacts else None,
+            "items": artifacts.n_items if artifacts else 0, "reloads": self.reloads}
+
+
+artifact_store = ArtifactStore()
+
+
+def main() -> None:
+  """Publish the pickled pivot table of an older training run as artifacts."""
+  import argparse  # pylint: disable=import-outside-toplevel
+  import pickle  # pylint: disable=import-outside-toplevel
+  parser = argparse.ArgumentParser(description=main.__doc__)
+  parser.add_argument("--pivot",
+                      default="book_summarizer/recommendation/prediction/book_pivot.pickle")
+  parser.add_argument("--root", default=setting.RECOMMENDATION_ARTIFACTS_DIR)
+  args = parser.parse_args()
+
+  with open(args.pivot, "rb") as pivot_file:
+    book_pivot = pickle.load(pivot_file)
+  version = publish_ratings(args.root, book_pivot.values, book_pivot.index, book_pivot.columns)
+  print(f"Published {version} to {args.root}")
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,77 @@
+"""Benchmark recall@k and latency of the IVF neighbour index against brute force.
+
+Run with `python -m book_summarizer.recommendation.benchmark.bench_ann`, the ratings are
+synthetic: readers mostly rate books of their favourite genres.
+"""
+import argparse
+import time
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from book_summarizer.recommendation.ann import build_index
+
+
+def make_ratings(n_items: int, n_users: int, genres: int, ratings_per_user: int,
+                 seed: int = 0) -> csr_matrix:
+  """Sparse ratings of users who read 80% of their books from their favourite genre."""
+  rng = np.random.default_rng(seed)
+  item_genres = rng.integers(0, genres, n_items)
+  books_by_genre = [np.flatnonzero(item_genres == genre) for genre in range(genres)]
+  rows, cols = [], []
+  for user in range(n_users):
+    genre = rng.integers(0, genres)
+    favourite = rng.choice(books_by_genre[genre], int(ratings_per_user * 0.8))
+    others = rng.integers(0, n_items, ratings_per_user - len(favourite))
+    books = np.unique(np.concatenate([favourite, others]))
+    rows.append(books)
+    cols.append(np.full(len(books), user))
+  rows, cols = np.concatenate(rows), np.concatenate(cols)
+  data = rng.integers(1, 11, len(rows)).astype(np.float32)
+  return csr_matrix((data, (rows, cols)), shape=(n_items, n_users))
+
+
+def main() -> None:
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument("--items", type=int, default=50000)
+  parser.add_argument("--users", type=int, default=20000)
+  parser.add_argument("--genres", type=int, default=200)
+  parser.add_argument("--ratings-per-user", type=int, default=40)
+  parser.add_argument("--queries", type=int, default=200)
+  parser.add_argument("--k", type=int, default=10)
+  parser.add_argument("--lists", type=int, default=0)
+  parser.add_argument("--dimensions", type=int, default=64)
+  parser.add_argument("--probes", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+  parser.add_argument("--rerank", type=int, nargs="+", default=[256, 1024])
+  args = parser.parse_args()
+
+  ratings = make_ratings(args.items, args.users, args.genres, args.ratings_per_user)
+  queries = np.random.default_rng(1).choice(args.items, args.queries, replace=False)
+  print(f"{args.items} books x {args.users} users, {ratings.nnz} ratings")
+
+  brute = build_index("brute", ratings)
+  start = time.perf_counter()
+  exact, _ = brute.search(ratings[queries], args.k, exclude=queries)
+  brute_ms = (time.perf_counter() - start) * 1000 / args.queries
+  start = time.perf_counter()
+  ivf = build_index("ivf", ratings, n_lists=args.lists, dimensions=args.dimensions)
+  print(f"ivf index of {len(ivf.centroids)} lists built in {time.perf_counter() - start:.2f} s")
+
+  print(f"{'index':>6} {'probes':>6} {'rerank':>6} {f'recall@{args.k}':>10} {'ms/query':>9}"
+        f" {'speedup':>8}")
+  print(f"{'brute':>6} {'-':>6} {'-':>6} {1.0:>10.3f} {brute_ms:>9.3f} {1.0:>7.1f}x")
+  for probes in args.probes:
+    for rerank in args.rerank:
+      ivf.n_probes, ivf.n_rerank = probes, rerank
+      start = time.perf_counter()
+      found, _ = ivf.search(ratings[queries], args.k, exclude=queries)
+      ivf_ms = (time.perf_counter() - start) * 1000 / args.queries
+      # Only exact neighbours with a positive similarity count, as both indexes drop the others.
+      hits = [len(set(row[row >= 0]) & set(expected[expected >= 0])) / max(1, (expected >= 0).sum())
+              for row, expected in zip(found, exact)]
+      print(f"{'ivf':>6} {probes:>6} {rerank:>6} {np.mean(hits):>10.3f} {ivf_ms:>9.3f}"
+            f" {brute_ms / ivf_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,66 @@
+"""Benchmark reading the BX ratings for training from the CSVs against the columnar cache.
+
+Run with `python -m book_summarizer.recommendation.benchmark.bench_dataset_cache`, the CSVs
+are synthetic with the size of the BX dataset unless --books/--ratings are given.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from book_summarizer.ingestion.document_text import get_rss_bytes
+from book_summarizer.recommendation.dataset_cache import load_table
+from book_summarizer.recommendation.recommendation import read_books
+from book_summarizer.recommendation.recommendation import read_books_table
+from book_summarizer.recommendation.recommendation import read_ratings
+from book_summarizer.recommendation.recommendation import read_ratings_table
+
+
+def write_dataset(directory: str, n_books: int, n_ratings: int) -> None:
+  """BX-like books and ratings CSVs."""
+  rng = np.random.default_rng(0)
+  pd.DataFrame({"ISBN": [f"{book:010d}" for book in range(n_books)],
+                "Book-Title": [f"Title of book {book}" for book in range(n_books)],
+                "Book-Author": "Author", "Year-Of-Publication": 2002,
+                "Publisher": "Publisher"}).to_csv(os.path.join(directory, "BX-Books.csv"),
+                                                  sep=";", index=False, encoding="latin-1")
+  pd.DataFrame({"User-ID": rng.integers(0, 105283, n_ratings),
+                "ISBN": [f"{book:010d}" for book in rng.integers(0, n_books, n_ratings)],
+                "Book-Rating": rng.integers(0, 11, n_ratings)}).to_csv(
+                    os.path.join(directory, "BX-Book-Ratings.csv"), sep=";", index=False,
+                    encoding="latin-1")
+
+
+def main() -> None:
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument("--books", type=int, default=271379)
+  parser.add_argument("--ratings", type=int, default=1149780)
+  args = parser.parse_args()
+
+  with tempfile.TemporaryDirectory() as directory:
+    write_dataset(directory, args.books, args.ratings)
+    books_path = os.path.join(directory, "BX-Books.csv")
+    ratings_path = os.path.join(directory, "BX-Book-Ratings.csv")
+    cache = os.path.join(directory, "cache")
+    runs = {
+        "csv": lambda: read_ratings(ratings_path, *read_books(books_path)[:2]),
+        "cache build": lambda: read_ratings_table(
+            load_table(ratings_path, cache), *read_books_table(load_table(books_path, cache))[:2]),
+        "cache load": lambda: read_ratings_table(
+            load_table(ratings_path, cache), *read_books_table(load_table(books_path, cache))[:2]),
+    }
+    print(f"{'path':>12} {'seconds':>8} {'rss MB':>8}")
+    for name, run in runs.items():
+      rss_before = get_rss_bytes()
+      start = time.perf_counter()
+      result = run()
+      seconds = time.perf_counter() - start
+      print(f"{name:>12} {seconds:>8.2f} {(get_rss_bytes() - rss_before) / 2**20:>8.1f}")
+      del result
+
+
+if __name__ == "__main__":
+  main()
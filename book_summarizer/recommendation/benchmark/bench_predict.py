@@ -0,0 +1,100 @@
+"""Benchmark recommendation latency of pickles loaded per request against mapped artifacts,
+with neighbours computed per request or sliced from the precomputed table, and latency of
+recommendations for users one at a time and in batches.
+
+Run with `python -m book_summarizer.recommendation.benchmark.bench_predict`, the ratings are
+synthetic with the shape of the trained pivot table unless --items/--users are given.
+"""
+import argparse
+import os
+import pickle
+import statistics
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import random as sparse_random
+from sklearn.neighbors import NearestNeighbors
+
+from book_summarizer.recommendation.artifacts import ArtifactStore
+from book_summarizer.recommendation.artifacts import save_artifacts
+from book_summarizer.recommendation.neighbours import compute_neighbour_table
+
+
+def predict_from_pickles(directory: str, item: int) -> list:
+  """The previous per-request path: unpickle the model and pivot table, then query."""
+  with open(os.path.join(directory, "model_pickle"), "rb") as model_file:
+    model = pickle.load(model_file)
+  with open(os.path.join(directory, "book_pivot.pickle"), "rb") as pivot_file:
+    book_pivot = pickle.load(pivot_file)
+  _, suggestions = model.kneighbors(book_pivot.iloc[item, :].values.reshape(1, -1))
+  return list(book_pivot.index[suggestions[0]])
+
+
+def main() -> None:
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument("--items", type=int, default=742)
+  parser.add_argument("--users", type=int, default=888)
+  parser.add_argument("--density", type=float, default=0.023)
+  parser.add_argument("--requests", type=int, default=200)
+  parser.add_argument("--workers", type=int, default=1)
+  parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 64, 1024])
+  args = parser.parse_args()
+
+  ratings = sparse_random(args.items, args.users, density=args.density, format="csr",
+                          random_state=0)
+  ratings.data = np.ceil(ratings.data * 10)
+  titles = [f"Book {item}" for item in range(args.items)]
+  items = np.random.default_rng(0).integers(0, args.items, args.requests)
+
+  with tempfile.TemporaryDirectory() as directory:
+    book_pivot = pd.DataFrame(ratings.toarray(), index=titles, columns=range(args.users))
+    with open(os.path.join(directory, "model_pickle"), "wb") as model_file:
+      pickle.dump(NearestNeighbors(algorithm="brute").fit(ratings), model_file)
+    with open(os.path.join(directory, "book_pivot.pickle"), "wb") as pivot_file:
+      pickle.dump(book_pivot, pivot_file)
+    computed_root = os.path.join(directory, "computed")
+    save_artifacts(computed_root, ratings, titles, range(args.users))
+    computed = ArtifactStore(root=computed_root)
+    start = time.perf_counter()
+    neighbours = compute_neighbour_table(ratings, workers=args.workers)
+    table_s = time.perf_counter() - start
+    table_root = os.path.join(directory, "table")
+    save_artifacts(table_root, ratings, titles, range(args.users), neighbours=neighbours)
+    table = ArtifactStore(root=table_root)
+
+    start = time.perf_counter()
+    table.get()
+    load_ms = (time.perf_counter() - start) * 1000
+    computed.get()
+    runs = {"pickle": lambda item: predict_from_pickles(directory, int(item)),
+            "computed": lambda item: computed.get().similar_titles(int(item)),
+            "table": lambda item: table.get().similar_titles(int(item))}
+    print(f"neighbour table built in {table_s:.2f} s with {args.workers} workers,"
+          f" artifacts loaded in {load_ms:.2f} ms")
+    print(f"{'path':>10} {'p50 ms':>8} {'p99 ms':>8} {'req/s':>9}")
+    for name, run in runs.items():
+      latencies = []
+      for item in items:
+        start = time.perf_counter()
+        run(item)
+        latencies.append((time.perf_counter() - start) * 1000)
+      latencies.sort()
+      p99 = latencies[int(len(latencies) * 0.99) - 1]
+      print(f"{name:>10} {statistics.median(latencies):>8.3f} {p99:>8.3f}"
+            f" {1000 / statistics.mean(latencies):>9.0f}")
+
+    # Recommendations for users, one at a time and in batches.
+    artifacts = table.get()
+    users = np.random.default_rng(1).integers(0, args.users, max(args.batch_sizes))
+    print(f"{'users':>10} {'us/user':>8}")
+    for batch_size in args.batch_sizes:
+      start = time.perf_counter()
+      for batch in range(0, len(users), batch_size):
+        artifacts.recommend_for_users(users[batch:batch + batch_size])
+      print(f"{batch_size:>10} {(time.perf_counter() - start) * 1e6 / len(users):>8.1f}")
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,274 @@
+"""Columnar cache of the BX dataset CSVs, memory-mapped by training.
+
+Parsing the latin-1 CSVs is the slowest part of a retrain, so each CSV is converted once into
+a directory of typed .npy columns named after the hash of the CSV. A changed CSV hashes to a
+new directory and is converted again. Strings are dictionary encoded: int32 codes per row
+(-1 for missing) and the sorted distinct values as UTF-8 bytes with offsets. Rows missing a
+required value, with a value that does not parse or is out of range are left out and counted
+in the manifest.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any
+
+import numpy as np
+import pandas as pd
+
+from book_summarizer.config.config import setting
+from book_summarizer.recommendation.artifacts import MANIFEST_FILE
+from book_summarizer.recommendation.artifacts import write_array
+
+logger = logging.getLogger(__name__)
+
+# Bumped when the stored layout or the schemas change, so older caches are rebuilt.
+CACHE_FORMAT = 1
+CSV_OPTIONS = {"sep": ";", "encoding": "latin-1", "on_bad_lines": "skip",
+               "keep_default_na": False, "na_values": ["", "NULL"]}
+
+
+@dataclass(frozen=True)
+class Column:
+  """A column kept in the cache; numbers outside [minimum, maximum] are invalid."""
+  name: str
+  dtype: str
+  required: bool = False
+  minimum: float | None = None
+  maximum: float | None = None
+
+
+SCHEMAS: dict[str, list[Column]] = {
+    "BX-Books.csv": [
+        Column("ISBN", "str", required=True),
+        Column("Book-Title", "str", required=True),
+        Column("Book-Author", "str"),
+        Column("Year-Of-Publication", "int16", minimum=0, maximum=2100),
+        Column("Publisher", "str"),
+    ],
+    "BX-Users.csv": [
+        Column("User-ID", "int32", required=True, minimum=0),
+        Column("Location", "str"),
+        Column("Age", "float32", minimum=0, maximum=150),
+    ],
+    "BX-Book-Ratings.csv": [
+        Column("User-ID", "int32", required=True, minimum=0),
+        Column("ISBN", "str", required=True),
+        Column("Book-Rating", "uint8", required=True, minimum=0, maximum=10),
+    ],
+}
+
+
+def hash_file(path: str, block_size: int = 2**20) -> tuple[str, int]:
+  """SHA-256 of a file and its number of lines."""
+  digest = hashlib.sha256()
+  lines = 0
+  with open(path, "rb") as source:
+    while block := source.read(block_size):
+      digest.update(block)
+      lines += block.count(b"\n")
+  return digest.hexdigest(), lines
+
+
+def parse_numbers(values: pd.Series, column: Column) -> tuple[np.ndarray, np.ndarray]:
+  """Numbers of a column in its dtype and the mask of the invalid ones.
+
+  Missing optional values are not invalid, they become NaN or 0.
+  """
+  numbers = pd.to_numeric(values, errors="coerce").to_numpy(dtype=np.float64, copy=True)
+  missing = values.isna().to_numpy()
+  invalid = np.isnan(numbers) & ~missing
+  if column.minimum is not None:
+    invalid |= numbers < column.minimum
+  if column.maximum is not None:
+    invalid |= numbers > column.maximum
+  if np.issubdtype(np.dtype(column.dtype), np.integer):
+    invalid |= ~np.isnan(numbers) & (numbers != np.floor(numbers))
+  if column.required:
+    invalid |= missing
+  fill = np.nan if np.issubdtype(np.dtype(column.dtype), np.floating) else 0
+  numbers[invalid | np.isnan(numbers)] = fill
+  return numbers.astype(column.dtype), invalid
+
+
+class StringDictionary:
+  """Distinct strings of a column, coded in the order they are first seen."""
+
+  def __init__(self):
+    """Initializes the variables."""
+    self.codes: dict[str, int] = {}
+
+  def encode(self, values: pd.Series) -> np.ndarray:
+    """int32 codes of values, -1 for missing ones."""
+    local_codes, uniques = pd.factorize(values)
+    mapping = np.array([self.codes.setdefault(value, len(self.codes)) for value in uniques],
+                       dtype=np.int32)
+    return np.where(local_codes >= 0, mapping[np.maximum(local_codes, 0)], -1).astype(np.int32)
+
+  def sort(self, codes: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Codes renumbered to the sorted strings they use, and those strings.
+
+    Strings only seen in rows that were left out are dropped.
+    """
+    values = np.array(list(self.codes), dtype=object)
+    used = np.zeros(len(values), dtype=bool)
+    used[codes[codes >= 0]] = True
+    kept = np.flatnonzero(used)
+    kept = kept[np.argsort(values[kept], kind="stable")]
+    rank = np.full(len(values), -1, dtype=np.int32)
+    rank[kept] = np.arange(len(kept), dtype=np.int32)
+    return np.where(codes >= 0, rank[np.maximum(codes, 0)], -1).astype(np.int32), values[kept]
+
+
+def write_strings(directory: str, name: str, values: np.ndarray) -> None:
+  """Store distinct strings as UTF-8 bytes and the offset of each of them."""
+  encoded = [value.encode("utf-8") for value in values]
+  offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+  np.cumsum([len(value) for value in encoded], out=offsets[1:])
+  write_array(directory, f"{name}.offsets", offsets)
+  write_array(directory, f"{name}.bytes", np.frombuffer(b"".join(encoded), dtype=np.uint8))
+
+
+def build_table(path: str, directory: str, columns: list[Column], digest: str, lines: int,
+                chunk_rows: int = setting.RECOMMENDATION_CSV_CHUNK_ROWS) -> dict[str, Any]:
+  """Convert a CSV into a cache directory of columns, returns its manifest."""
+  parts: dict[str, list[np.ndarray]] = {column.name: [] for column in columns}
+  dictionaries = {column.name: StringDictionary() for column in columns if column.dtype == "str"}
+  invalid_counts = {column.name: 0 for column in columns}
+  rows = parsed = 0
+  # All columns are parsed, with usecols pandas would keep lines with too many fields.
+  for chunk in pd.read_csv(path, dtype=str, chunksize=chunk_rows, **CSV_OPTIONS):
+    parsed += len(chunk)
+    values, bad = {}, np.zeros(len(chunk), dtype=bool)
+    for column in columns:
+      if column.dtype == "str":
+        values[column.name] = dictionaries[column.name].encode(chunk[column.name])
+        invalid = values[column.name] < 0 if column.required else np.zeros(len(chunk), bool)
+      else:
+        values[column.name], invalid = parse_numbers(chunk[column.name], column)
+      invalid_counts[column.name] += int(invalid.sum())
+      # Rows with an invalid optional value are kept, the value is stored as missing.
+      if column.required:
+        bad |= invalid
+    for name, array in values.items():
+      parts[name].append(array[~bad])
+    rows += int((~bad).sum())
+
+  tmp_dir = f"{directory}.{uuid.uuid4().hex}.tmp"
+  os.makedirs(tmp_dir)
+  try:
+    for column in columns:
+      dtype = np.int32 if column.dtype == "str" else column.dtype
+      array = np.concatenate(parts[column.name]) if parts[column.name] else np.empty(0, dtype)
+      if column.dtype == "str":
+        array, distinct = dictionaries[column.name].sort(array)
+        write_strings(tmp_dir, column.name, distinct)
+        write_array(tmp_dir, f"{column.name}.codes", array)
+      else:
+        write_array(tmp_dir, column.name, array)
+    manifest = {
+        "source": os.path.basename(path),
+        "sha256": digest,
+        "format": CACHE_FORMAT,
+        "rows": rows,
+        "columns": {column.name: column.dtype for column in columns},
+        # Lines pandas could not split into the expected fields, and invalid values by column.
+        "malformed_lines": max(0, lines - 1 - parsed),
+        "invalid_values": invalid_counts,
+        "created_at": time.time(),
+    }
+    with open(os.path.join(tmp_dir, MANIFEST_FILE), "w", encoding="utf-8") as manifest_file:
+      json.dump(manifest, manifest_file)
+    os.replace(tmp_dir, directory)
+  except BaseException:
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    raise
+  return manifest
+
+
+@dataclass
+class ColumnTable:
+  """Cached columns of one CSV, each memory-mapped when it is first used."""
+  directory: str
+  manifest: dict[str, Any]
+
+  @property
+  def rows(self) -> int:
+    """Number of valid rows."""
+    return self.manifest["rows"]
+
+  def check_column(self, name: str, string: bool) -> None:
+    """Raise KeyError for a column that is not cached with the expected kind."""
+    dtype = self.manifest["columns"].get(name)
+    if dtype is None or (dtype == "str") != string:
+      raise KeyError(f"{self.manifest['source']} has no cached {'string' if string else 'number'}"
+                     f" column {name}")
+
+  def numbers(self, name: str) -> np.ndarray:
+    """Read-only memory-mapped numbers of a column."""
+    self.check_column(name, string=False)
+    return np.load(os.path.join(self.directory, f"{name}.npy"), mmap_mode="r")
+
+  def strings(self, name: str) -> tuple[np.ndarray, np.ndarray]:
+    """Memory-mapped int32 codes of a string column and its sorted distinct strings."""
+    self.check_column(name, string=True)
+    codes = np.load(os.path.join(self.directory, f"{name}.codes.npy"), mmap_mode="r")
+    offsets = np.load(os.path.join(self.directory, f"{name}.offsets.npy"))
+    buffer = np.load(os.path.join(self.directory, f"{name}.bytes.npy")).tobytes()
+    values = np.array([buffer[start:stop].decode("utf-8")
+                       for start, stop in zip(offsets[:-1], offsets[1:])], dtype=object)
+    return codes, values
+
+
+def remove_stale_tables(cache_dir: str, source: str, keep: str) -> None:
+  """Remove the cached tables of older versions of a CSV."""
+  prefix = f"{os.path.splitext(source)[0]}-"
+  for name in os.listdir(cache_dir):
+    if name.startswith(prefix) and name != keep and not name.endswith(".tmp"):
+      shutil.rmtree(os.path.join(cache_dir, name), ignore_errors=True)
+
+
+def load_table(path: str, cache_dir: str = setting.RECOMMENDATION_DATASET_CACHE_DIR,
+               chunk_rows: int = setting.RECOMMENDATION_CSV_CHUNK_ROWS) -> ColumnTable:
+  """Cached columns of a BX CSV, converting it first when it is not cached yet."""
+  source = os.path.basename(path)
+  if source not in SCHEMAS:
+    raise ValueError(f"No schema for {source}, expected one of {sorted(SCHEMAS)}")
+  digest, lines = hash_file(path)
+  name = f"{os.path.splitext(source)[0]}-v{CACHE_FORMAT}-{digest[:16]}"
+  directory = os.path.join(cache_dir, name)
+  manifest_path = os.path.join(directory, MANIFEST_FILE)
+  if not os.path.exists(manifest_path):
+    os.makedirs(cache_dir, exist_ok=True)
+    manifest = build_table(path, directory, SCHEMAS[source], digest, lines, chunk_rows)
+    remove_stale_tables(cache_dir, source, name)
+    if manifest["malformed_lines"] or any(manifest["invalid_values"].values()):
+      logger.warning(f"Cached {source} without {manifest['malformed_lines']} malformed lines,"
+                     f" invalid values by column: {manifest['invalid_values']}")
+    return ColumnTable(directory, manifest)
+  with open(manifest_path, encoding="utf-8") as manifest_file:
+    return ColumnTable(directory, json.load(manifest_file))
+
+
+def main() -> None:
+  """Convert the BX dataset CSVs into the columnar cache."""
+  parser = argparse.ArgumentParser(description=main.__doc__)
+  parser.add_argument("--dataset", default=setting.RECOMMENDATION_DATASET_DIR)
+  parser.add_argument("--cache", default=setting.RECOMMENDATION_DATASET_CACHE_DIR)
+  args = parser.parse_args()
+
+  for source in SCHEMAS:
+    start = time.perf_counter()
+    table = load_table(os.path.join(args.dataset, source), args.cache)
+    print(f"{source}: {table.rows} rows, {table.manifest['malformed_lines']} malformed lines,"
+          f" invalid values {table.manifest['invalid_values']}"
+          f" ({time.perf_counter() - start:.2f} s)")
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,133 @@
+"""Offline top-K cosine neighbour table of the books, computed block by block."""
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse import diags
+
+from book_summarizer.config.config import setting
+
+# Normalized ratings and approximate index of the pool process, memory-mapped once by its
+# initializer.
+_normalized: csr_matrix | None = None
+_index: Any = None
+
+
+def normalize_rows(matrix: Any) -> csr_matrix:
+  """Rows scaled to unit length, so their dot products are cosine similarities."""
+  matrix = csr_matrix(matrix, dtype=np.float32)
+  norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+  return (diags(np.divide(1, norms, out=np.zeros_like(norms), where=norms > 0)) @ matrix).tocsr()
+
+
+def select_top_k(similarities: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+  """Columns and values of the k largest positive similarities of each row, largest first.
+
+  Rows with fewer than k positive similarities are padded with -1 and a similarity of 0.
+  """
+  indices = np.full((similarities.shape[0], k), -1, dtype=np.int32)
+  scores = np.zeros((similarities.shape[0], k), dtype=np.float32)
+  found = min(k, similarities.shape[1])
+  if found == 0:
+    return indices, scores
+  nearest = np.argpartition(-similarities, found - 1, axis=1)[:, :found]
+  values = np.take_along_axis(similarities, nearest, axis=1)
+  order = np.argsort(-values, axis=1, kind="stable")
+  indices[:, :found] = np.take_along_axis(nearest, order, axis=1)
+  scores[:, :found] = np.take_along_axis(values, order, axis=1)
+  indices[scores <= 0] = -1
+  scores[scores <= 0] = 0
+  return indices, scores
+
+
+def top_k_block(normalized: csr_matrix, start: int, stop: int,
+                k: int) -> tuple[np.ndarray, np.ndarray]:
+  """Neighbour rows and cosine similarities of rows [start, stop), most similar first.
+
+  Only one dense block of (stop - start) x n_items similarities is held at a time.
+  """
+  similarities = (normalized[start:stop] @ normalized.T).toarray()
+  rows = np.arange(stop - start)
+  # A book is not its own neighbour.
+  similarities[rows, rows + start] = -np.inf
+  return select_top_k(similarities, k)
+
+
+def search_block(index: Any, matrix: csr_matrix, start: int, stop: int,
+                 k: int) -> tuple[np.ndarray, np.ndarray]:
+  """Neighbours of rows [start, stop) found by an approximate index, see ann.py."""
+  return index.search(matrix[start:stop], k, exclude=np.arange(start, stop))
+
+
+def save_for_workers(directory: str, normalized: csr_matrix, index: Any) -> None:
+  """Write the normalized ratings and the index for pool processes to memory-map."""
+  # artifacts.py and ann.py import this module.
+  from book_summarizer.recommendation.artifacts import write_array  # pylint: disable=import-outside-toplevel
+  for name in ("data", "indices", "indptr"):
+    write_array(directory, name, getattr(normalized, name))
+  if index is not None:
+    index.save(directory)
+
+
+def _init_worker(directory: str, shape: tuple[int, int], has_index: bool) -> None:
+  """Memory-map the normalized ratings and the index saved by save_for_workers."""
+  from book_summarizer.recommendation.ann import load_index  # pylint: disable=import-outside-toplevel
+  global _normalized, _index  # pylint: disable=global-statement
+  arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+            for name in ("data", "indices", "indptr")}
+  _normalized = csr_matrix((arrays["data"], arrays["indices"], arrays["indptr"]), shape=shape,
+                           copy=False)
+  # Cosine similarities are the same against the normalized ratings as against the raw ones.
+  _index = load_index(directory, _normalized) if has_index else None
+
+
+def _top_k_worker_block(start: int, stop: int, k: int) -> tuple[np.ndarray, np.ndarray]:
+  """Neighbours of a block of the ratings of the pool process."""
+  if _index is not None:
+    return search_block(_index, _normalized, start, stop, k)
+  return top_k_block(_normalized, start, stop, k)
+
+
+def compute_neighbour_table(
+    matrix: Any, k: int = setting.RECOMMENDATION_NEIGHBOURS,
+    block_size: int = setting.RECOMMENDATION_BLOCK_SIZE,
+    workers: int = setting.RECOMMENDATION_WORKERS,
+    index: Any = None) -> tuple[np.ndarray, np.ndarray]:
+  """Top-k cosine neighbours of every row of a ratings matrix.
+
+  Returns int32 neighbour rows and float32 similarities of shape (n_items, k). Blocks of
+  `block_size` rows are spread over `workers` processes, each holding one dense block.
+  With an approximate `index` built over the matrix, each block searches the index instead
+  of scoring every book.
+  """
+  normalized = normalize_rows(matrix)
+  n_items = normalized.shape[0]
+  k = max(0, min(k, n_items - 1))
+  indices = np.full((n_items, k), -1, dtype=np.int32)
+  scores = np.zeros((n_items, k), dtype=np.float32)
+  if k == 0:
+    return indices, scores
+  blocks = [(start, min(start + block_size, n_items)) for start in range(0, n_items, block_size)]
+  if workers <= 1 or len(blocks) <= 1:
+    results = (search_block(index, normalized, start, stop, k) if index is not None else
+               top_k_block(normalized, start, stop, k) for start, stop in blocks)
+    for (start, stop), (block_indices, block_scores) in zip(blocks, results):
+      indices[start:stop], scores[start:stop] = block_indices, block_scores
+    return indices, scores
+
+  # Spawned so workers do not inherit the memory of the training process. The ratings are
+  # written once and memory-mapped by every worker instead of pickled into each of them.
+  with tempfile.TemporaryDirectory(prefix="neighbours-") as directory:
+    save_for_workers(directory, normalized, index)
+    with ProcessPoolExecutor(max_workers=workers,
+                             mp_context=multiprocessing.get_context("spawn"),
+                             initializer=_init_worker,
+                             initargs=(directory, normalized.shape, index is not None)) as pool:
+      futures = [pool.submit(_top_k_worker_block, start, stop, k) for start, stop in blocks]
+      for (start, stop), future in zip(blocks, futures):
+        indices[start:stop], scores[start:stop] = future.result()
+  return indices, scores
@@ -1,21 +1,35 @@
 """Make prediction for book recommendation"""
-import pickle
+from typing import Any, Iterable, Iterator
 
-def predict(user_id: int) -> list:
+from book_summarizer.config.config import setting
+
+
+def get_artifact_store() -> Any:
+  """Artifact store of the worker, numpy and scipy are only imported once it is used."""
+  # pylint: disable-next=import-outside-toplevel
+  from book_summarizer.recommendation.artifacts import artifact_store
+  return artifact_store
+
+
+def predict(user_id: int, count: int = setting.RECOMMENDATION_COUNT) -> list:
   """Predict book recommendation for user"""
-  # load classifier using pickle 
-  my_model_clf = pickle.load(open("book_summarizer/recommendation/prediction/model_pickle", 'rb')) 
-
-  # load pivot table using 
-  pickle_data = open('book_summarizer/recommendation/prediction/book_pivot.pickle', 'rb') #rb stands for read bytes 
-  book_pivot = pickle.load(pickle_data)
-
-  output = []
-
-  # making prediction from loaded model
-  _, suggestions = my_model_clf.kneighbors(book_pivot.iloc[user_id, :].values.reshape(1, -1)) 
-  for i in range(len(suggestions)):
-    output.extend(book_pivot.index[suggestions[i]])
-    
-  pickle_data.close()
-  return output
+  # Artifacts are memory-mapped once per worker and reloaded when a new version is published.
+  return get_artifact_store().get().recommend_titles(user_id, count)
+
+
+def predict_batch(
+    user_ids: Iterable[int], count: int = setting.RECOMMENDATION_COUNT,
+    chunk_size: int = setting.RECOMMENDATION_BATCH_CHUNK_SIZE) -> Iterator[list[dict[str, Any]]]:
+  """Predict book recommendations for many users, yielding the results chunk by chunk.
+
+  Each chunk of users is scored with one sparse product. All chunks use the artifacts
+  loaded when the first one is scored, users without ratings get no recommendations.
+  """
+  user_ids = list(user_ids)
+  artifacts = get_artifact_store().get()
+  for start in range(0, len(user_ids), chunk_size):
+    chunk = user_ids[start:start + chunk_size]
+    indices, _ = artifacts.recommend_for_users(chunk, count)
+    yield [{"user_id": user_id,
+            "recommendations": [str(artifacts.titles[item]) for item in row if item >= 0]}
+           for user_id, row in zip(chunk, indices)]
@@ -1,77 +1,199 @@
-"""Training and predicting book recommendation"""
+"""Training book recommendation on the BX ratings CSVs.
+
+The CSVs are read in chunks with compact dtypes, books and users are encoded as integer
+codes and the (titles, users) ratings matrix is built straight from (title, user, rating)
+triples, so no dense titles x users table is ever held. By default the CSVs are read from
+their columnar cache, see dataset_cache.py. Run with
+`python -m book_summarizer.recommendation.recommendation`.
+"""
+import argparse
+import os
+import resource
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from dataclasses import field
+from typing import Iterator
 
 import numpy as np
 import pandas as pd
-import pickle
-
-import warnings
-warnings.filterwarnings("ignore")
-
-books = pd.read_csv("book_summarizer/recommendation/dataset/BX-Books.csv", sep=';', encoding="latin-1", on_bad_lines="skip")
-users = pd.read_csv("book_summarizer/recommendation/dataset/BX-Users.csv", sep=';', encoding="latin-1", on_bad_lines="skip")
-ratings = pd.read_csv("book_summarizer/recommendation/dataset/BX-Book-Ratings.csv", sep=';', encoding="latin-1", on_bad_lines="skip")
-
-print(books.head(3))
-
-books = books[['ISBN', 'Book-Title', 'Book-Author', 'Year-Of-Publication', 'Publisher']]
-books.rename(columns = {'Book-Title':'title', 'Book-Author':'author', 'Year-Of-Publication':'year', 'Publisher':'publisher'}, inplace=True)
-users.rename(columns = {'User-ID':'user_id', 'Location':'location', 'Age':'age'}, inplace=True)
-ratings.rename(columns = {'User-ID':'user_id', 'Book-Rating':'rating'}, inplace=True)
-
-x = ratings['user_id'].value_counts() > 200
-y = x[x].index  #user_ids
-print(y.shape)
-ratings = ratings[ratings['user_id'].isin(y)]
-
-rating_with_books = ratings.merge(books, on='ISBN')
-rating_with_books.head()
-
-number_rating = rating_with_books.groupby('title')['rating'].count().reset_index()
-number_rating.rename(columns= {'rating':'number_of_ratings'}, inplace=True)
-final_rating = rating_with_books.merge(number_rating, on='title')
-final_rating.shape
-final_rating = final_rating[final_rating['number_of_ratings'] >= 50]
-final_rating.drop_duplicates(['user_id','title'], inplace=True)
-
-
-book_pivot = final_rating.pivot_table(columns='user_id', index='title', values="rating")
-book_pivot.fillna(0, inplace=True)
-
 from scipy.sparse import csr_matrix
-book_sparse = csr_matrix(book_pivot)
-
-from sklearn.neighbors import NearestNeighbors
-model = NearestNeighbors(algorithm='brute')
-model.fit(book_sparse)
-
-distances, suggestions = model.kneighbors(book_pivot.iloc[250, :].values.reshape(1, -1))
-
-for i in range(len(suggestions)):
-  print(book_pivot.index[suggestions[i]])
-
-# dump the model
-pickle.dump(model, open("book_summarizer/recommendation/prediction/model_pickle", 'wb')) 
-# dump the pickle table
-save_data = open('book_summarizer/recommendation/prediction/book_pivot.pickle', 'wb')
-pickle.dump(book_pivot, save_data)
-save_data.close()
-  
-# load classifier using pickle 
-my_model_clf = pickle.load(open("book_summarizer/recommendation/prediction/model_pickle", 'rb')) 
-
-# load pivot table using 
-pickle_data = open('book_summarizer/recommendation/prediction/book_pivot.pickle', 'rb') #rb stands for read bytes 
-book_pivot = pickle.load(pickle_data)
-
-# making prediction from loaded model
-result_score, suggestions = my_model_clf.kneighbors(book_pivot.iloc[250, :].values.reshape(1, -1))
-output = []
-for i in range(len(suggestions)):
-  print(book_pivot.index[suggestions[i]])
-  output.extend(book_pivot.index[suggestions[i]])
-pickle_data.close()
-
-print(f"output is: {output}")
-
-  
 
+from book_summarizer.config.config import setting
+from book_summarizer.ingestion.document_text import get_rss_bytes
+from book_summarizer.recommendation.ann import INDEX_TYPES
+from book_summarizer.recommendation.artifacts import publish_ratings
+from book_summarizer.recommendation.dataset_cache import ColumnTable
+from book_summarizer.recommendation.dataset_cache import CSV_OPTIONS
+from book_summarizer.recommendation.dataset_cache import load_table
+
+BOOKS_FILE = "BX-Books.csv"
+RATINGS_FILE = "BX-Book-Ratings.csv"
+
+
+@dataclass
+class StageStats:
+  """Wall time and peak memory of one training stage."""
+  name: str
+  seconds: float = 0.0
+  peak_rss_bytes: int = 0
+
+  def sample(self) -> None:
+    """Sample memory, called between chunks of work."""
+    self.peak_rss_bytes = max(self.peak_rss_bytes, get_rss_bytes())
+
+
+@dataclass
+class TrainingStats:
+  """Wall time and peak memory of each training stage."""
+  stages: list[StageStats] = field(default_factory=list)
+
+  @contextmanager
+  def stage(self, name: str) -> Iterator[StageStats]:
+    """Time a stage, sampling memory at its start and end."""
+    stats = StageStats(name)
+    stats.sample()
+    self.stages.append(stats)
+    start = time.perf_counter()
+    try:
+      yield stats
+    finally:
+      stats.seconds = time.perf_counter() - start
+      stats.sample()
+
+  def report(self) -> str:
+    """Table of the stages and the peak memory of the process."""
+    lines = [f"{'stage':<16} {'seconds':>8} {'peak rss MB':>12}"]
+    lines += [f"{stage.name:<16} {stage.seconds:>8.2f} {stage.peak_rss_bytes / 2**20:>12.1f}"
+              for stage in self.stages]
+    # ru_maxrss is in KiB on Linux.
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**10
+    lines.append(f"{'total':<16} {sum(stage.seconds for stage in self.stages):>8.2f}"
+                 f" {peak_mb:>12.1f}")
+    return "\n".join(lines)
+
+
+def read_books(path: str, chunk_rows: int = setting.RECOMMENDATION_CSV_CHUNK_ROWS,
+               stats: StageStats | None = None) -> tuple[pd.Index, np.ndarray, np.ndarray]:
+  """ISBNs of the books, the int32 title code of each of them and the sorted titles.
+
+  Books without a title are left out, of repeated ISBNs the first one is kept.
+  """
+  chunks = []
+  for chunk in pd.read_csv(path, usecols=["ISBN", "Book-Title"], dtype=str, chunksize=chunk_rows,
+                           **CSV_OPTIONS):
+    chunks.append(chunk.dropna())
+    if stats is not None:
+      stats.sample()
+  books = pd.concat(chunks, ignore_index=True).drop_duplicates("ISBN")
+  titles = pd.Categorical(books["Book-Title"])
+  return (pd.Index(books["ISBN"]), titles.codes.astype(np.int32),
+          np.asarray(titles.categories, dtype=object))
+
+
+def read_ratings(path: str, isbns: pd.Index, title_codes: np.ndarray,
+                 chunk_rows: int = setting.RECOMMENDATION_CSV_CHUNK_ROWS,
+                 stats: StageStats | None = None) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+  """int32 user ids, int32 title codes and uint8 ratings of every rating.
+
+  Ratings of ISBNs missing from the books get a title code of -1.
+  """
+  users, titles, ratings = [], [], []
+  for chunk in pd.read_csv(path, usecols=["User-ID", "ISBN", "Book-Rating"],
+                           dtype={"User-ID": np.int32, "ISBN": str, "Book-Rating": np.uint8},
+                           chunksize=chunk_rows, **CSV_OPTIONS):
+    books = isbns.get_indexer(chunk["ISBN"])
+    users.append(chunk["User-ID"].to_numpy())
+    titles.append(np.where(books >= 0, title_codes[books], -1).astype(np.int32))
+    ratings.append(chunk["Book-Rating"].to_numpy())
+    if stats is not None:
+      stats.sample()
+  return np.concatenate(users), np.concatenate(titles), np.concatenate(ratings)
+
+
+def read_books_table(table: ColumnTable) -> tuple[pd.Index, np.ndarray, np.ndarray]:
+  """read_books from the cached columns of BX-Books.csv."""
+  isbn_codes, isbns = table.strings("ISBN")
+  title_codes, titles = table.strings("Book-Title")
+  _, first = np.unique(isbn_codes, return_index=True)
+  return pd.Index(isbns[isbn_codes[first]]), np.asarray(title_codes[first]), titles
+
+
+def read_ratings_table(table: ColumnTable, isbns: pd.Index,
+                       title_codes: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+  """read_ratings from the cached columns of BX-Book-Ratings.csv."""
+  isbn_codes, rating_isbns = table.strings("ISBN")
+  # Only the distinct ISBNs are looked up, each rating then takes the title of its ISBN.
+  books = isbns.get_indexer(rating_isbns)
+  isbn_titles = np.where(books >= 0, title_codes[books], -1).astype(np.int32)
+  return table.numbers("User-ID"), isbn_titles[isbn_codes], table.numbers("Book-Rating")
+
+
+def build_ratings_matrix(
+    user_ids: np.ndarray, title_codes: np.ndarray, ratings: np.ndarray, titles: np.ndarray,
+    min_user_ratings: int = setting.RECOMMENDATION_MIN_USER_RATINGS,
+    min_title_ratings: int = setting.RECOMMENDATION_MIN_RATINGS
+) -> tuple[csr_matrix, np.ndarray, np.ndarray]:
+  """Sparse (titles, users) float32 ratings with their sorted titles and user ids.
+
+  Users need min_user_ratings ratings in total and titles min_title_ratings ratings from
+  those users. A user rating a title more than once, e.g. two editions, keeps the first
+  rating. Ratings of 0 are not stored.
+  """
+  users, user_codes, user_counts = np.unique(user_ids, return_inverse=True, return_counts=True)
+  keep = (user_counts[user_codes] >= min_user_ratings) & (title_codes >= 0)
+  user_codes, title_codes, ratings = user_codes[keep], title_codes[keep], ratings[keep]
+  keep = np.bincount(title_codes, minlength=len(titles))[title_codes] >= min_title_ratings
+  user_codes, title_codes, ratings = user_codes[keep], title_codes[keep], ratings[keep]
+
+  _, first = np.unique(title_codes.astype(np.int64) * len(users) + user_codes, return_index=True)
+  kept_titles, rows = np.unique(title_codes[first], return_inverse=True)
+  kept_users, columns = np.unique(user_codes[first], return_inverse=True)
+  matrix = csr_matrix((ratings[first].astype(np.float32), (rows, columns)),
+                      shape=(len(kept_titles), len(kept_users)))
+  matrix.eliminate_zeros()
+  return matrix, titles[kept_titles], users[kept_users]
+
+
+def main() -> None:
+  """Train book recommendations on the BX ratings CSVs and publish them as artifacts."""
+  parser = argparse.ArgumentParser(description=main.__doc__)
+  parser.add_argument("--dataset", default=setting.RECOMMENDATION_DATASET_DIR)
+  parser.add_argument("--cache", default=setting.RECOMMENDATION_DATASET_CACHE_DIR)
+  parser.add_argument("--no-cache", action="store_true", help="parse the CSVs on every run")
+  parser.add_argument("--root", default=setting.RECOMMENDATION_ARTIFACTS_DIR)
+  parser.add_argument("--chunk-rows", type=int, default=setting.RECOMMENDATION_CSV_CHUNK_ROWS)
+  parser.add_argument("--min-user-ratings", type=int,
+                      default=setting.RECOMMENDATION_MIN_USER_RATINGS)
+  parser.add_argument("--min-title-ratings", type=int, default=setting.RECOMMENDATION_MIN_RATINGS)
+  parser.add_argument("--index", choices=sorted(INDEX_TYPES), default=setting.RECOMMENDATION_INDEX)
+  args = parser.parse_args()
+
+  training = TrainingStats()
+  books_path = os.path.join(args.dataset, BOOKS_FILE)
+  ratings_path = os.path.join(args.dataset, RATINGS_FILE)
+  with training.stage("read books") as stats:
+    if args.no_cache:
+      isbns, title_codes, titles = read_books(books_path, args.chunk_rows, stats)
+    else:
+      isbns, title_codes, titles = read_books_table(load_table(books_path, args.cache,
+                                                               args.chunk_rows))
+  with training.stage("read ratings") as stats:
+    if args.no_cache:
+      user_ids, rating_titles, ratings = read_ratings(ratings_path, isbns, title_codes,
+                                                      args.chunk_rows, stats)
+    else:
+      user_ids, rating_titles, ratings = read_ratings_table(
+          load_table(ratings_path, args.cache, args.chunk_rows), isbns, title_codes)
+  with training.stage("build matrix"):
+    matrix, titles, users = build_ratings_matrix(user_ids, rating_titles, ratings, titles,
+                                                 args.min_user_ratings, args.min_title_ratings)
+  with training.stage("publish"):
+    version = publish_ratings(args.root, matrix, titles, users, index_name=args.index)
+  print(f"Published {version} with {matrix.shape[0]} titles, {matrix.shape[1]} users and"
+        f" {matrix.nnz} ratings to {args.root}")
+  print(training.report())
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,65 @@
+"""Test cases for the neighbour indexes."""
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from book_summarizer.recommendation.ann import build_index
+from book_summarizer.recommendation.ann import IVFIndex
+from book_summarizer.recommendation.artifacts import load_artifacts
+from book_summarizer.recommendation.artifacts import save_artifacts
+from book_summarizer.recommendation.neighbours import compute_neighbour_table
+
+
+def make_genre_ratings(n_items: int = 300, n_users: int = 200, genres: int = 6, seed: int = 0):
+  """Ratings of users who mostly read the books of their favourite genre."""
+  rng = np.random.default_rng(seed)
+  item_genres = rng.integers(0, genres, n_items)
+  user_genres = rng.integers(0, genres, n_users)
+  chance = np.where(item_genres[:, None] == user_genres[None, :], 0.3, 0.01)
+  rated = rng.random((n_items, n_users)) < chance
+  return csr_matrix(rated * rng.integers(1, 11, (n_items, n_users)), dtype=np.float32)
+
+
+def test_ivf_probing_all_lists_is_exact():
+  """Searching every list returns the exact neighbours, fewer lists most of them."""
+  ratings = make_genre_ratings()
+  queries, exclude = ratings[:50], np.arange(50)
+  exact, exact_scores = build_index("brute", ratings).search(queries, 10, exclude=exclude)
+  expected, expected_scores = compute_neighbour_table(ratings, k=10, workers=1)
+  assert np.allclose(exact_scores, expected_scores[:50], atol=1e-5)
+
+  index = build_index("ivf", ratings, n_lists=16, dimensions=32, n_probes=16)
+  _, scores = index.search(queries, 10, exclude=exclude)
+  assert np.allclose(scores, exact_scores, atol=1e-5)
+
+  index.n_probes = 4
+  found, _ = index.search(queries, 10, exclude=exclude)
+  recall = np.mean([len(set(row) & set(exact_row)) / 10 for row, exact_row in zip(found, exact)])
+  assert recall > 0.6
+  assert not (found == np.arange(50)[:, None]).any()
+
+
+def test_ivf_query_without_candidates():
+  """A query whose probed lists hold only the excluded book gets no neighbours."""
+  ratings = np.eye(6, dtype=np.float32)
+  index = IVFIndex.build(ratings, n_lists=6, n_probes=1)
+  found, scores = index.search(ratings[0], 3, exclude=[0])
+
+  assert (found == -1).all()
+  assert (scores == 0).all()
+
+
+def test_index_is_saved_with_the_artifacts(tmp_path):
+  """A loaded IVF index answers like the one that was built."""
+  ratings = make_genre_ratings(seed=1)
+  index = IVFIndex.build(ratings, n_lists=8, dimensions=16, n_probes=3)
+  save_artifacts(str(tmp_path), ratings, [f"Book {item}" for item in range(300)], range(200),
+                 index=index)
+  artifacts = load_artifacts(str(tmp_path))
+
+  assert isinstance(artifacts.index, IVFIndex)
+  assert not artifacts.index.centroids.flags.writeable
+  artifacts.index.n_probes = 3
+  expected = index.search(ratings[[5]], 10, exclude=np.array([5]))
+  scores, nearest = artifacts.neighbours(5, 10)
+  assert np.array_equal(nearest, expected[0][0][expected[0][0] >= 0])
+  assert np.allclose(scores, expected[1][0][expected[0][0] >= 0])
@@ -0,0 +1,81 @@
+"""Test cases for memory-mapped recommendation artifacts."""
+import numpy as np
+import pytest
+from scipy.sparse import random as sparse_random
+from sklearn.neighbors import NearestNeighbors
+
+from book_summarizer.recommendation.artifacts import ArtifactStore
+from book_summarizer.recommendation.artifacts import get_current_version
+from book_summarizer.recommendation.artifacts import load_artifacts
+from book_summarizer.recommendation.artifacts import save_artifacts
+from book_summarizer.recommendation.neighbours import compute_neighbour_table
+from book_summarizer.utils.exception_utils import ArtifactsUnavailableError
+
+
+def make_ratings(n_items: int = 60, n_users: int = 40, seed: int = 0):
+  """Sparse integer ratings from 1 to 10."""
+  ratings = sparse_random(n_items, n_users, density=0.2, format="csr", random_state=seed)
+  ratings.data = np.ceil(ratings.data * 10)
+  return ratings
+
+
+def test_neighbours_match_cosine_nearest_neighbors(tmp_path):
+  """Table lookups and computed neighbours match a brute force cosine model."""
+  ratings = make_ratings()
+  titles = [f"Book {item}" for item in range(ratings.shape[0])]
+  save_artifacts(str(tmp_path / "table"), ratings, titles, range(100, 140),
+                 neighbours=compute_neighbour_table(ratings, k=10, block_size=16, workers=1))
+  save_artifacts(str(tmp_path / "computed"), ratings, titles, range(100, 140))
+  with_table = load_artifacts(str(tmp_path / "table"))
+  computed = load_artifacts(str(tmp_path / "computed"))
+
+  # Read-only arrays are the mapped files themselves, not copies.
+  assert not with_table.matrix.data.flags.writeable
+  model = NearestNeighbors(algorithm="brute", metric="cosine").fit(ratings)
+  for item in (0, 7, 59):
+    distances, _ = model.kneighbors(ratings[item], n_neighbors=6)
+    for artifacts in (with_table, computed):
+      scores, nearest = artifacts.neighbours(item, 5)
+      assert np.allclose(scores, 1 - distances[0, 1:], atol=1e-5)
+      assert item not in nearest
+    assert with_table.similar_titles(item)[0] == f"Book {item}"
+  with pytest.raises(IndexError):
+    with_table.neighbours(60, 5)
+
+
+def test_store_switches_to_published_version(tmp_path):
+  """A worker keeps its artifacts until a new version is published."""
+  root = str(tmp_path)
+  store = ArtifactStore(root=root, reload_seconds=0)
+  with pytest.raises(ArtifactsUnavailableError):
+    store.get()
+
+  first = save_artifacts(root, make_ratings(seed=1), [f"a{item}" for item in range(60)], range(40))
+  assert store.get().version == first
+  assert store.get() is store.get()
+
+  second = save_artifacts(root, make_ratings(seed=2), [f"b{item}" for item in range(60)],
+                          range(40), keep_versions=1)
+  assert get_current_version(root) == second
+  assert store.get().similar_titles(3)[0] == "b3"
+  assert store.reloads == 2
+  assert not (tmp_path / first).exists()
+
+
+def test_store_keeps_serving_when_a_version_fails_to_load(tmp_path):
+  """A broken new version is retried later, the loaded one is served meanwhile."""
+  root = str(tmp_path)
+  store = ArtifactStore(root=root, reload_seconds=0)
+  first = save_artifacts(root, make_ratings(seed=1), [f"a{item}" for item in range(60)], range(40))
+  assert store.get().version == first
+
+  second = save_artifacts(root, make_ratings(seed=2), [f"b{item}" for item in range(60)],
+                          range(40))
+  manifest = tmp_path / second / "manifest.json"
+  manifest_text = manifest.read_text(encoding="utf-8")
+  manifest.write_text("{", encoding="utf-8")
+  assert store.get().version == first
+
+  manifest.write_text(manifest_text, encoding="utf-8")
+  assert store.get().version == second
+  assert store.reloads == 2
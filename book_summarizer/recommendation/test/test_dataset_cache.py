@@ -0,0 +1,57 @@
+"""Test cases for the columnar cache of the BX dataset."""
+import os
+
+import numpy as np
+import pytest
+
+from book_summarizer.recommendation.dataset_cache import load_table
+
+RATINGS = '''"User-ID";"ISBN";"Book-Rating"
+"276725";"034545104X";"0"
+"276726";"0155061224";"5"
+"x";"0446520802";"3"
+"276727";"0446520802";"11"
+"276729";"052165615X";"3";"extra"
+"276729";"";"6"
+"276733";"034545104X";"10"
+'''
+
+
+def write_ratings(directory, text: str = RATINGS) -> str:
+  """Ratings CSV in the BX format."""
+  path = os.path.join(directory, "BX-Book-Ratings.csv")
+  with open(path, "w", encoding="latin-1") as ratings_file:
+    ratings_file.write(text)
+  return path
+
+
+def test_bad_rows_are_left_out_and_counted(tmp_path):
+  """Only valid rows are cached, malformed lines and invalid values are reported."""
+  table = load_table(write_ratings(tmp_path), str(tmp_path / "cache"))
+
+  assert table.rows == 3
+  assert table.numbers("User-ID").tolist() == [276725, 276726, 276733]
+  assert table.numbers("Book-Rating").dtype == np.uint8
+  assert table.numbers("Book-Rating").tolist() == [0, 5, 10]
+  codes, isbns = table.strings("ISBN")
+  assert isbns.tolist() == ["0155061224", "034545104X"]
+  assert isbns[codes].tolist() == ["034545104X", "0155061224", "034545104X"]
+  assert table.manifest["malformed_lines"] == 1
+  assert table.manifest["invalid_values"] == {"User-ID": 1, "ISBN": 1, "Book-Rating": 1}
+  assert not table.numbers("User-ID").flags.writeable
+  with pytest.raises(KeyError):
+    table.numbers("ISBN")
+
+
+def test_cache_is_keyed_on_the_source_hash(tmp_path):
+  """An unchanged CSV reuses its cache, a changed one is converted again."""
+  path, cache = write_ratings(tmp_path), str(tmp_path / "cache")
+  first = load_table(path, cache)
+  assert load_table(path, cache).manifest["created_at"] == first.manifest["created_at"]
+
+  write_ratings(tmp_path, RATINGS + '"276734";"0155061224";"7"\n')
+  changed = load_table(path, cache)
+
+  assert changed.directory != first.directory
+  assert changed.rows == first.rows + 1
+  assert os.listdir(cache) == [os.path.basename(changed.directory)]
@@ -0,0 +1,41 @@
+"""Test cases for the precomputed neighbour table."""
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from book_summarizer.recommendation.ann import build_index
+from book_summarizer.recommendation.neighbours import compute_neighbour_table
+
+
+def test_blocks_and_workers_give_the_same_table():
+  """The table does not depend on how rows are split into blocks and processes."""
+  rng = np.random.default_rng(0)
+  ratings = csr_matrix(rng.integers(0, 11, (50, 30)) * (rng.random((50, 30)) < 0.2))
+  expected = compute_neighbour_table(ratings, k=8, block_size=50, workers=1)
+
+  for block_size, workers in ((7, 1), (16, 2)):
+    indices, scores = compute_neighbour_table(ratings, k=8, block_size=block_size,
+                                              workers=workers)
+    assert indices.dtype == np.int32 and scores.dtype == np.float32
+    assert np.allclose(scores, expected[1])
+    assert np.array_equal(indices >= 0, expected[0] >= 0)
+
+
+def test_workers_search_the_saved_index():
+  """Pool processes memory-map the index and find the same neighbours as the main process."""
+  rng = np.random.default_rng(0)
+  ratings = csr_matrix(rng.integers(0, 11, (50, 30)) * (rng.random((50, 30)) < 0.2))
+  index = build_index("ivf", ratings)
+  expected = compute_neighbour_table(ratings, k=8, block_size=16, workers=1, index=index)
+  indices, scores = compute_neighbour_table(ratings, k=8, block_size=16, workers=2, index=index)
+
+  assert np.allclose(scores, expected[1], atol=1e-5)
+  assert np.array_equal(indices >= 0, expected[0] >= 0)
+
+
+def test_books_without_common_readers_are_padded():
+  """Missing neighbours are -1 with a similarity of 0."""
+  ratings = csr_matrix(np.array([[5, 0, 0], [4, 0, 0], [0, 3, 0], [0, 0, 0]]))
+  indices, scores = compute_neighbour_table(ratings, k=2, workers=1)
+
+  assert indices.tolist() == [[1, -1], [0, -1], [-1, -1], [-1, -1]]
+  assert np.allclose(scores, [[1, 0], [1, 0], [0, 0], [0, 0]])
@@ -0,0 +1,53 @@
+"""Test cases for training recommendations on the reviews table."""
+import numpy as np
+
+from book_summarizer.recommendation.train_reviews import RatingsMatrixBuilder
+
+# (user_id, book_id, rating) in review id order.
+REVIEWS = [("1", 10, 4), ("2", 10, 5), ("user", 11, 3), ("1", 12, 2), ("3", 12, 5),
+           ("1", 10, 1), ("2", 12, 0), ("3", 11, 4), ("2.5", 10, 3), ("3", 10, 2)]
+
+
+def build(compact_rows: int, batch_size: int, **filters):
+  """Matrix built from REVIEWS fed in batches."""
+  builder = RatingsMatrixBuilder(compact_rows)
+  for start in range(0, len(REVIEWS), batch_size):
+    builder.add(*zip(*REVIEWS[start:start + batch_size]))
+  return builder, builder.build(**filters)
+
+
+def test_later_reviews_replace_earlier_ones():
+  """The latest rating of a book by a user is kept, whenever the buffer was merged."""
+  expected = np.array([[1, 5, 2], [0, 0, 4], [2, 0, 5]], dtype=np.float32)
+  for compact_rows, batch_size in [(100, 100), (1, 1), (3, 2), (4, 3)]:
+    builder, (matrix, book_ids, user_ids) = build(compact_rows, batch_size, min_title_ratings=1)
+
+    assert book_ids.tolist() == [10, 11, 12]
+    assert user_ids.tolist() == [1, 2, 3]
+    assert matrix.dtype == np.float32
+    assert np.array_equal(matrix.toarray(), expected)
+    assert builder.reviews == len(REVIEWS)
+    assert builder.skipped == 2
+
+
+def test_rarely_rated_books_and_users_are_left_out():
+  """Users and books below the minimum number of ratings are not in the matrix."""
+  _, (matrix, book_ids, user_ids) = build(3, 2, min_user_ratings=2, min_title_ratings=2)
+
+  assert user_ids.tolist() == [1, 3]
+  assert book_ids.tolist() == [10, 12]
+  assert np.array_equal(matrix.toarray(), [[1, 2], [2, 5]])
+
+
+def test_user_ids_must_be_plain_integers():
+  """Ids beyond float precision are kept exactly, other numbers are skipped."""
+  builder = RatingsMatrixBuilder()
+  builder.add(["9007199254740993", "1e3", " 7", "-1", None, "0012", "2.0"], [10] * 7,
+              [1, 2, 3, 4, 5, 6, 7])
+  matrix, book_ids, user_ids = builder.build(min_title_ratings=1)
+
+  assert user_ids.tolist() == [12, 9007199254740993]
+  assert builder.skipped == 5
+  # Columns are dense codes, not the ids themselves.
+  assert builder.matrix.shape == (1, 2)
+  assert np.array_equal(matrix.toarray(), [[6, 1]])
@@ -0,0 +1,71 @@
+"""Test cases for training recommendations on the BX CSVs."""
+import numpy as np
+import pandas as pd
+
+from book_summarizer.recommendation.dataset_cache import load_table
+from book_summarizer.recommendation.recommendation import build_ratings_matrix
+from book_summarizer.recommendation.recommendation import read_books
+from book_summarizer.recommendation.recommendation import read_books_table
+from book_summarizer.recommendation.recommendation import read_ratings
+from book_summarizer.recommendation.recommendation import read_ratings_table
+from book_summarizer.recommendation.recommendation import TrainingStats
+
+
+def write_dataset(directory, n_books: int = 40, n_ratings: int = 3000, seed: int = 0):
+  """Small BX-like CSVs with repeated titles, unknown ISBNs and repeated ratings."""
+  rng = np.random.default_rng(seed)
+  books = pd.DataFrame({"ISBN": [f"isbn{book}" for book in range(n_books)],
+                        "Book-Title": [f"Title {book % 25}" for book in range(n_books)],
+                        "Book-Author": "Author", "Year-Of-Publication": 2002,
+                        "Publisher": "Publisher"})
+  books.to_csv(directory / "BX-Books.csv", sep=";", index=False, encoding="latin-1")
+  isbns = [f"isbn{book}" for book in rng.integers(0, n_books + 5, n_ratings)]
+  ratings = pd.DataFrame({"User-ID": rng.integers(0, 60, n_ratings) * 7, "ISBN": isbns,
+                          "Book-Rating": rng.integers(0, 11, n_ratings)})
+  ratings.to_csv(directory / "BX-Book-Ratings.csv", sep=";", index=False, encoding="latin-1")
+  return books, ratings
+
+
+def test_matrix_matches_dense_pivot(tmp_path):
+  """Chunked reading and sparse building equal the previous pivot table of the ratings."""
+  books, ratings = write_dataset(tmp_path)
+  stats = TrainingStats()
+  with stats.stage("read") as stage:
+    isbns, title_codes, titles = read_books(str(tmp_path / "BX-Books.csv"), 7, stage)
+    user_ids, rating_titles, values = read_ratings(str(tmp_path / "BX-Book-Ratings.csv"), isbns,
+                                                   title_codes, 500, stage)
+  matrix, titles, users = build_ratings_matrix(user_ids, rating_titles, values, titles,
+                                               min_user_ratings=51, min_title_ratings=20)
+
+  books = books.rename(columns={"Book-Title": "title"})
+  ratings = ratings.rename(columns={"User-ID": "user_id", "Book-Rating": "rating"})
+  counts = ratings["user_id"].value_counts() > 50
+  ratings = ratings[ratings["user_id"].isin(counts[counts].index)].merge(books, on="ISBN")
+  ratings = ratings[ratings.groupby("title")["rating"].transform("count") >= 20]
+  pivot = ratings.drop_duplicates(["user_id", "title"]).pivot_table(
+      columns="user_id", index="title", values="rating").fillna(0)
+
+  assert titles.tolist() == pivot.index.tolist()
+  assert users.tolist() == pivot.columns.tolist()
+  assert matrix.dtype == np.float32 and matrix.nnz > 0
+  assert np.array_equal(matrix.toarray(), pivot.values)
+  assert stats.stages[0].peak_rss_bytes > 0
+  assert "read" in stats.report()
+
+
+def test_cached_columns_match_csv(tmp_path):
+  """Training from the columnar cache builds the same matrix as parsing the CSVs."""
+  write_dataset(tmp_path)
+  books_path, ratings_path = str(tmp_path / "BX-Books.csv"), str(tmp_path / "BX-Book-Ratings.csv")
+  isbns, title_codes, titles = read_books(books_path)
+  expected = build_ratings_matrix(*read_ratings(ratings_path, isbns, title_codes), titles,
+                                  min_user_ratings=51, min_title_ratings=20)
+  cache = str(tmp_path / "cache")
+  isbns, title_codes, titles = read_books_table(load_table(books_path, cache))
+  cached = build_ratings_matrix(*read_ratings_table(load_table(ratings_path, cache), isbns,
+                                                    title_codes),
+                                titles, min_user_ratings=51, min_title_ratings=20)
+
+  assert (cached[0] != expected[0]).nnz == 0
+  assert cached[1].tolist() == expected[1].tolist()
+  assert cached[2].tolist() == expected[2].tolist()
@@ -0,0 +1,69 @@
+"""Test cases for per-user recommendations."""
+import numpy as np
+import pytest
+from scipy.sparse import csr_matrix
+
+from book_summarizer.recommendation.artifacts import ArtifactStore
+from book_summarizer.recommendation.artifacts import load_artifacts
+from book_summarizer.recommendation.artifacts import publish_ratings
+from book_summarizer.recommendation.prediction import make_prediction
+from book_summarizer.recommendation.user_scoring import score_users
+from book_summarizer.recommendation.user_scoring import top_k_per_row
+from book_summarizer.utils.exception_utils import UnknownUserError
+
+
+def test_top_k_per_row_matches_row_by_row_sort():
+  """Partitioning each row equals sorting it."""
+  rng = np.random.default_rng(0)
+  scores = csr_matrix(rng.random((30, 40)) * (rng.random((30, 40)) < 0.2))
+  indices, values = top_k_per_row(scores, 5)
+
+  for row in range(30):
+    dense = scores[row].toarray().ravel()
+    expected = [column for column in np.argsort(-dense, kind="stable")[:5] if dense[column] > 0]
+    assert indices[row][:len(expected)].tolist() == expected
+    assert (indices[row][len(expected):] == -1).all()
+    assert np.allclose(values[row][:len(expected)], dense[expected])
+
+
+def test_rated_books_are_never_recommended():
+  """Scores are ratings weighted by similarity, without the books already rated."""
+  similarity = csr_matrix(np.array([[0, 0.9, 0.1, 0], [0.9, 0, 0, 0.5], [0.1, 0, 0, 0.2],
+                                    [0, 0.5, 0.2, 0]], dtype=np.float32))
+  ratings = csr_matrix(np.array([[5, 0, 0, 0], [0, 4, 2, 0]], dtype=np.float32))
+  indices, scores = score_users(ratings, similarity, 3)
+
+  assert indices.tolist() == [[1, 2, -1], [0, 3, -1]]
+  assert np.allclose(scores, [[4.5, 0.5, 0], [3.8, 2.4, 0]])
+
+
+def test_recommendations_for_users(tmp_path):
+  """Users get unrated books, in batches or one at a time, unknown users get none."""
+  ratings = csr_matrix(np.array([[5, 4, 0], [4, 5, 0], [0, 0, 3], [3, 0, 4]], dtype=np.float32))
+  titles = ["King", "Queen", "Baker", "Castle"]
+  publish_ratings(str(tmp_path), ratings, titles, [30, 10, 20], k=3, workers=1)
+  artifacts = load_artifacts(str(tmp_path))
+
+  assert artifacts.get_user_rows([10, 20, 30, 99]).tolist() == [1, 2, 0, -1]
+  indices, _ = artifacts.recommend_for_users([10, 99], count=2)
+  assert indices.tolist() == [[3, -1], [-1, -1]]
+  assert artifacts.recommend_titles(10) == ["Castle"]
+  with pytest.raises(UnknownUserError):
+    artifacts.recommend_titles(99)
+
+
+def test_batch_predictions_are_chunked(tmp_path, monkeypatch):
+  """Every user is answered once, in request order and chunk by chunk."""
+  ratings = csr_matrix(np.array([[5, 4, 0], [4, 5, 0], [0, 0, 3], [3, 0, 4]], dtype=np.float32))
+  publish_ratings(str(tmp_path), ratings, ["King", "Queen", "Baker", "Castle"], [30, 10, 20],
+                  k=3, workers=1)
+  monkeypatch.setattr(make_prediction, "get_artifact_store",
+                      lambda: ArtifactStore(root=str(tmp_path)))
+  chunks = list(make_prediction.predict_batch([10, 99, 20, 10, 30], count=2, chunk_size=2))
+
+  assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+  results = [result for chunk in chunks for result in chunk]
+  assert [result["user_id"] for result in results] == [10, 99, 20, 10, 30]
+  assert results[0] == {"user_id": 10, "recommendations": ["Castle"]}
+  assert results[1] == {"user_id": 99, "recommendations": []}
+  assert results[3] == results[0]
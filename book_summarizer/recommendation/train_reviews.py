@@ -0,0 +1,209 @@
+"""Training book recommendation on the ratings of the reviews table.
+
+Reviews are streamed from the database through a server-side cursor and merged batch by batch
+into a sparse (books, users) matrix, so only the matrix and one buffer of reviews are held,
+never all rows. The result is published as a new artifact version that API workers switch
+to. Run with `python -m book_summarizer.recommendation.train_reviews`.
+"""
+import argparse
+import asyncio
+import logging
+from typing import Any, Iterable
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+
+from book_summarizer.config.config import setting
+from book_summarizer.db.cruds.crud_books import crud_book
+from book_summarizer.db.cruds.crud_reviews import crud_review
+from book_summarizer.db.session import DBSession
+from book_summarizer.recommendation.ann import INDEX_TYPES
+from book_summarizer.recommendation.artifacts import publish_ratings
+from book_summarizer.recommendation.recommendation import TrainingStats
+
+logger = logging.getLogger(__name__)
+
+
+def keep_last(rows: np.ndarray, columns: np.ndarray) -> np.ndarray:
+  """Positions of the last occurrence of every (row, column) pair."""
+  order = np.lexsort((np.arange(len(rows)), columns, rows))
+  rows, columns = rows[order], columns[order]
+  last = np.ones(len(order), dtype=bool)
+  last[:-1] = (rows[1:] != rows[:-1]) | (columns[1:] != columns[:-1])
+  return order[last]
+
+
+class IdCodes:
+  """Dense codes of ids, in the order they are first seen."""
+
+  def __init__(self):
+    """Initializes the variables."""
+    self.codes: dict[int, int] = {}
+
+  def encode(self, ids: np.ndarray) -> np.ndarray:
+    """int64 codes of ids."""
+    local_codes, uniques = pd.factorize(ids)
+    mapping = np.array([self.codes.setdefault(int(value), len(self.codes)) for value in uniques],
+                       dtype=np.int64)
+    return mapping[local_codes]
+
+  def decode(self, codes: np.ndarray) -> np.ndarray:
+    """Ids of codes."""
+    return np.fromiter(self.codes, dtype=np.int64, count=len(self.codes))[codes]
+
+
+def parse_user_ids(user_ids: Iterable[Any]) -> tuple[np.ndarray, np.ndarray]:
+  """int64 user ids and the mask of the reviews they come from.
+
+  Only plain non-negative integers are user ids, as the API identifies users. At most 18
+  digits are accepted so that every id fits an int64 exactly.
+  """
+  text = pd.Series(list(user_ids), dtype=object).astype("string")
+  valid = text.str.fullmatch(r"[0-9]{1,18}").fillna(False).to_numpy(dtype=bool)
+  return text[valid].astype(np.int64).to_numpy(), valid
+
+
+class RatingsMatrixBuilder:
+  """Sparse (books, users) ratings built from batches of reviews.
+
+  Rows and columns are dense codes of book and user ids in the order they are first seen,
+  build() sorts them by id. Reviews are buffered as compact arrays and merged into the
+  matrix every compact_rows reviews. A later review of a book by the same user replaces the
+  earlier one.
+  """
+
+  def __init__(self, compact_rows: int = setting.RECOMMENDATION_REVIEWS_COMPACT_ROWS):
+    """Initializes the variables."""
+    self.compact_rows = compact_rows
+    self.matrix = csr_matrix((0, 0), dtype=np.float32)
+    self.buffer: list[tuple[np.ndarray, np.ndarray, np.ndarray]] = []
+    self.buffered = 0
+    self.book_codes = IdCodes()
+    self.user_codes = IdCodes()
+    self.reviews = 0
+    # Reviews whose user id is not a non-negative integer, as the API identifies users.
+    self.skipped = 0
+
+  def add(self, user_ids: Iterable[Any], book_ids: Iterable[int],
+          ratings: Iterable[float]) -> None:
+    """Add a batch of reviews."""
+    users, valid = parse_user_ids(user_ids)
+    books = np.fromiter(book_ids, dtype=np.int64, count=len(valid))
+    values = np.fromiter(ratings, dtype=np.float32, count=len(valid))
+    self.reviews += len(valid)
+    self.skipped += int((~valid).sum())
+    self.buffer.append((self.book_codes.encode(books[valid]), self.user_codes.encode(users),
+                        values[valid]))
+    self.buffered += len(users)
+    if self.buffered >= self.compact_rows:
+      self.compact()
+
+  def compact(self) -> None:
+    """Merge the buffered reviews into the matrix."""
+    if not self.buffer:
+      return
+    books, users, values = (np.concatenate(parts) for parts in zip(*self.buffer))
+    self.buffer, self.buffered = [], 0
+    if not len(books):
+      return
+    last = keep_last(books, users)
+    shape = (max(self.matrix.shape[0], int(books.max()) + 1),
+             max(self.matrix.shape[1], int(users.max()) + 1))
+    batch = csr_matrix((values[last], (books[last], users[last])), shape=shape)
+    self.matrix.resize(shape)
+    replaced = batch.copy()
+    replaced.data = np.ones_like(replaced.data)
+    # Ratings the batch replaces are removed before adding the batch.
+    self.matrix = (self.matrix - self.matrix.multiply(replaced) + batch).tocsr()
+    self.matrix.eliminate_zeros()
+
+  def build(self, min_user_ratings: int = 1,
+            min_title_ratings: int = setting.RECOMMENDATION_MIN_RATINGS
+            ) -> tuple[csr_matrix, np.ndarray, np.ndarray]:
+    """Compact float32 ratings of shape (books, users) with the sorted book and user ids.
+
+    Users need min_user_ratings ratings and books min_title_ratings ratings from those
+    users. Ratings of 0 are not stored.
+    """
+    self.compact()
+    ratings = self.matrix.tocoo()
+    keep = ratings.data != 0
+    books, users, values = ratings.row[keep], ratings.col[keep], ratings.data[keep]
+    user_ids, user_counts = np.unique(users, return_counts=True)
+    keep = np.isin(users, user_ids[user_counts >= min_user_ratings])
+    books, users, values = books[keep], users[keep], values[keep]
+    book_counts = np.bincount(books, minlength=ratings.shape[0])
+    keep = book_counts[books] >= max(1, min_title_ratings)
+    books, users, values = books[keep], users[keep], values[keep]
+
+    book_ids, rows = np.unique(self.book_codes.decode(books), return_inverse=True)
+    user_ids, columns = np.unique(self.user_codes.decode(users), return_inverse=True)
+    matrix = csr_matrix((values.astype(np.float32), (rows, columns)),
+                        shape=(len(book_ids), len(user_ids)))
+    return matrix, book_ids, user_ids
+
+
+async def read_reviews(builder: RatingsMatrixBuilder,
+                       batch_size: int = setting.RECOMMENDATION_REVIEWS_BATCH_SIZE) -> None:
+  """Stream every rating of the reviews table into a builder."""
+  async with DBSession() as session:
+    async for rows in crud_review.stream_ratings(db=session, batch_size=batch_size):
+      user_ids, book_ids, ratings = zip(*rows)
+      builder.add(user_ids, book_ids, ratings)
+      logger.info(f"Read {builder.reviews} reviews")
+
+
+async def read_titles(book_ids: np.ndarray) -> list[str]:
+  """Titles of books, by id for books without one."""
+  async with DBSession() as session:
+    titles = await crud_book.get_titles(db=session, book_ids=book_ids.tolist())
+  return [titles.get(book_id) or f"Book {book_id}" for book_id in book_ids.tolist()]
+
+
+async def train(root: str, batch_size: int, compact_rows: int, min_user_ratings: int,
+                min_title_ratings: int, index_name: str,
+                training: TrainingStats) -> str | None:
+  """Train on the reviews table and publish the artifacts, None when nothing is left to train on."""
+  builder = RatingsMatrixBuilder(compact_rows)
+  with training.stage("stream reviews"):
+    await read_reviews(builder, batch_size)
+  with training.stage("build matrix"):
+    matrix, book_ids, user_ids = builder.build(min_user_ratings, min_title_ratings)
+  logger.info(f"{builder.reviews} reviews, {builder.skipped} without an integer user id,"
+              f" {matrix.nnz} ratings of {matrix.shape[0]} books by {matrix.shape[1]} users")
+  if matrix.shape[0] < 2:
+    return None
+  with training.stage("read titles"):
+    titles = await read_titles(book_ids)
+  with training.stage("publish"):
+    return await asyncio.to_thread(publish_ratings, root, matrix, titles, user_ids,
+                                   index_name=index_name)
+
+
+def main() -> None:
+  """Train book recommendations on the reviews table and publish them as artifacts."""
+  parser = argparse.ArgumentParser(description=main.__doc__)
+  parser.add_argument("--root", default=setting.RECOMMENDATION_ARTIFACTS_DIR)
+  parser.add_argument("--batch-size", type=int, default=setting.RECOMMENDATION_REVIEWS_BATCH_SIZE)
+  parser.add_argument("--compact-rows", type=int,
+                      default=setting.RECOMMENDATION_REVIEWS_COMPACT_ROWS)
+  parser.add_argument("--min-user-ratings", type=int, default=1)
+  parser.add_argument("--min-title-ratings", type=int, default=setting.RECOMMENDATION_MIN_RATINGS)
+  parser.add_argument("--index", choices=sorted(INDEX_TYPES), default=setting.RECOMMENDATION_INDEX)
+  args = parser.parse_args()
+
+  logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+  training = TrainingStats()
+  version = asyncio.run(train(args.root, args.batch_size, args.compact_rows,
+                              args.min_user_ratings, args.min_title_ratings, args.index,
+                              training))
+  if version is None:
+    logger.error("Not enough rated books to train on, nothing was published")
+  else:
+    logger.info(f"Published {version} to {args.root}")
+  print(training.report())
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,51 @@
+"""Item-based recommendations for users: their ratings times the book similarity matrix."""
+import numpy as np
+from scipy.sparse import csr_matrix
+
+
+def get_similarity_matrix(neighbour_indices: np.ndarray,
+                          neighbour_scores: np.ndarray) -> csr_matrix:
+  """Sparse (n_books, n_books) similarities of the neighbour table, padding left out."""
+  found = neighbour_indices >= 0
+  indptr = np.concatenate(([0], np.cumsum(found.sum(axis=1))))
+  return csr_matrix((neighbour_scores[found], neighbour_indices[found], indptr),
+                    shape=(len(neighbour_indices), len(neighbour_indices)))
+
+
+def top_k_per_row(scores: csr_matrix, k: int,
+                  exclude: csr_matrix | None = None) -> tuple[np.ndarray, np.ndarray]:
+  """Columns and values of the k largest positive entries of each row, largest first.
+
+  Each row only partitions its own stored entries, which is cheaper than sorting all of
+  them. Entries stored in `exclude` are skipped. Rows with fewer than k positive entries are
+  padded with -1 and 0.
+  """
+  indices = np.full((scores.shape[0], k), -1, dtype=np.int32)
+  values = np.zeros((scores.shape[0], k), dtype=np.float32)
+  # Marks the excluded columns of the current row, cleared again after each row.
+  excluded = np.zeros(scores.shape[1], dtype=bool)
+  for row in range(scores.shape[0]):
+    start, stop = scores.indptr[row], scores.indptr[row + 1]
+    columns, row_values = scores.indices[start:stop], scores.data[start:stop]
+    if exclude is not None:
+      excluded_columns = exclude.indices[exclude.indptr[row]:exclude.indptr[row + 1]]
+      excluded[excluded_columns] = True
+      row_values = np.where(excluded[columns], 0, row_values)
+      excluded[excluded_columns] = False
+    best = np.argpartition(-row_values, k - 1)[:k] if len(row_values) > k else \
+        np.arange(len(row_values))
+    best = best[np.argsort(-row_values[best], kind="stable")]
+    best = best[row_values[best] > 0]
+    indices[row, :len(best)] = columns[best]
+    values[row, :len(best)] = row_values[best]
+  return indices, values
+
+
+def score_users(user_ratings: csr_matrix, similarity: csr_matrix,
+                k: int) -> tuple[np.ndarray, np.ndarray]:
+  """Top-k unrated books and scores of each row of ratings of shape (n_users, n_books).
+
+  The score of a book is the sum of the user's ratings weighted by the book's similarity to
+  the rated books, one sparse product for all users. Rated books are never recommended.
+  """
+  return top_k_per_row((user_ratings @ similarity).tocsr(), k, exclude=user_ratings)
@@ -2,3 +2,19 @@
 
 class AlreadyExistsError(Exception):
   """This is raised when file already exists in database."""
+
+
+class InferenceQueueFullError(Exception):
+  """This is raised when the inference queue has no free slot for a request."""
+
+
+class UnsupportedDocumentError(Exception):
+  """This is raised when an uploaded document cannot be read."""
+
+
+class UnknownUserError(Exception):
+  """This is raised when a user has no ratings in the recommendation model."""
+
+
+class ArtifactsUnavailableError(Exception):
+  """This is raised when no recommendation artifacts could be loaded yet."""